@@ -1,16 +1,38 @@
 # app.py  — clean backend for Voicemation
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 import os
-import tempfile
+import uuid
 import subprocess
 import traceback
- 
-import speech_recognition as sr
 
-from voicemation import process_speech   # your pipeline
-from subtitle_utils import parse_srt_to_json
+from metrics_utils import render_prometheus
+from delivery_utils import strong_etag, cache_control_for, is_content_addressed
+from rendition_utils import rendition_file, rendition_mimetype, pick_rendition
+from workspace_utils import (
+    FINAL_VIDEO_DIR,
+    create_workspace,
+    remove_workspace,
+    touch_output,
+    start_janitor,
+    get_janitor_stats,
+)
+from job_runner import (
+    jobs,
+    submit_job,
+    cancel_job,
+    submit_revision,
+    get_job_scenes,
+    decode_upload,
+    get_job_view,
+    resume_interrupted_jobs,
+    QueueFullError,
+    RevisionError,
+)
+from warmup import start_background_warmup
+from cost_model import cost_model, TARGET_P95_SECONDS
+from job_events import sse_stream, parse_last_event_id
 
 app = Flask(__name__)
 from flask_cors import CORS
@@ -28,10 +50,15 @@ CORS(
 
 
 # do NOT use debug=True in production-style runs
+# (static assets only; video responses set their own Cache-Control, see send_video)
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 
-OUTPUT_VIDEO = None  # store the latest video path
-FFMPEG_BIN = os.environ.get("FFMPEG_BIN", "ffmpeg")
+# removes leftover workspaces and applies the output retention policy
+start_janitor()
+# jobs a crashed or restarted process left unfinished continue from their checkpoints
+resume_interrupted_jobs()
+# VOICEMATION_WARMUP: load the pipeline's heavy dependencies off the request path
+start_background_warmup()
 
 @app.before_request
 def handle_preflight():
@@ -39,59 +66,28 @@ def handle_preflight():
         response = jsonify({"status": "ok"})
         response.headers.add("Access-Control-Allow-Origin", request.headers.get("Origin", "*"))
         response.headers.add("Access-Control-Allow-Headers", "Content-Type, Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "POST, GET, OPTIONS")
+        response.headers.add("Access-Control-Allow-Methods", "POST, GET, DELETE, OPTIONS")
         return response
 
 
 # -----------------------
 # Helpers
 # -----------------------
-def ffprobe_duration(path: str) -> float:
-    """Return duration in seconds (float) or 0 on failure."""
-    try:
-        proc = subprocess.run(
-            [FFMPEG_BIN.replace("ffmpeg", "ffprobe"), "-v", "error",
-             "-show_entries", "format=duration",
-             "-of", "default=noprint_wrappers=1:nokey=1", path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=True,
-        )
-        return float(proc.stdout.strip())
-    except Exception as e:
-        print("ffprobe failed:", e)
-        return 0.0
-
-
-def scale_subtitles_to_video(subs, video_duration):
+def send_video(path, stable_url=True, mimetype="video/mp4"):
     """
-    Linearly scale subtitles timestamps so the full subtitle
-    timeline fits the final video duration.
-    subs: list of {"start": float, "end": float, "text": str}
+    send_file with conditional=True answers Range / If-None-Match / If-Range
+    itself (206, 304); we supply a strong content ETag and cache policy.
     """
-    if not subs:
-        return subs
-
-    last_sub_end = subs[-1]["end"]
-    if last_sub_end <= 0:
-        return subs
-
-    if abs(video_duration - last_sub_end) < 1.0:
-        # close enough; don’t bother scaling
-        return subs
-
-    scale = video_duration / last_sub_end
-    print(f"Scaling subtitles by factor {scale:.3f} ({last_sub_end:.2f}s -> {video_duration:.2f}s)")
-
-    scaled = []
-    for e in subs:
-        s = round(e["start"] * scale, 3)
-        ed = round(e["end"] * scale, 3)
-        if ed <= s:
-            ed = s + 0.01
-        scaled.append({"start": s, "end": ed, "text": e["text"]})
-    return scaled
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        as_attachment=False,
+        conditional=True,
+        etag=strong_etag(path).strip('"'),
+    )
+    response.headers["Cache-Control"] = cache_control_for(path, stable_url)
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
 
 
 # -----------------------
@@ -102,12 +98,47 @@ def scale_subtitles_to_video(subs, video_duration):
 def index():
     return render_template("index.html")
 
-@app.route("/download")
-def download():
-    global OUTPUT_VIDEO
-    if OUTPUT_VIDEO and os.path.exists(OUTPUT_VIDEO):
-        return send_file(OUTPUT_VIDEO, as_attachment=False)
-    return jsonify({"error": "No video generated yet."}), 404
+
+@app.route("/videos/<filename>")
+def download_by_content(filename):
+    path = os.path.join(FINAL_VIDEO_DIR, filename)
+    if not is_content_addressed(path) or not os.path.exists(path):
+        return jsonify({"error": "Video not found"}), 404
+    touch_output(path)
+    return send_video(path)
+
+
+@app.route("/videos/<stem>/<filename>")
+def download_rendition(stem, filename):
+    """A rendition mp4, HLS playlist or segment of final video <stem>.mp4."""
+    path = rendition_file(stem, filename)
+    if not path or not is_content_addressed(f"{stem}.mp4"):
+        return jsonify({"error": "Video not found"}), 404
+    # renditions live and expire with their final video
+    touch_output(os.path.join(FINAL_VIDEO_DIR, f"{stem}.mp4"))
+    return send_video(path, mimetype=rendition_mimetype(path))
+
+
+@app.route("/health")
+def health():
+    return jsonify({"status": "ok"})
+
+
+@app.route("/storage")
+def storage_stats():
+    return jsonify(get_janitor_stats())
+
+
+@app.route("/capacity")
+def capacity():
+    """Jobs/hour per core per tier at ?target_p95= seconds, from recorded job costs."""
+    target = request.args.get("target_p95", type=float) or TARGET_P95_SECONDS
+    return jsonify(cost_model.capacity_report(target))
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/generate_audio", methods=["POST", "OPTIONS"])
@@ -116,10 +147,9 @@ def generate_audio():
     Accepts 'audio' (webm) and optional form field 'duration_limit'
     duration_limit = '0' -> AI decides
     otherwise an integer -> seconds to force
-    Returns: JSON { video_url: "/download", subtitles_json: [...] }
+    Returns 202: JSON { job_id, status }; poll /status/<job_id>, then
+    fetch /download/<job_id> (or the video_url in the status).
     """
-    global OUTPUT_VIDEO
-
     if "audio" not in request.files:
         return jsonify({"error": "No audio uploaded"}), 400
 
@@ -127,122 +157,130 @@ def generate_audio():
     duration_limit = request.form.get("duration_limit", "0")
     manual_duration = int(duration_limit) if duration_limit != "0" else None
 
-    # save incoming webm -> temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp_webm:
-        audio_file.save(tmp_webm.name)
-        webm_path = os.path.abspath(tmp_webm.name)
-
-    wav_fd, wav_path = tempfile.mkstemp(suffix=".wav")
-    os.close(wav_fd)
-    wav_path = os.path.abspath(wav_path)
+    # one workspace per job; the job runner removes it when the job ends
+    job_id = uuid.uuid4().hex
+    workspace = create_workspace(job_id)
+    webm_path = os.path.abspath(os.path.join(workspace, "upload.webm"))
+    wav_path = os.path.abspath(os.path.join(workspace, "upload.wav"))
+    audio_file.save(webm_path)
 
     try:
         # ----------------------
         # ffmpeg: webm -> wav
         # ----------------------
-        print("🔧 webm_path:", repr(webm_path))
-        print("🔧 wav_path :", repr(wav_path))
-
-        ffmpeg_cmd = f'"{FFMPEG_BIN}" -y -i "{webm_path}" "{wav_path}"'
-        print("🔧 Running ffmpeg command:", ffmpeg_cmd)
-
-        # Use shell=True on Windows to avoid Errno 22 argument issues
-        subprocess.run(
-            ffmpeg_cmd,
-            shell=True,
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-
-        # ----------------------
-        # Speech recognition
-        # ----------------------
-        recognizer = sr.Recognizer()
-        with sr.AudioFile(wav_path) as source:
-            audio_data = recognizer.record(source)
-            speech_text = recognizer.recognize_google(audio_data)
-
-        print("Recognized speech_text:", speech_text[:80])
-
-    except sr.UnknownValueError:
-        return jsonify({"error": "Could not understand audio"}), 400
-    except sr.RequestError as e:
-        print("Speech recognition request error:", e)
-        return jsonify({"error": "Speech recognition service unavailable", "detail": str(e)}), 503
+        decode_upload(job_id, webm_path, wav_path)
     except subprocess.CalledProcessError as e:
         # ffmpeg ran but failed (bad input, etc.)
         print("ffmpeg conversion failed (process error):", e)
+        remove_workspace(workspace)
         return jsonify({"error": "Failed to convert audio", "detail": str(e)}), 500
     except (FileNotFoundError, OSError) as e:
-        # This is the Errno 22 case you keep seeing
         print("ffmpeg executable / argument error:", repr(e))
+        remove_workspace(workspace)
         return jsonify({
             "error": "ffmpeg executable or arguments invalid",
             "detail": str(e),
-            "webm_path": webm_path,
-            "wav_path": wav_path,
         }), 500
-    except Exception as e:
-        print("Unexpected error in audio handling:", e)
-        traceback.print_exc()
-        return jsonify({"error": "Audio handling error", "detail": str(e)}), 500
-    finally:
-        # DO NOT delete wav here if we still need it for recognition failure handling
-        if os.path.exists(webm_path):
-            os.remove(webm_path)
-        if os.path.exists(wav_path):
-            os.remove(wav_path)
 
     # ----------------------
-    # Your Voicemation pipeline
+    # ASR + Voicemation pipeline run on the job executor
     # ----------------------
     try:
-        OUTPUT_VIDEO, srt_files = process_speech(
-            speech_text,
-            return_srt=True,
-            manual_duration=manual_duration,
-        )
-    except TypeError:
-        # legacy signature returning only video
-        print("process_speech TypeError: assuming legacy signature")
-        traceback.print_exc()
-        OUTPUT_VIDEO = process_speech(speech_text)
-        srt_files = []
-    except Exception as e:
-        print("Error in process_speech:", e)
-        traceback.print_exc()
-        return jsonify({
-            "error": "Video generation failed",
-            "detail": str(e),
-        }), 500
+        submit_job(job_id, wav_path, manual_duration, workspace)
+    except QueueFullError as e:
+        remove_workspace(workspace)
+        return jsonify({"error": "Server busy", "detail": str(e)}), 503
 
-    # ----------------------
-    # Parse subtitles (if any)
-    # ----------------------
-    subtitles_json = []
-    for srt_path in srt_files or []:
-        try:
-            if srt_path and os.path.exists(srt_path):
-                subtitles_json.extend(parse_srt_to_json(srt_path))
-        except Exception as e:
-            print("Failed to parse srt:", srt_path, e)
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
 
-    # ----------------------
-    # Final video & duration
-    # ----------------------
-    if OUTPUT_VIDEO and os.path.exists(OUTPUT_VIDEO):
-        video_duration = ffprobe_duration(OUTPUT_VIDEO)
-        if video_duration > 0 and subtitles_json:
-            subtitles_json = scale_subtitles_to_video(subtitles_json, video_duration)
 
-        return jsonify({
-            "video_url": "/download",
-            "subtitles_json": subtitles_json,
-            "final_duration": video_duration,
-        }), 200
-    else:
-        return jsonify({"error": "Failed to generate video"}), 500
+@app.route("/status/<job_id>")
+def job_status(job_id):
+    job = get_job_view(job_id)
+    if job is None:
+        return jsonify({"status": "unknown"})
+    if job.get("status") == "done":
+        # field names the frontend used with the old synchronous response
+        job["subtitles_json"] = job.get("subtitles", [])
+        job["final_duration"] = job.get("duration", 0)
+    job.pop("trace", None)
+    return jsonify(job)
+
+
+@app.route("/events/<job_id>")
+def job_events_stream(job_id):
+    """
+    Server-sent events for a job: stage, plan, scene, progress (with ETA),
+    status and a final result event, after which the stream ends.
+    Each open stream holds a server thread; run with threaded workers.
+    """
+    if get_job_view(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+    last_event_id = parse_last_event_id(request.headers.get("Last-Event-ID"))
+    return Response(
+        stream_with_context(sse_stream(job_id, get_job_view, last_event_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def delete_job(job_id):
+    """Cancel a queued or running job (e.g. its tab was closed); 409 once it finished."""
+    job = cancel_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job.get("status") != "cancelled":
+        return jsonify({"error": f"Job already {job.get('status')}"}), 409
+    return jsonify({"job_id": job_id, "status": "cancelled"}), 202
+
+
+@app.route("/jobs/<job_id>/scenes")
+def job_scenes(job_id):
+    """Scenes of a finished job that a revision can change (empty once no longer stored)."""
+    scenes = get_job_scenes(job_id)
+    if scenes is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({"job_id": job_id, "scenes": scenes})
+
+
+@app.route("/jobs/<job_id>/revisions", methods=["POST"])
+def revise_job(job_id):
+    """
+    JSON {"scenes": [{"scene": 2, "narration": "...", "code": "..."}]}: re-run
+    only those scenes and rebuild the video. Returns 202 with the revision's
+    job id; follow it like any job (/status, /events, /download).
+    """
+    body = request.get_json(silent=True)
+    try:
+        revision_id = submit_revision(job_id, body.get("scenes") if isinstance(body, dict) else None)
+    except RevisionError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    except QueueFullError as e:
+        return jsonify({"error": "Server busy", "detail": str(e)}), 503
+    if revision_id is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({"job_id": revision_id, "revision_of": job_id, "status": "queued"}), 202
+
+
+@app.route("/download/<job_id>")
+def download(job_id):
+    job = jobs.get(job_id)
+    if not job or job.get("status") != "done" or not os.path.exists(job.get("video_path", "")):
+        return jsonify({"error": "Video not ready"}), 404
+    touch_output(job["video_path"])
+    # ?quality=360p, or a lower rendition for Save-Data / slow-connection client hints
+    path = pick_rendition(
+        job["video_path"],
+        quality=request.args.get("quality"),
+        save_data=request.headers.get("Save-Data"),
+        ect=request.headers.get("ECT"),
+        downlink=request.headers.get("Downlink"),
+    )
+    # a job's output never changes, so the URL is stable (per quality and hints)
+    response = send_video(path)
+    response.headers["Vary"] = "Save-Data, ECT, Downlink"
+    return response
 
 
 # -----------------------
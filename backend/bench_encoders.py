@@ -0,0 +1,148 @@
+# bench_encoders.py — encode time / output size per encoder profile
+#
+# Usage:
+#   python bench_encoders.py                       # renders the reference scenes below
+#   python bench_encoders.py media/videos/*/480p15/*.mp4
+#   python bench_encoders.py --profiles fast,balanced --json bench_encoders.json
+#   python bench_encoders.py --vfr                 # also VFR mode, with savings vs constant rate
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+from encoder_utils import ENCODER_PROFILES
+from voiceover_utils import add_voiceover_to_video, get_audio_duration
+
+# Small scenes that look like typical generated output: text, shapes, and long waits.
+REFERENCE_SCENES = '''from manim import *
+
+
+class RefTitleScene(Scene):
+    def construct(self):
+        title = Text("Ohm's Law").to_edge(UP)
+        formula = Text("V = I * R").scale(1.2)
+        self.play(Write(title))
+        self.play(FadeIn(formula))
+        self.wait(3)
+
+
+class RefDiagramScene(Scene):
+    def construct(self):
+        battery = Rectangle(width=1, height=2, color=YELLOW).shift(LEFT * 3)
+        resistor = Rectangle(width=2, height=0.6, color=BLUE).shift(RIGHT * 2)
+        wire = Line(battery.get_right(), resistor.get_left())
+        label = Text("Current flows").scale(0.6).next_to(wire, UP, buff=0.3)
+        self.play(Create(battery), Create(resistor))
+        self.play(Create(wire), Write(label))
+        dot = Dot(color=RED).move_to(wire.get_start())
+        self.play(MoveAlongPath(dot, wire), run_time=2)
+        self.wait(4)
+'''
+
+
+def render_reference_scenes(work_dir):
+    """Render REFERENCE_SCENES with manim and return the output mp4 paths."""
+    module_path = os.path.join(work_dir, "bench_reference_scenes.py")
+    with open(module_path, "w", encoding="utf-8") as f:
+        f.write(REFERENCE_SCENES)
+    media_dir = os.path.join(work_dir, "media")
+    subprocess.run(
+        ["manim", "-ql", "--media_dir", media_dir, module_path, "RefTitleScene", "RefDiagramScene"],
+        check=True, capture_output=True, text=True,
+    )
+    outputs = []
+    for root, dirs, files in os.walk(media_dir):
+        if "partial_movie_files" in root:
+            continue
+        outputs.extend(os.path.join(root, f) for f in files if f.endswith(".mp4"))
+    return sorted(outputs)
+
+
+def make_silent_audio(path, seconds):
+    subprocess.run(
+        ["ffmpeg", "-y", "-f", "lavfi", "-i", "anullsrc=r=24000:cl=mono",
+         "-t", f"{seconds:.2f}", "-c:a", "libmp3lame", path],
+        check=True, capture_output=True, text=True,
+    )
+
+
+def bench_profile(profile, videos, work_dir, narration_factor, vfr=False):
+    """Mux every reference video with narration `narration_factor` times its length."""
+    results = []
+    for video in videos:
+        video_len = get_audio_duration(video)
+        narration_len = max(1.0, video_len * narration_factor)
+        audio_path = os.path.join(work_dir, f"narration_{narration_len:.2f}.mp3")
+        if not os.path.exists(audio_path):
+            make_silent_audio(audio_path, narration_len)
+
+        start = time.perf_counter()
+        output = add_voiceover_to_video(video, audio_path, narration_len, encoder_profile=profile,
+                                        out_dir=work_dir, vfr=vfr)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(output) if output and os.path.exists(output) else 0
+        results.append({
+            "input": video,
+            "output_seconds": round(narration_len, 2),
+            "encode_seconds": round(elapsed, 3),
+            "size_bytes": size,
+        })
+        if output and os.path.exists(output):
+            os.remove(output)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark encoder profiles on scene renders.")
+    parser.add_argument("videos", nargs="*", help="Scene renders to encode (default: render reference scenes)")
+    parser.add_argument("--profiles", default=",".join(ENCODER_PROFILES), help="Comma separated profile names")
+    parser.add_argument("--narration-factor", type=float, default=1.5,
+                        help="Narration length relative to the render (exercises -stream_loop / the VFR hold)")
+    parser.add_argument("--vfr", action="store_true",
+                        help="Also encode in VFR mode and report its savings over constant frame rate")
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_encoders_")
+    videos = args.videos or render_reference_scenes(work_dir)
+    if not videos:
+        print("❌ No reference videos to encode.")
+        return
+
+    modes = [("cfr", False), ("vfr", True)] if args.vfr else [("cfr", False)]
+    report = {}
+    print(f"{'profile':<10} {'mode':<5} {'encode s':>10} {'size KiB':>10} {'s / out s':>10} {'time saved':>11} {'size saved':>11}")
+    for profile in args.profiles.split(","):
+        profile = profile.strip()
+        report[profile] = {}
+        for mode, vfr in modes:
+            rows = bench_profile(profile, videos, work_dir, args.narration_factor, vfr=vfr)
+            total_time = sum(r["encode_seconds"] for r in rows)
+            total_size = sum(r["size_bytes"] for r in rows)
+            total_out = sum(r["output_seconds"] for r in rows) or 1.0
+            entry = report[profile][mode] = {
+                "encode_seconds": round(total_time, 3),
+                "size_bytes": total_size,
+                "encode_seconds_per_output_second": round(total_time / total_out, 4),
+                "videos": rows,
+            }
+            saved = ("", "")
+            base = report[profile]["cfr"]
+            if mode != "cfr" and base["encode_seconds"] and base["size_bytes"]:
+                entry["encode_time_saving"] = round(1 - total_time / base["encode_seconds"], 3)
+                entry["size_saving"] = round(1 - total_size / base["size_bytes"], 3)
+                saved = (f"{entry['encode_time_saving']:.1%}", f"{entry['size_saving']:.1%}")
+            print(f"{profile:<10} {mode:<5} {total_time:>10.2f} {total_size / 1024:>10.1f} "
+                  f"{total_time / total_out:>10.3f} {saved[0]:>11} {saved[1]:>11}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
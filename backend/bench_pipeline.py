@@ -0,0 +1,201 @@
+# bench_pipeline.py — offline end-to-end benchmark of process_speech
+#
+# Replays recorded LLM responses, synthesizes silent narration of realistic
+# length and uses canned transcripts, so only manim and ffmpeg do real work.
+#
+# Usage:
+#   python bench_pipeline.py                         # all tiers, one run each
+#   python bench_pipeline.py --tiers 30,60 --repeat 3
+#   python bench_pipeline.py --compare bench_results/pipeline_20260101_120000.json
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import time
+import uuid
+from types import SimpleNamespace
+
+import voicemation
+from metrics_utils import span, job_context, stage_totals, job_llm_usage
+from workspace_utils import job_workspace
+from llm_standin import FIXTURE_PATH, replay_response
+
+RESULTS_DIR = "bench_results"
+
+# gTTS speaks roughly 150 words per minute
+TTS_WORDS_PER_SECOND = 2.5
+
+
+# -------------------------
+# Local stand-ins
+# -------------------------
+class FakeChatClient:
+    """Replays a recorded multi-scene response for the requested duration tier."""
+
+    def __init__(self, fixture):
+        self.fixture = fixture
+
+    def complete(self, messages, **kwargs):
+        prompt = messages[0].content if hasattr(messages[0], "content") else str(messages[0])
+        content = replay_response(self.fixture, prompt)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4),
+        )
+
+
+def fake_generate_voiceover(text, out_dir=None):
+    """Silent MP3 as long as gTTS would take to read `text`."""
+    seconds = max(1.0, len(text.split()) / TTS_WORDS_PER_SECOND)
+    path = os.path.join(out_dir or "/tmp", f"voiceover_{uuid.uuid4().hex[:8]}.mp3")
+    subprocess.run(
+        ["ffmpeg", "-y", "-f", "lavfi", "-i", "anullsrc=r=24000:cl=mono",
+         "-t", f"{seconds:.2f}", "-c:a", "libmp3lame", "-q:a", "9", path],
+        check=True, capture_output=True, text=True,
+    )
+    return path
+
+
+def canned_asr(fixture, tier):
+    with span("asr", canned=True):
+        return fixture["transcripts"][str(tier)]
+
+
+def install_stand_ins(fixture):
+    voicemation.set_chat_client(FakeChatClient(fixture))
+    voicemation.generate_voiceover = fake_generate_voiceover
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+def peak_rss_mb():
+    """Peak resident set size of this process and of its largest child (manim/ffmpeg)."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return round(own, 1), round(children, 1)
+
+
+def run_tier(fixture, tier, batch_render, encoder_profile, fanout=None):
+    job_id = f"bench-{tier}-{uuid.uuid4().hex[:6]}"
+    start = time.perf_counter()
+    with job_context(job_id), job_workspace(job_id) as workspace:
+        transcript = canned_asr(fixture, tier)
+        video, srt_files = voicemation.process_speech(
+            transcript,
+            return_srt=True,
+            manual_duration=tier,
+            batch_render=batch_render,
+            encoder_profile=encoder_profile,
+            workspace=workspace,
+            fanout=fanout,
+        )
+    wall = time.perf_counter() - start
+    return {
+        "job_id": job_id,
+        "tier_seconds": tier,
+        "ok": bool(video and os.path.exists(video)),
+        "wall_seconds": round(wall, 3),
+        "stages": stage_totals(job_id),
+        "llm_usage": job_llm_usage(job_id),
+        "output_bytes": os.path.getsize(video) if video and os.path.exists(video) else 0,
+    }
+
+
+def summarize(runs):
+    by_tier = {}
+    for run in runs:
+        by_tier.setdefault(run["tier_seconds"], []).append(run)
+    summary = {}
+    for tier, tier_runs in sorted(by_tier.items()):
+        walls = [r["wall_seconds"] for r in tier_runs if r["ok"]]
+        mean_wall = sum(walls) / len(walls) if walls else 0.0
+        stages = {}
+        for r in tier_runs:
+            for stage, secs in r["stages"].items():
+                stages.setdefault(stage, []).append(secs)
+        summary[str(tier)] = {
+            "runs": len(tier_runs),
+            "failures": sum(1 for r in tier_runs if not r["ok"]),
+            "mean_wall_seconds": round(mean_wall, 3),
+            "jobs_per_hour": round(3600 / mean_wall, 2) if mean_wall else 0.0,
+            "mean_stage_seconds": {k: round(sum(v) / len(v), 3) for k, v in sorted(stages.items())},
+            "mean_prompt_tokens": round(sum(r["llm_usage"]["prompt_tokens"] for r in tier_runs) / len(tier_runs)),
+            "mean_completion_tokens": round(sum(r["llm_usage"]["completion_tokens"] for r in tier_runs) / len(tier_runs)),
+        }
+    return summary
+
+
+def compare(current, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\n📊 Compared with {previous_path}:")
+    for tier, cur in current["summary"].items():
+        prev = previous.get("summary", {}).get(tier)
+        if not prev or not prev["mean_wall_seconds"]:
+            continue
+        delta = (cur["mean_wall_seconds"] - prev["mean_wall_seconds"]) / prev["mean_wall_seconds"] * 100
+        print(f"  {tier:>4}s tier: {prev['mean_wall_seconds']:.1f}s -> {cur['mean_wall_seconds']:.1f}s ({delta:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark.")
+    parser.add_argument("--tiers", default="30,60,120,180,300", help="Comma separated duration tiers (seconds)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--batch-render", action="store_true", help="Render scenes in one manim run per job")
+    parser.add_argument("--encoder-profile", default=None)
+    parser.add_argument("--fanout", choices=["auto", "on", "off"], default="auto",
+                        help="Outline-then-fan-out generation (auto: by VOICEMATION_FANOUT_MIN_SECONDS)")
+    parser.add_argument("--fixture", default=FIXTURE_PATH)
+    parser.add_argument("--out", default=None, help="Result JSON path (default: bench_results/pipeline_<time>.json)")
+    parser.add_argument("--compare", default=None, help="Previous result JSON to compare against")
+    args = parser.parse_args()
+
+    with open(args.fixture, encoding="utf-8") as f:
+        fixture = json.load(f)
+    install_stand_ins(fixture)
+    fanout = {"auto": None, "on": True, "off": False}[args.fanout]
+
+    tiers = [int(t) for t in args.tiers.split(",")]
+    runs = []
+    for tier in tiers:
+        for i in range(args.repeat):
+            print(f"\n=== 🧪 Tier {tier}s, run {i + 1}/{args.repeat} ===")
+            runs.append(run_tier(fixture, tier, args.batch_render, args.encoder_profile, fanout))
+
+    own_rss, child_rss = peak_rss_mb()
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "batch_render": args.batch_render,
+            "encoder_profile": args.encoder_profile,
+            "fanout": args.fanout,
+            "prompt_version": os.environ.get("VOICEMATION_PROMPT_VERSION", "v2"),
+            "cpu_count": os.cpu_count(),
+        },
+        "peak_rss_mb": {"self": own_rss, "largest_child": child_rss},
+        "summary": summarize(runs),
+        "runs": runs,
+    }
+
+    print(f"\n{'tier':>6} {'wall s':>9} {'jobs/h':>8} {'tok in':>7} {'tok out':>7}  stages")
+    for tier, s in result["summary"].items():
+        stages = ", ".join(f"{k}={v:.1f}" for k, v in s["mean_stage_seconds"].items())
+        print(f"{tier:>6} {s['mean_wall_seconds']:>9.1f} {s['jobs_per_hour']:>8.1f} "
+              f"{s['mean_prompt_tokens']:>7} {s['mean_completion_tokens']:>7}  {stages}")
+    print(f"Peak RSS: {own_rss} MB (benchmark), {child_rss} MB (largest child)")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"pipeline_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"📄 Results written to {out}")
+
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
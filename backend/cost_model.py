@@ -0,0 +1,278 @@
+# cost_model.py — learned generation cost: ETAs, scheduling, capacity planning
+#
+# Every finished generation appends a sample to COST_SAMPLES_PATH (JSON lines,
+# shared by all worker processes): wall seconds, per-stage seconds and the
+# job's features (duration tier, scene count, code and narration size, scenes
+# served from a template pack or a checkpoint). A linear model over those
+# features is fitted online by recursive least squares with forgetting, so it
+# follows changes in hardware or LLM latency; it starts from the same
+# per-scene prior the scheduler used before any job finished, and is refitted
+# from the shared file every REFIT_SECONDS so processes learn from each other.
+#
+# Before generation only the tier is known; the other features are filled in
+# with the averages of that tier's samples.
+#
+#   python cost_model.py --target-p95 300     # capacity report as JSON
+import argparse
+import json
+import math
+import os
+import threading
+import time
+
+from metrics_utils import current_job_id, stage_totals, CACHE_REQUESTS
+from prompt_templates import DURATION_TIERS, duration_tier
+from workspace_utils import FINAL_VIDEO_DIR
+
+COST_SAMPLES_PATH = os.path.join(FINAL_VIDEO_DIR, "cost_samples.jsonl")
+MAX_SAMPLES = int(os.environ.get("VOICEMATION_COST_SAMPLES_MAX", "5000"))
+TARGET_P95_SECONDS = float(os.environ.get("VOICEMATION_TARGET_P95", "300"))
+REFIT_SECONDS = 300
+# newer samples weigh more; 0.98 halves a sample's weight after ~35 jobs
+FORGETTING = 0.98
+# how strongly the prior weights resist the first samples
+PRIOR_VARIANCE = 100.0
+
+FEATURES = ("bias", "scenes", "code_kchars", "narration_kchars", "template_scenes", "restored_scenes")
+# prior: LLM call plus per-scene TTS/render/mux
+PRIOR_WEIGHTS = (20.0, 25.0, 0.0, 0.0, 0.0, 0.0)
+# per-scene feature defaults until a tier has samples (~1.2k chars of code, 2.5 words/s narrated)
+PRIOR_CODE_KCHARS_PER_SCENE = 1.2
+PRIOR_NARRATION_KCHARS_PER_SECOND = 0.015
+# stages that keep a core busy (the rest wait on the LLM, TTS or ASR services)
+CPU_STAGES = ("sanitize", "render", "render_batch", "mux", "concat", "renditions", "probe")
+
+
+class RecursiveLeastSquares:
+    """Online linear regression: w·x, updated one sample at a time."""
+
+    def __init__(self, weights, variance=PRIOR_VARIANCE, forgetting=FORGETTING):
+        n = len(weights)
+        self.w = list(weights)
+        self.P = [[variance if i == j else 0.0 for j in range(n)] for i in range(n)]
+        self.forgetting = forgetting
+
+    def predict(self, x):
+        return sum(wi * xi for wi, xi in zip(self.w, x))
+
+    def update(self, x, y):
+        n = len(x)
+        Px = [sum(self.P[i][j] * x[j] for j in range(n)) for i in range(n)]
+        denom = self.forgetting + sum(x[i] * Px[i] for i in range(n))
+        gain = [p / denom for p in Px]
+        error = y - self.predict(x)
+        self.w = [wi + gi * error for wi, gi in zip(self.w, gain)]
+        self.P = [
+            [(self.P[i][j] - gain[i] * Px[j]) / self.forgetting for j in range(n)]
+            for i in range(n)
+        ]
+        return error
+
+
+def _vector(features):
+    return [1.0] + [float(features.get(name, 0)) for name in FEATURES[1:]]
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(math.ceil(q * len(values))) - 1, len(values) - 1)]
+
+
+class CostModel:
+    def __init__(self, path=COST_SAMPLES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._features = {}
+        self._reset()
+        self._fitted_at = 0.0
+
+    def _reset(self):
+        # caller holds self._lock (or is __init__)
+        self._model = RecursiveLeastSquares(PRIOR_WEIGHTS)
+        self._samples = []
+        self._abs_error = None
+
+    # -------------------------
+    # Features of the running job
+    # -------------------------
+    def note_scene(self, sec, restored=False):
+        """Count one processed scene of the current job."""
+        job_id = current_job_id.get()
+        if not job_id:
+            return
+        with self._lock:
+            f = self._features.setdefault(job_id, {"scenes": 0, "code_kchars": 0.0, "narration_kchars": 0.0,
+                                                   "template_scenes": 0, "restored_scenes": 0})
+            f["scenes"] += 1
+            f["code_kchars"] += len(sec.get("code") or "") / 1000
+            f["narration_kchars"] += len(sec.get("explanation") or "") / 1000
+            f["template_scenes"] += 1 if sec.get("prerendered_path") else 0
+            f["restored_scenes"] += 1 if restored else 0
+
+    def discard(self, job_id):
+        with self._lock:
+            self._features.pop(job_id, None)
+
+    # -------------------------
+    # Learning
+    # -------------------------
+    def record_job(self, job_id, desired_duration, seconds):
+        """Store the sample of a finished generation and learn from it."""
+        with self._lock:
+            features = self._features.pop(job_id, None)
+        if not features or not features["scenes"]:
+            return None
+        stages = stage_totals(job_id)
+        sample = {
+            "at": round(time.time(), 3),
+            "tier": duration_tier(desired_duration)["name"],
+            "desired_duration": desired_duration,
+            "seconds": round(seconds, 3),
+            "core_seconds": round(sum(stages.get(s, 0.0) for s in CPU_STAGES), 3),
+            "stages": stages,
+            **{k: round(v, 3) for k, v in features.items()},
+        }
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(sample) + "\n")
+        except OSError as e:
+            print("⚠️ Could not store cost sample:", e)
+        with self._lock:
+            self._learn(sample)
+        return sample
+
+    def _learn(self, sample):
+        # caller holds self._lock
+        error = self._model.update(_vector(sample), sample["seconds"])
+        self._abs_error = abs(error) if self._abs_error is None else 0.9 * self._abs_error + 0.1 * abs(error)
+        self._samples.append(sample)
+        del self._samples[:-MAX_SAMPLES]
+
+    def refit(self):
+        """Refit from the shared samples file (all processes' jobs); trims the file."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            lines = []
+        samples = []
+        for line in lines[-MAX_SAMPLES:]:
+            try:
+                samples.append(json.loads(line))
+            except ValueError:
+                continue
+        if len(lines) > 2 * MAX_SAMPLES:
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.writelines(lines[-MAX_SAMPLES:])
+                os.replace(tmp, self.path)
+            except OSError:
+                pass
+        with self._lock:
+            self._reset()
+            for sample in samples:
+                self._learn(sample)
+            self._fitted_at = time.time()
+
+    def _maybe_refit(self):
+        if time.time() - self._fitted_at > REFIT_SECONDS:
+            self.refit()
+
+    # -------------------------
+    # Prediction
+    # -------------------------
+    def expected_features(self, desired_duration):
+        """Features a job of this duration is expected to have, from its tier's samples."""
+        tier = duration_tier(desired_duration)
+        with self._lock:
+            samples = [s for s in self._samples if s.get("tier") == tier["name"]][-200:]
+        if samples:
+            return {name: sum(s.get(name, 0) for s in samples) / len(samples) for name in FEATURES[1:]}
+        scenes = (tier["min_scenes"] + tier["max_scenes"]) / 2
+        return {
+            "scenes": scenes,
+            "code_kchars": PRIOR_CODE_KCHARS_PER_SCENE * scenes,
+            "narration_kchars": PRIOR_NARRATION_KCHARS_PER_SECOND * desired_duration,
+            "template_scenes": 0,
+            "restored_scenes": 0,
+        }
+
+    def predict_seconds(self, desired_duration, features=None):
+        """Predicted generation seconds; features default to the tier's expectation."""
+        self._maybe_refit()
+        features = features or self.expected_features(desired_duration)
+        with self._lock:
+            seconds = self._model.predict(_vector(features))
+        # never below a few seconds, whatever the fitted weights extrapolate to
+        return round(max(seconds, 5.0), 1)
+
+    def weights(self):
+        with self._lock:
+            return {name: round(w, 3) for name, w in zip(FEATURES, self._model.w)}
+
+    # -------------------------
+    # Capacity planning
+    # -------------------------
+    def capacity_report(self, target_p95=TARGET_P95_SECONDS):
+        """
+        Throughput one core sustains per tier while keeping p95 latency under
+        target_p95. Queueing is approximated as M/M/1: at utilization u a job
+        takes about 1/(1-u) times its unloaded time, so u may reach
+        1 - p95 / target_p95, and a core then finishes u * 3600 / core_seconds
+        jobs per hour.
+        """
+        self._maybe_refit()
+        with self._lock:
+            samples = list(self._samples)
+            mae = self._abs_error
+
+        def summarize(group):
+            seconds = [s["seconds"] for s in group]
+            core = sum(s.get("core_seconds", 0.0) for s in group) / len(group)
+            p95 = _percentile(seconds, 0.95)
+            utilization = max(0.0, 1.0 - p95 / target_p95)
+            return {
+                "jobs": len(group),
+                "p50_seconds": _percentile(seconds, 0.5),
+                "p95_seconds": p95,
+                "core_seconds": round(core, 1),
+                "max_utilization": round(utilization, 3),
+                "jobs_per_hour_per_core": round(utilization * 3600 / core, 2) if core > 0 else None,
+            }
+
+        tiers = {}
+        for tier in DURATION_TIERS:
+            group = [s for s in samples if s.get("tier") == tier["name"]]
+            entry = summarize(group) if group else {"jobs": 0}
+            entry["predicted_seconds"] = self.predict_seconds(tier["max_seconds"] or 300)
+            tiers[tier["name"]] = entry
+
+        hits = CACHE_REQUESTS.get(cache="topic", result="hit")
+        lookups = hits + CACHE_REQUESTS.get(cache="topic", result="miss")
+        return {
+            "target_p95_seconds": target_p95,
+            "samples": len(samples),
+            "overall": summarize(samples) if samples else {"jobs": 0},
+            "tiers": tiers,
+            # requests answered from the topic cache need no generation at all
+            "topic_cache_hit_ratio": round(hits / lookups, 3) if lookups else None,
+            "model": {"weights": self.weights(), "mean_abs_error_seconds": round(mae, 1) if mae is not None else None},
+        }
+
+
+cost_model = CostModel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capacity report from recorded job costs.")
+    parser.add_argument("--target-p95", type=float, default=TARGET_P95_SECONDS,
+                        help="p95 job latency to plan for, in seconds")
+    args = parser.parse_args()
+    print(json.dumps(cost_model.capacity_report(args.target_p95), indent=2))
+
+
+if __name__ == "__main__":
+    main()
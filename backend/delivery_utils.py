@@ -0,0 +1,125 @@
+# delivery_utils.py — ETags, cache headers and byte ranges for video downloads
+import hashlib
+import os
+import re
+import threading
+
+CONTENT_ADDRESSED_NAME = re.compile(r"^final_[0-9a-f]{16,64}\.mp4$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+CHUNK_SIZE = 256 * 1024
+
+_digest_cache = {}
+_digest_lock = threading.Lock()
+
+
+def file_digest(path):
+    """
+    sha256 hex digest of a file's content, cached per (path, size, mtime)
+    so repeated downloads and range requests don't rehash the video.
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _digest_lock:
+        if key in _digest_cache:
+            return _digest_cache[key]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    with _digest_lock:
+        _digest_cache[key] = digest
+    return digest
+
+
+def content_addressed_name(path):
+    """final_<first 16 hex chars of sha256>.mp4 for the given file."""
+    return f"final_{file_digest(path)[:16]}.mp4"
+
+
+def is_content_addressed(path):
+    return bool(CONTENT_ADDRESSED_NAME.match(os.path.basename(path)))
+
+
+def in_rendition_of_content(path):
+    """True for files of renditions/final_<hash>/: derived from content-addressed bytes."""
+    return is_content_addressed(os.path.dirname(os.path.abspath(path)) + ".mp4")
+
+
+def strong_etag(path):
+    """Quoted strong ETag derived from the file content."""
+    return f'"{file_digest(path)}"'
+
+
+def cache_control_for(path, stable_url=True):
+    """
+    Content-addressed files (and their renditions) served from a URL that
+    always maps to the same bytes can be cached forever; anything else must
+    be revalidated (cheap, thanks to the ETag).
+    """
+    if stable_url and (is_content_addressed(path) or in_rendition_of_content(path)):
+        return IMMUTABLE_CACHE_CONTROL
+    return REVALIDATE_CACHE_CONTROL
+
+
+def etag_matches(header_value, etag):
+    """True if an If-None-Match / If-Range header value matches etag."""
+    if not header_value:
+        return False
+    if header_value.strip() == "*":
+        return True
+    candidates = [c.strip() for c in header_value.split(",")]
+    # weak comparison is fine for If-None-Match
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def parse_range_header(header_value, size):
+    """
+    Parse a single 'bytes=start-end' range.
+    Returns (start, end) inclusive, None when the header should be ignored
+    (absent, malformed, multi-range), or raises ValueError if unsatisfiable.
+    """
+    if not header_value or not header_value.startswith("bytes="):
+        return None
+    spec = header_value[len("bytes="):].strip()
+    if "," in spec:
+        return None
+    start_s, sep, end_s = spec.partition("-")
+    if not sep:
+        return None
+    try:
+        start = int(start_s) if start_s else None
+        end = int(end_s) if end_s else None
+    except ValueError:
+        return None
+
+    if start is None:
+        # suffix range: the last N bytes
+        if end is None:
+            return None
+        if end <= 0:
+            raise ValueError(f"range {header_value} not satisfiable")
+        start, end = max(0, size - end), size - 1
+    elif end is None:
+        end = size - 1
+
+    end = min(end, size - 1)
+    if start >= size or start > end:
+        raise ValueError(f"range {header_value} not satisfiable for size {size}")
+    return start, end
+
+
+def iter_file_range(path, start, end, chunk_size=CHUNK_SIZE):
+    """Yield bytes start..end (inclusive) of a file."""
+    remaining = end - start + 1
+    with open(path, "rb") as f:
+        f.seek(start)
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,109 @@
+# encoder_utils.py — named x264 encoder profiles shared by every ffmpeg call
+import os
+
+# preset / crf / keyframe interval (frames) / threads (0 = ffmpeg decides) / +faststart
+ENCODER_PROFILES = {
+    "fast": {
+        "preset": "veryfast",
+        "crf": 26,
+        "keyint": 150,
+        "threads": 0,
+        "faststart": True,
+    },
+    "balanced": {
+        "preset": "medium",
+        "crf": 23,
+        "keyint": 150,
+        "threads": 0,
+        "faststart": True,
+    },
+    "archival": {
+        "preset": "slow",
+        "crf": 18,
+        "keyint": 60,
+        "threads": 0,
+        "faststart": True,
+    },
+}
+
+DEFAULT_ENCODER_PROFILE = os.environ.get("VOICEMATION_ENCODER_PROFILE", "balanced")
+
+
+def get_encoder_profile(name=None):
+    """
+    Returns the profile dict for `name` (or the configured default).
+    Unknown names fall back to 'balanced' so a typo in the env never breaks a job.
+    """
+    name = name or DEFAULT_ENCODER_PROFILE
+    profile = ENCODER_PROFILES.get(name)
+    if profile is None:
+        print(f"⚠️ Unknown encoder profile '{name}', using 'balanced'.")
+        profile = ENCODER_PROFILES["balanced"]
+
+    threads = os.environ.get("VOICEMATION_ENCODER_THREADS")
+    if threads:
+        profile = dict(profile, threads=int(threads))
+    return profile
+
+
+def video_encode_args(name=None):
+    """ffmpeg arguments for the video stream of a re-encode."""
+    profile = get_encoder_profile(name)
+    return [
+        "-c:v", "libx264",
+        "-tune", "animation",
+        "-preset", profile["preset"],
+        "-crf", str(profile["crf"]),
+        "-g", str(profile["keyint"]),
+        "-pix_fmt", "yuv420p",
+        "-threads", str(profile["threads"]),
+    ]
+
+
+def container_args(name=None):
+    """ffmpeg output/container arguments (applies to stream copies too)."""
+    profile = get_encoder_profile(name)
+    if profile["faststart"]:
+        return ["-movflags", "+faststart"]
+    return []
+
+
+# --- Variable frame rate ---
+# Generated scenes spend much of their length on self.wait(): the same frame
+# repeated at the render's constant rate. In VFR mode mpdecimate drops frames
+# that are (near-)identical to the previous kept one and the output keeps the
+# original timestamps, so a hold becomes one long frame instead of dozens of
+# duplicates. The narration extension holds the last frame (tpad clone) rather
+# than looping the scene, which VFR then collapses the same way.
+VFR_ENABLED = os.environ.get("VOICEMATION_VFR", "0") == "1"
+# at most this many frames in a row are dropped, so a long hold still gets a
+# frame every so often (players and seeking cope badly with multi-minute frames)
+VFR_MAX_HOLD_FRAMES = int(os.environ.get("VOICEMATION_VFR_MAX_HOLD_FRAMES", "60"))
+
+
+def vfr_enabled(vfr=None):
+    """An explicit True/False wins over the VOICEMATION_VFR default."""
+    return VFR_ENABLED if vfr is None else bool(vfr)
+
+
+def hold_filter(hold_seconds, vfr=None):
+    """
+    -vf chain for a VFR encode whose video must last hold_seconds: the last
+    frame is cloned until then and duplicate frames are dropped. None when VFR
+    is off (the caller loops the input instead).
+    """
+    if not vfr_enabled(vfr):
+        return None
+    return (
+        f"tpad=stop_mode=clone:stop_duration={float(hold_seconds):.3f},"
+        f"mpdecimate=max={VFR_MAX_HOLD_FRAMES}"
+    )
+
+
+def frame_rate_args(vfr=None):
+    """
+    Output timing for re-encodes: pass frame timestamps through as they are.
+    Without it the mp4 muxer forces constant rate and duplicates held frames
+    back in (-fps_mode needs ffmpeg 5.1+).
+    """
+    return ["-fps_mode", "vfr"] if vfr_enabled(vfr) else []
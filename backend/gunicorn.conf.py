@@ -0,0 +1,15 @@
+# gunicorn.conf.py — picked up automatically by `gunicorn app:app` (or
+# `gunicorn -k uvicorn.workers.UvicornWorker main:app`) run from backend/.
+#
+# With VOICEMATION_WARMUP=1 (or =render) the heavy imports and manim are
+# warmed once in the master before workers are forked, and each worker then
+# opens its own LLM connection; see warmup.py. Without it these hooks do nothing.
+import warmup
+
+
+def on_starting(server):
+    warmup.warm_before_fork()
+
+
+def post_fork(server, worker):
+    warmup.warm_after_fork()
@@ -0,0 +1,289 @@
+# job_events.py — push job progress to clients (GET /events/<job_id>, SSE)
+#
+# One in-process bus per worker process. The job runner and the pipeline
+# publish to it: stage starts/ends (every metrics span of the job), the scene
+# plan, each finished scene with an ETA, status changes and the final result.
+# Each subscriber (an open event stream) gets its own queue; the last
+# EVENT_HISTORY events of a job are kept so a late or reconnecting client
+# (Last-Event-ID) catches up.
+#
+# A job running in another worker process never reaches this bus; its stream
+# follows the shared job record instead and carries status and result only.
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+from metrics_utils import current_job_id, add_span_listener, EVENT_SUBSCRIBERS, MAX_TRACKED_JOBS
+
+EVENT_HISTORY = 500
+# a comment line on idle streams keeps proxies from closing them
+KEEPALIVE_SECONDS = 15
+# how often the stream of a job owned by another process re-reads its record
+RECORD_POLL_SECONDS = 1.0
+TERMINAL_STATUSES = ("done", "error", "cancelled")
+# not streamed with the result: internal, or large and already sent as stage events
+_PRIVATE_FIELDS = ("trace", "stages", "wav_path", "workspace", "manual_duration", "pid", "flight_key")
+
+_lock = threading.Lock()
+_history = OrderedDict()      # job id -> deque of events
+_seq = {}                     # job id -> last event id
+_subscribers = {}             # job id -> set of Subscription
+_progress = {}                # job id -> {"total", "done", "started"}
+
+
+class Subscription:
+    """Events of one job for one client; thread-safe, or bound to an asyncio loop."""
+
+    def __init__(self, job_id, loop=None):
+        self.job_id = job_id
+        self.loop = loop
+        self._queue = asyncio.Queue() if loop else queue.Queue()
+
+    def put(self, event):
+        if self.loop:
+            try:
+                self.loop.call_soon_threadsafe(self._queue.put_nowait, event)
+            except RuntimeError:  # loop closed: the client is gone
+                pass
+        else:
+            self._queue.put(event)
+
+    def get(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+# -------------------------
+# Publishing
+# -------------------------
+def publish(job_id, event, **data):
+    """Send an event to every subscriber of job_id and keep it for late ones."""
+    if not job_id:
+        return
+    with _lock:
+        seq = _seq.get(job_id, 0) + 1
+        _seq[job_id] = seq
+        history = _history.get(job_id)
+        if history is None:
+            history = _history[job_id] = deque(maxlen=EVENT_HISTORY)
+            while len(_history) > MAX_TRACKED_JOBS:
+                old, _ = _history.popitem(last=False)
+                _seq.pop(old, None)
+                _progress.pop(old, None)
+        record = {"id": seq, "event": event, "data": {**data, "at": round(time.time(), 3)}}
+        history.append(record)
+        subscribers = list(_subscribers.get(job_id, ()))
+    for sub in subscribers:
+        sub.put(record)
+
+
+def emit(event, **data):
+    """publish() for the job running in this context."""
+    publish(current_job_id.get(), event, **data)
+
+
+def start_plan(total, source):
+    """The current job will produce `total` scenes; resets its progress."""
+    job_id = current_job_id.get()
+    if not job_id:
+        return
+    with _lock:
+        _progress[job_id] = {"total": total, "done": 0, "started": time.time()}
+    publish(job_id, "plan", scenes=total, source=source)
+
+
+def scene_finished(scene, ok):
+    """A scene of the current job is done (or failed); publishes progress and an ETA."""
+    job_id = current_job_id.get()
+    if not job_id:
+        return
+    with _lock:
+        progress = _progress.get(job_id)
+        if progress:
+            progress["done"] += 1
+            done, total = progress["done"], progress["total"]
+            elapsed = time.time() - progress["started"]
+    publish(job_id, "scene", scene=scene, status="done" if ok else "failed")
+    if progress:
+        # scenes so far took elapsed/done each (fan-out: measured throughput, not latency)
+        remaining = max(total - done, 0)
+        eta = round(elapsed / done * remaining, 1)
+        with _lock:
+            progress["eta"], progress["eta_at"] = eta, time.time()
+        publish(job_id, "progress", done=done, total=total,
+                fraction=round(min(done / total, 1.0), 3) if total else 1.0,
+                eta_seconds=eta)
+
+
+def latest_eta(job_id):
+    """Seconds left per the job's last progress event, or None before the first scene."""
+    with _lock:
+        progress = _progress.get(job_id)
+        if not progress or "eta" not in progress:
+            return None
+        return round(max(progress["eta"] - (time.time() - progress["eta_at"]), 0.0), 1)
+
+
+def publish_status(job_id, record, previous_status=None):
+    """Status change of a job record; terminal states also carry the result."""
+    status = record.get("status")
+    if status == previous_status:
+        return
+    publish(job_id, "status", status=status)
+    if status in TERMINAL_STATUSES:
+        publish(job_id, "result", **result_payload(record))
+
+
+def result_payload(record):
+    """Public fields of a finished job, with the aliases /status returns."""
+    payload = {k: v for k, v in record.items() if k not in _PRIVATE_FIELDS}
+    if payload.get("status") == "done":
+        payload["subtitles_json"] = payload.get("subtitles", [])
+        payload["final_duration"] = payload.get("duration", 0)
+    return payload
+
+
+def _on_span(job_id, phase, record):
+    data = {k: v for k, v in record.items() if isinstance(v, (str, int, float, bool)) or v is None}
+    publish(job_id, "stage", phase=phase, **data)
+
+
+add_span_listener(_on_span)
+
+
+# -------------------------
+# Subscribing
+# -------------------------
+def subscribe(job_id, last_event_id=None, loop=None):
+    """(subscription, events after last_event_id still in the history)."""
+    sub = Subscription(job_id, loop)
+    with _lock:
+        _subscribers.setdefault(job_id, set()).add(sub)
+        backlog = [e for e in _history.get(job_id, ()) if last_event_id is None or e["id"] > last_event_id]
+    EVENT_SUBSCRIBERS.inc()
+    return sub, backlog
+
+
+def unsubscribe(sub):
+    with _lock:
+        subs = _subscribers.get(sub.job_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del _subscribers[sub.job_id]
+    EVENT_SUBSCRIBERS.dec()
+
+
+def is_known(job_id):
+    """True if this process published events for job_id."""
+    with _lock:
+        return job_id in _history
+
+
+def format_sse(event):
+    lines = []
+    if event.get("id") is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'])}")
+    return "\n".join(lines) + "\n\n"
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _StreamState:
+    """What one stream has sent so far; turns bus events and record reads into SSE text."""
+
+    def __init__(self, job_id, lookup):
+        self.job_id = job_id
+        self.lookup = lookup
+        self.status = None
+        self.finished = False
+
+    def on_event(self, event):
+        if event["event"] == "status":
+            if event["data"]["status"] == self.status:
+                return None
+            self.status = event["data"]["status"]
+        if event["event"] == "result":
+            self.finished = True
+        return format_sse(event)
+
+    def on_record(self):
+        """Events derived from the job record (the only source for jobs of other processes)."""
+        record = self.lookup(self.job_id)
+        if record is None:
+            self.finished = True
+            return format_sse({"event": "result", "data": {"status": "unknown"}})
+        out = ""
+        if record.get("status") != self.status:
+            self.status = record.get("status")
+            out += format_sse({"event": "status", "data": {"status": self.status}})
+        if self.status in TERMINAL_STATUSES:
+            self.finished = True
+            out += format_sse({"event": "result", "data": result_payload(record)})
+        return out
+
+    def poll_interval(self):
+        return KEEPALIVE_SECONDS if is_known(self.job_id) else RECORD_POLL_SECONDS
+
+
+def sse_stream(job_id, lookup, last_event_id=None):
+    """
+    SSE text chunks for job_id until its result is sent. lookup(job_id)
+    returns the shared job record (or None).
+    """
+    sub, backlog = subscribe(job_id, last_event_id)
+    state = _StreamState(job_id, lookup)
+    try:
+        yield "retry: 3000\n\n"
+        chunks = [state.on_event(event) for event in backlog]
+        if not state.finished:
+            chunks.append(state.on_record())
+        while True:
+            for chunk in chunks:
+                if chunk:
+                    yield chunk
+            if state.finished:
+                break
+            event = sub.get(state.poll_interval())
+            chunks = [state.on_record() or ": keepalive\n\n" if event is None else state.on_event(event)]
+    finally:
+        unsubscribe(sub)
+
+
+async def sse_stream_async(job_id, lookup, last_event_id=None):
+    """sse_stream() for asyncio servers: waits on the loop instead of a thread."""
+    sub, backlog = subscribe(job_id, last_event_id, loop=asyncio.get_running_loop())
+    state = _StreamState(job_id, lookup)
+    try:
+        yield "retry: 3000\n\n"
+        chunks = [state.on_event(event) for event in backlog]
+        if not state.finished:
+            chunks.append(state.on_record())
+        while True:
+            for chunk in chunks:
+                if chunk:
+                    yield chunk
+            if state.finished:
+                break
+            event = await sub.aget(state.poll_interval())
+            chunks = [state.on_record() or ": keepalive\n\n" if event is None else state.on_event(event)]
+    finally:
+        unsubscribe(sub)
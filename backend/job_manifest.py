@@ -0,0 +1,174 @@
+# job_manifest.py — per-job checkpoints so interrupted jobs can resume
+#
+# Each job workspace holds a manifest.json that is rewritten after every
+# completed stage: the transcript, the LLM response (or outline and per-scene
+# answers), each scene's narration, render and muxed clip, and the final
+# video. When a process dies mid-job, job_runner.resume_interrupted_jobs()
+# re-queues the job on restart and the pipeline skips whatever the manifest
+# shows as finished. A scene's files are only reused while they still exist
+# and the hash of its code and narration text matches.
+#
+# The manifest of the running job is found through a context variable (like
+# the job id of metrics spans), so render threads started with
+# _submit_in_context see it too. Set VOICEMATION_CHECKPOINTS=0 to keep
+# manifests in memory only.
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics_utils import CHECKPOINT_RESTORES
+
+CHECKPOINTS_ENABLED = os.environ.get("VOICEMATION_CHECKPOINTS", "1") == "1"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+_current = contextvars.ContextVar("voicemation_manifest", default=None)
+
+
+def scene_digest(sec):
+    """Hash of what a scene's files are made from: its code and narration text."""
+    raw = f"{sec.get('code', '')}\n{sec.get('explanation', '')}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def manifest_key(speech_text, desired_duration):
+    return hashlib.sha256(f"{speech_text}|{desired_duration}".encode("utf-8")).hexdigest()[:16]
+
+
+class JobManifest:
+    """Checkpoint state of one job. Without a path it lives in memory only."""
+
+    def __init__(self, path=None, data=None):
+        self.path = path
+        self.data = data or self._empty()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _empty(key=None):
+        return {"version": MANIFEST_VERSION, "key": key, "stages": {}, "scenes": {}}
+
+    @classmethod
+    def load(cls, workspace):
+        """The manifest of a workspace (empty if there is none yet)."""
+        if not CHECKPOINTS_ENABLED or not workspace:
+            return cls()
+        path = os.path.join(os.path.abspath(workspace), MANIFEST_NAME)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        if data and data.get("version") != MANIFEST_VERSION:
+            data = None
+        return cls(path, data)
+
+    def _save(self):
+        # caller holds self._lock
+        if self.path is None:
+            return
+        self.data["updated_at"] = time.time()
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print("⚠️ Could not write job manifest:", e)
+
+    def bind(self, key):
+        """Claim the manifest for a run; checkpoints of a different run are dropped."""
+        with self._lock:
+            if self.data.get("key") not in (None, key):
+                print("⚠️ Job manifest belongs to another request, starting over.")
+                self.data = self._empty(key)
+            self.data["key"] = key
+            self._save()
+
+    # -------------------------
+    # Stages: asr, llm, outline, generated scenes, final
+    # -------------------------
+    def stage(self, name):
+        """Data of a completed stage, or None."""
+        with self._lock:
+            data = self.data["stages"].get(name)
+        if data is not None:
+            CHECKPOINT_RESTORES.inc(stage=name)
+        return data
+
+    def peek(self, name):
+        """Data of a completed stage, without counting it as a restore."""
+        with self._lock:
+            return self.data["stages"].get(name)
+
+    def complete_stage(self, name, **data):
+        with self._lock:
+            self.data["stages"][name] = {**data, "at": time.time()}
+            self._save()
+
+    def stage_item(self, name, key):
+        """One entry of a stage that completes piecewise (e.g. generated scenes)."""
+        with self._lock:
+            item = self.data["stages"].get(name, {}).get(str(key))
+        if item is not None:
+            CHECKPOINT_RESTORES.inc(stage=name)
+        return item
+
+    def add_stage_item(self, name, key, value):
+        with self._lock:
+            self.data["stages"].setdefault(name, {})[str(key)] = value
+            self._save()
+
+    # -------------------------
+    # Scenes: narration_path, raw_video_path, srt_path, video_path
+    # -------------------------
+    def scene(self, index, sec):
+        """
+        Checkpointed files of scene `index` that still exist, or {} when the
+        scene has no checkpoint or its code/narration changed since.
+        """
+        with self._lock:
+            entry = dict(self.data["scenes"].get(str(index)) or {})
+        if entry.get("digest") != scene_digest(sec):
+            return {}
+        return {k: v for k, v in entry.items() if k != "digest" and v and os.path.exists(v)}
+
+    def update_scene(self, index, sec, **paths):
+        digest = scene_digest(sec)
+        with self._lock:
+            entry = self.data["scenes"].get(str(index))
+            if not entry or entry.get("digest") != digest:
+                entry = {"digest": digest}
+            entry.update(paths)
+            self.data["scenes"][str(index)] = entry
+            self._save()
+
+
+def current_manifest():
+    """Manifest of the job running in this context (an in-memory one outside jobs)."""
+    return _current.get() or JobManifest()
+
+
+def manifest_for(workspace):
+    """The current manifest if it belongs to workspace, else the workspace's own."""
+    manifest = _current.get()
+    if manifest is not None and manifest.path and workspace and \
+            os.path.dirname(manifest.path) == os.path.abspath(workspace):
+        return manifest
+    if manifest is not None and manifest.path is None and not CHECKPOINTS_ENABLED:
+        # checkpoints off: the job's in-memory manifest still collects its stages
+        return manifest
+    return JobManifest.load(workspace)
+
+
+@contextmanager
+def manifest_context(manifest):
+    """Make manifest the current one inside this block."""
+    token = _current.set(manifest)
+    try:
+        yield manifest
+    finally:
+        _current.reset(token)
@@ -0,0 +1,842 @@
+# job_runner.py — job model shared by main.py (FastAPI) and app.py (Flask)
+#
+# submit -> poll /status/<job_id> (or stream /events/<job_id>) -> fetch /download/<job_id>
+# Jobs go through a small intake pool (ASR, caches, coalescing) and are then
+# scheduled by predicted cost on short/long lanes (job_scheduler.py). Job
+# records are kept in memory and mirrored to JSON files so every worker
+# process of a gunicorn/uvicorn deployment sees the same job states. Each job
+# checkpoints into a manifest in its workspace (job_manifest.py); jobs whose
+# process died are picked up again by resume_interrupted_jobs() when the app
+# starts. cancel_job() stops a queued or running job (process_utils.py) and
+# drops its partial files.
+
+import json
+import os
+import subprocess
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: resume claims are only serialized per process
+    fcntl = None
+
+from voicemation import process_speech, estimate_duration_auto, revise_scenes
+from subtitle_utils import parse_srt_to_json
+from pipeline_stub import STUB_ENABLED, stub_transcribe, stub_process_speech
+from metrics_utils import (
+    span,
+    job_context,
+    get_job_spans,
+    stage_totals,
+    job_llm_usage,
+    record_cache,
+    JOBS_TOTAL,
+    QUEUE_DEPTH,
+    ACTIVE_JOBS,
+    ASR_AUDIO_SECONDS,
+)
+from workspace_utils import JOB_RECORD_DIR, create_workspace, remove_workspace
+from singleflight import flight_key, join_or_lead, finish, leave, abandon
+from prompt_templates import duration_tier
+from job_manifest import CHECKPOINTS_ENABLED, JobManifest, manifest_context, current_manifest
+from process_utils import JobCancelled, cancel_scope, check_cancelled, request_cancel
+from rendition_utils import rendition_fields
+from vad_utils import VAD_ENABLED, trim_silence
+import scene_store
+from scene_store import SCENE_EDITS_ENABLED
+import topic_cache
+import job_events
+from job_scheduler import scheduler, lane_for
+from cost_model import cost_model
+
+if STUB_ENABLED:
+    # load-test mode: HTTP, queueing and job store only (see loadtest.py)
+    process_speech = stub_process_speech
+
+# -------------------------
+# Configuration
+# -------------------------
+FFMPEG_BIN = os.environ.get("FFMPEG_BIN", "ffmpeg")
+# ASR, cache lookups and coalescing; generation runs on job_scheduler's workers
+INTAKE_WORKERS = int(os.environ.get("VOICEMATION_INTAKE_WORKERS", "2"))
+# Jobs waiting (for intake or a generation worker) beyond this are rejected (HTTP 503)
+MAX_QUEUED_JOBS = int(os.environ.get("VOICEMATION_MAX_QUEUED_JOBS", "32"))
+# A job that keeps taking its process down is failed after this many resumes
+MAX_RESUMES = int(os.environ.get("VOICEMATION_MAX_RESUMES", "2"))
+
+# Record fields used to resume a job; not part of the status response
+_RESUME_FIELDS = ("wav_path", "workspace", "manual_duration", "pid", "flight_key")
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class RevisionError(Exception):
+    """A revision that can't be queued; status_code is 400 (bad edits) or 409 (job not revisable)."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# -------------------------
+# Job store
+# -------------------------
+class JobStore:
+    """
+    dict-like job records, mirrored to <JOB_RECORD_DIR>/<job_id>.json.
+    Status changes are published to the job's event stream. Other worker
+    processes write records too (coalesced followers, cancels), so a cached
+    record is only used while its file is unchanged since it was cached.
+    """
+
+    def __init__(self, record_dir=JOB_RECORD_DIR):
+        self.record_dir = record_dir
+        self._jobs = {}
+        # job id -> (mtime_ns, size) of the record file _jobs[job_id] matches
+        self._stamps = {}
+        self._lock = threading.Lock()
+        # one per job: update() reads and writes the record under it
+        self._update_locks = {}
+        os.makedirs(record_dir, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.record_dir, f"{os.path.basename(job_id)}.json")
+
+    def _stamp(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def __setitem__(self, job_id, record):
+        tmp = self._path(job_id) + ".tmp"
+        stamp = None
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(record, f)
+            # taken before the rename (which keeps it), so a write by another process right after isn't mistaken for ours
+            stamp = self._stamp(tmp)
+            os.replace(tmp, self._path(job_id))
+        except OSError as e:
+            print("⚠️ Could not persist job record:", e)
+        with self._lock:
+            previous = self._jobs.get(job_id) or {}
+            self._jobs[job_id] = record
+            self._stamps[job_id] = stamp
+        # open event streams of this job (job_events.py) see status changes and the result
+        job_events.publish_status(job_id, record, previous.get("status"))
+
+    def _read(self, job_id):
+        """The record file's record (None if absent); refreshes the cached record of a job cached here."""
+        path = self._path(job_id)
+        stamp = self._stamp(path)
+        try:
+            with open(path, encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id] = record
+                self._stamps[job_id] = stamp
+        return record
+
+    def get(self, job_id, default=None):
+        stamp = self._stamp(self._path(job_id))
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is not None and (stamp is None or stamp == self._stamps.get(job_id)):
+                # unchanged since cached (or never persisted)
+                return record
+        # changed by another worker process, or not cached here
+        fresh = self._read(job_id)
+        if fresh is None:
+            return record if record is not None else default
+        return fresh
+
+    def get_fresh(self, job_id, default=None):
+        """Like get(), but always reads the file (right before acting on the status)."""
+        record = self._read(job_id)
+        if record is None:
+            return self.get(job_id, default)
+        return record
+
+    def __getitem__(self, job_id):
+        record = self.get(job_id)
+        if record is None:
+            raise KeyError(job_id)
+        return record
+
+    def __contains__(self, job_id):
+        return self.get(job_id) is not None
+
+    def is_local(self, job_id):
+        """True if the record was written by this process."""
+        with self._lock:
+            return job_id in self._jobs
+
+    def update(self, job_id, **fields):
+        """Merge fields into the record; concurrent updates of one job in this process don't lose fields."""
+        with self._lock:
+            update_lock = self._update_locks.setdefault(job_id, threading.Lock())
+        with update_lock:
+            record = dict(self.get_fresh(job_id, {}))
+            record.update(fields)
+            self[job_id] = record
+        return record
+
+    def pop(self, job_id, default=None):
+        with self._lock:
+            record = self._jobs.pop(job_id, default)
+            self._stamps.pop(job_id, None)
+            self._update_locks.pop(job_id, None)
+        try:
+            os.remove(self._path(job_id))
+        except OSError:
+            pass
+        return record
+
+
+jobs = JobStore()
+_executor = ThreadPoolExecutor(max_workers=INTAKE_WORKERS, thread_name_prefix="voicemation-intake")
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+# -----------------------
+# Helpers
+# -----------------------
+def ffprobe_duration(path: str) -> float:
+    try:
+        proc = subprocess.run(
+            [FFMPEG_BIN.replace("ffmpeg", "ffprobe"),
+             "-v", "error",
+             "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1",
+             path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+        return float(proc.stdout.strip())
+    except Exception:
+        return 0.0
+
+
+def scale_subtitles_to_video(subs, video_duration):
+    if not subs:
+        return subs
+
+    last_end = subs[-1]["end"]
+    if last_end <= 0:
+        return subs
+
+    scale = video_duration / last_end
+    scaled = []
+
+    for s in subs:
+        start = round(s["start"] * scale, 3)
+        end = round(s["end"] * scale, 3)
+        if end <= start:
+            end = start + 0.01
+        scaled.append({
+            "start": start,
+            "end": end,
+            "text": s["text"]
+        })
+
+    return scaled
+
+
+def decode_upload(job_id: str, webm_path: str, wav_path: str):
+    """ffmpeg: uploaded webm -> wav. Raises CalledProcessError / OSError on failure."""
+    with span("upload_decode", job_id=job_id):
+        subprocess.run(
+            # mono 16 kHz is all the recognizer uses; a third of the 48 kHz stereo payload
+            [FFMPEG_BIN, "-y", "-i", webm_path, "-ac", "1", "-ar", "16000", wav_path],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    if os.path.exists(webm_path):
+        os.remove(webm_path)
+
+
+def transcribe_wav(wav_path: str) -> str:
+    """Google speech recognition on a wav file (canned text in stub mode)."""
+    if STUB_ENABLED:
+        return stub_transcribe(wav_path)
+    import speech_recognition as sr
+
+    recognizer = sr.Recognizer()
+    with sr.AudioFile(wav_path) as source:
+        audio_data = recognizer.record(source)
+    return recognizer.recognize_google(audio_data)
+
+
+# -----------------------
+# Background job
+# -----------------------
+def run_generation_job(job_id: str, wav_path: str, manual_duration, workspace: str):
+    """
+    Intake on the FIFO intake pool: ASR, topic cache and coalescing. A job
+    that still needs a generation is handed to the lane scheduler.
+    """
+    QUEUE_DEPTH.dec()
+    ACTIVE_JOBS.inc()
+    scheduled = False
+    try:
+        with job_context(job_id), cancel_scope(workspace):
+            try:
+                # cancelled while queued: the marker is already there
+                check_cancelled()
+                jobs.update(job_id, status="processing", started_at=time.time(), pid=os.getpid())
+                manifest = JobManifest.load(workspace)
+                with manifest_context(manifest):
+                    scheduled = _run_intake(job_id, wav_path, manual_duration, workspace, manifest)
+            except JobCancelled:
+                print(f"🛑 Job {job_id} cancelled")
+                remove_workspace(workspace)
+                jobs.update(job_id, status="cancelled", finished_at=time.time())
+    finally:
+        ACTIVE_JOBS.dec()
+        if not scheduled:
+            _release_pending()
+            _count_finished(job_id)
+
+
+def _release_pending():
+    """The job no longer waits (for intake or a generation worker)."""
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+def _count_finished(job_id):
+    status = jobs.get_fresh(job_id, {}).get("status", "unknown")
+    # coalesced followers are still "processing"; their leader counts them
+    if status not in ("queued", "processing"):
+        JOBS_TOTAL.inc(status=status)
+
+
+def _run_intake(job_id, wav_path, manual_duration, workspace, manifest):
+    """True if the job was scheduled for generation, False if it is settled here."""
+    created_at = jobs.get(job_id, {}).get("created_at")
+    asr = manifest.stage("asr")
+    if asr:
+        speech_text = asr["transcript"]
+    else:
+        speech_text, asr_error = _transcribe(wav_path)
+        if asr_error:
+            _finish_record(job_id, {**asr_error, "created_at": created_at})
+            remove_workspace(workspace)
+            return False
+        manifest.complete_stage("asr", transcript=speech_text)
+    check_cancelled()
+
+    # same topic and duration tier generated before? serve that video
+    desired_duration = manual_duration or estimate_duration_auto(speech_text)
+    tier = duration_tier(desired_duration)["name"]
+    cached = topic_cache.lookup(speech_text, tier)
+    record_cache("topic", cached is not None)
+    if cached:
+        print(f"♻️ Job {job_id}: topic cache hit ({cached['similarity']}) -> {cached['video_path']}")
+        _finish_record(job_id, {
+            "status": "done",
+            "created_at": created_at,
+            "finished_at": time.time(),
+            "transcript": speech_text,
+            "video_path": cached["video_path"],
+            "video_url": f"/videos/{os.path.basename(cached['video_path'])}",
+            **rendition_fields(cached["video_path"]),
+            "subtitles": cached["subtitles"],
+            "duration": cached["duration"],
+            "cache_hit": {"transcript": cached["transcript"], "similarity": cached["similarity"]},
+        })
+        remove_workspace(workspace)
+        return False
+
+    # identical request already running? attach to it and free this worker
+    key = flight_key(speech_text, manual_duration)
+    leader = join_or_lead(key, job_id)
+    record_cache("singleflight", leader is not None)
+    if leader is not None:
+        print(f"🔗 Job {job_id} coalesced with running job {leader}")
+        jobs.update(job_id, transcript=speech_text, coalesced_with=leader, flight_key=key)
+        remove_workspace(workspace)
+        return False
+
+    lane, predicted = lane_for(desired_duration), scheduler.predict_seconds(desired_duration)
+    print(f"🚦 Job {job_id}: {lane} lane, ~{predicted:.0f}s predicted")
+    # waiting for a generation worker counts as queued again; written before the
+    # submit, since an idle worker marks the job processing right away
+    jobs.update(job_id, status="queued", transcript=speech_text, flight_key=key,
+                lane=lane, predicted_seconds=predicted)
+    scheduler.submit(
+        _run_generation, job_id, speech_text, manual_duration, desired_duration, workspace, manifest, key,
+        desired_duration=desired_duration, job_id=job_id, cost=predicted,
+    )
+    return True
+
+
+def _run_generation(job_id, speech_text, manual_duration, desired_duration, workspace, manifest, key):
+    """Generation on a scheduler worker; writes the result to the job and its followers."""
+    _release_pending()
+    ACTIVE_JOBS.inc()
+    started = time.perf_counter()
+    status = None
+    try:
+        with job_context(job_id), cancel_scope(workspace), manifest_context(manifest):
+            status = _generate_and_finish(job_id, speech_text, manual_duration, desired_duration, workspace, key)
+    finally:
+        ACTIVE_JOBS.dec()
+        # finished generations train the cost model behind predictions and ETAs
+        if status == "done":
+            cost_model.record_job(job_id, desired_duration, time.perf_counter() - started)
+        else:
+            cost_model.discard(job_id)
+        _count_finished(job_id)
+
+
+def _generate_and_finish(job_id, speech_text, manual_duration, desired_duration, workspace, key):
+    """Returns the generation's status (done, error or cancelled)."""
+    created_at = jobs.get(job_id, {}).get("created_at")
+    tier = duration_tier(desired_duration)["name"]
+    result = {}
+    try:
+        check_cancelled()
+        jobs.update(job_id, status="processing", generation_started_at=time.time())
+        result = _generate(speech_text, manual_duration, workspace)
+        if result["status"] == "done":
+            _keep_scenes(job_id, (current_manifest().peek("final") or {}).get("scenes"))
+    except JobCancelled:
+        print(f"🛑 Job {job_id} cancelled")
+        result = {"status": "cancelled", "finished_at": time.time()}
+    finally:
+        # wav, scene files, narration, subtitles and renders all live here
+        remove_workspace(workspace)
+        result = result or {
+            "status": "error",
+            "error": "Generation interrupted",
+        }
+        if result["status"] == "done":
+            topic_cache.store(speech_text, tier, result["video_path"], result["subtitles"], result["duration"])
+        _finish_record(job_id, {**result, "created_at": created_at, "transcript": speech_text})
+        outcome = result["status"]
+        if result["status"] == "cancelled":
+            # only reachable by followers that joined while the cancel was on its way
+            result = {"status": "error", "error": "Generation cancelled, please retry"}
+        for follower in finish(key, job_id):
+            follower_record = jobs.get_fresh(follower, {})
+            if _finish_record(follower, {
+                **result,
+                "created_at": follower_record.get("created_at"),
+                "transcript": speech_text,
+                "coalesced_with": job_id,
+            }):
+                JOBS_TOTAL.inc(status=result["status"])
+    return outcome
+
+
+def _finish_record(job_id, record):
+    """Write a job's final record, unless the job was cancelled meanwhile."""
+    if jobs.get_fresh(job_id, {}).get("status") == "cancelled":
+        # get_fresh also replaced what this process cached (the cancel may come from another one)
+        return False
+    jobs[job_id] = record
+    return True
+
+
+def _transcribe(wav_path):
+    """(transcript, None) or (None, error part of a job record)."""
+    import speech_recognition as sr
+
+    try:
+        wav_path = _trim_for_asr(wav_path)
+        with span("asr"):
+            return transcribe_wav(wav_path), None
+    except sr.UnknownValueError:
+        return None, {"status": "error", "error": "Could not understand audio"}
+    except sr.RequestError as e:
+        return None, {"status": "error", "error": "Speech recognition service unavailable", "detail": str(e)}
+    except Exception as e:
+        return None, {"status": "error", "error": str(e), "trace": traceback.format_exc()}
+
+
+def _trim_for_asr(wav_path):
+    """The upload with its silences dropped (vad_utils), or as is when trimming is off or fails."""
+    if not VAD_ENABLED:
+        return wav_path
+    with span("vad") as attrs:
+        try:
+            trimmed, raw_seconds, trimmed_seconds = trim_silence(wav_path)
+        except Exception as e:  # unreadable wav: the recognizer reports it properly
+            print("⚠️ Silence trimming skipped:", e)
+            return wav_path
+        # before/after length on the job's trace; recognition latency is the asr span
+        attrs.update(audio_seconds=round(raw_seconds, 2), trimmed_seconds=round(trimmed_seconds, 2))
+    ASR_AUDIO_SECONDS.observe(raw_seconds, audio="raw")
+    ASR_AUDIO_SECONDS.observe(trimmed_seconds, audio="trimmed")
+    return trimmed
+
+
+def _generate(speech_text, manual_duration, workspace):
+    """Run the pipeline for a transcript; returns the done or error part of a job record."""
+    try:
+        video_path, srt_files = process_speech(
+            speech_text,
+            return_srt=True,
+            manual_duration=manual_duration,
+            workspace=workspace,
+        )
+        if not video_path or not os.path.exists(video_path):
+            raise RuntimeError("Failed to generate video")
+        return _done_record(video_path, srt_files)
+    except Exception as e:
+        return {
+            "status": "error",
+            "error": str(e),
+            "trace": traceback.format_exc(),
+        }
+
+
+def _done_record(video_path, srt_files):
+    """The done part of a job record for a published video and its scenes' SRT files."""
+    subtitles = []
+    for srt in srt_files or []:
+        if os.path.exists(srt):
+            subtitles.extend(parse_srt_to_json(srt))
+
+    with span("probe"):
+        duration = ffprobe_duration(video_path)
+    if subtitles and duration > 0:
+        subtitles = scale_subtitles_to_video(subtitles, duration)
+
+    return {
+        "status": "done",
+        "finished_at": time.time(),
+        "video_path": video_path,
+        # content-addressed URL: safe to cache forever
+        "video_url": f"/videos/{os.path.basename(video_path)}",
+        **rendition_fields(video_path),
+        "subtitles": subtitles,
+        "duration": duration,
+    }
+
+
+def _keep_scenes(job_id, scenes):
+    """Store a finished job's scenes for revisions; a failure only costs the revisions."""
+    if not SCENE_EDITS_ENABLED or not scenes:
+        return
+    try:
+        with span("keep_scenes", scenes=len(scenes)):
+            scene_store.save(job_id, scenes)
+    except OSError as e:
+        print(f"⚠️ Could not store the scenes of job {job_id}:", e)
+
+
+def submit_job(job_id: str, wav_path: str, manual_duration, workspace: str):
+    """
+    Queue a job on the bounded executor. Raises QueueFullError when
+    MAX_QUEUED_JOBS are already waiting, so the caller can answer 503.
+    """
+    global _pending
+    with _pending_lock:
+        if _pending >= MAX_QUEUED_JOBS:
+            raise QueueFullError("Too many jobs queued, try again later")
+        _pending += 1
+    QUEUE_DEPTH.inc()
+    jobs[job_id] = {
+        "status": "queued",
+        "created_at": time.time(),
+        "wav_path": wav_path,
+        "workspace": workspace,
+        "manual_duration": manual_duration,
+        "pid": os.getpid(),
+    }
+    _executor.submit(run_generation_job, job_id, wav_path, manual_duration, workspace)
+
+
+# -----------------------
+# Revisions
+# -----------------------
+def get_job_scenes(job_id: str):
+    """The revisable scenes of a job (1-based scene, class, narration, code), or None."""
+    record = jobs.get(job_id)
+    if record is None:
+        return None
+    scenes = scene_store.load(job_id) or scene_store.load(record.get("coalesced_with"))
+    return [
+        {"scene": i, "class_name": s["class_name"], "narration": s["explanation"], "code": s["code"]}
+        for i, s in enumerate(scenes or [], start=1)
+    ]
+
+
+def _parse_edits(edits, scene_count):
+    """[{"scene": n, "narration"?: text, "code"?: text}, ...] -> {n - 1: {...}}."""
+    if not isinstance(edits, list) or not edits:
+        raise RevisionError("Give a non-empty list of scene edits")
+    parsed = {}
+    for edit in edits:
+        scene = edit.get("scene") if isinstance(edit, dict) else None
+        if not isinstance(scene, int) or isinstance(scene, bool) or not 1 <= scene <= scene_count:
+            raise RevisionError(f"Each edit needs a scene number from 1 to {scene_count}")
+        change = {key: edit[key] for key in ("narration", "code") if edit.get(key) is not None}
+        if not change:
+            raise RevisionError(f"Scene {scene}: give a new narration and/or code")
+        for key, value in change.items():
+            if not isinstance(value, str) or not value.strip():
+                raise RevisionError(f"Scene {scene}: {key} must be non-empty text")
+        parsed.setdefault(scene - 1, {}).update(change)
+    return parsed
+
+
+def submit_revision(job_id: str, edits):
+    """
+    Queue a revision of finished job job_id that re-runs only the edited
+    scenes (narration: TTS + mux, code: render + mux) and stream-copies the
+    others into a new video. Returns the revision's job id, None if job_id is
+    unknown. Raises RevisionError or QueueFullError.
+    """
+    global _pending
+    parent = jobs.get_fresh(job_id)
+    if parent is None:
+        return None
+    if parent.get("status") != "done":
+        raise RevisionError(f"Job is {parent.get('status')}; only finished jobs can be revised", 409)
+    scenes = scene_store.load(job_id) or scene_store.load(parent.get("coalesced_with"))
+    if not scenes:
+        raise RevisionError("The scenes of this job are no longer stored", 409)
+    parsed = _parse_edits(edits, len(scenes))
+
+    with _pending_lock:
+        if _pending >= MAX_QUEUED_JOBS:
+            raise QueueFullError("Too many jobs queued, try again later")
+        _pending += 1
+    QUEUE_DEPTH.inc()
+
+    revision_id = uuid.uuid4().hex
+    workspace = create_workspace(revision_id)
+    # the edited share of the video, for the lane and the cost prediction
+    desired_duration = max((parent.get("duration") or 0) * len(parsed) / len(scenes), 1.0)
+    lane, predicted = lane_for(desired_duration), scheduler.predict_seconds(desired_duration)
+    # complete before the submit, since an idle worker marks it processing right away
+    jobs[revision_id] = {
+        "status": "queued",
+        "created_at": time.time(),
+        "transcript": parent.get("transcript"),
+        "revision_of": job_id,
+        "revised_scenes": sorted(i + 1 for i in parsed),
+        "workspace": workspace,
+        "pid": os.getpid(),
+        "lane": lane,
+        "predicted_seconds": predicted,
+    }
+    scheduler.submit(
+        _run_revision, revision_id, job_id, scenes, parsed, workspace,
+        desired_duration=desired_duration, job_id=revision_id, cost=predicted,
+    )
+    return revision_id
+
+
+def _run_revision(revision_id, parent_id, scenes, edits, workspace):
+    """Revision on a scheduler worker; writes the result to the revision's record."""
+    QUEUE_DEPTH.dec()
+    _release_pending()
+    ACTIVE_JOBS.inc()
+    try:
+        with job_context(revision_id), cancel_scope(workspace), manifest_context(JobManifest()):
+            _revise_and_finish(revision_id, parent_id, scenes, edits, workspace)
+    finally:
+        ACTIVE_JOBS.dec()
+        # a few re-run scenes say little about what a whole generation costs
+        cost_model.discard(revision_id)
+        _count_finished(revision_id)
+
+
+def _revise_and_finish(revision_id, parent_id, scenes, edits, workspace):
+    record = jobs.get(revision_id, {})
+    result = {}
+    try:
+        check_cancelled()
+        jobs.update(revision_id, status="processing", generation_started_at=time.time())
+        with span("revision", scenes=len(edits)):
+            video_path, revised = revise_scenes(scenes, edits, work_dir=workspace)
+        if not video_path or not os.path.exists(video_path):
+            raise RuntimeError("Failed to rebuild the video")
+        result = _done_record(video_path, [s["srt_path"] for s in revised if s.get("srt_path")])
+        _keep_scenes(revision_id, revised)
+    except JobCancelled:
+        print(f"🛑 Revision {revision_id} cancelled")
+        result = {"status": "cancelled", "finished_at": time.time()}
+    except Exception as e:
+        result = {"status": "error", "error": str(e), "trace": traceback.format_exc()}
+    finally:
+        remove_workspace(workspace)
+        result = result or {"status": "error", "error": "Revision interrupted"}
+        _finish_record(revision_id, {
+            **result,
+            "created_at": record.get("created_at"),
+            "transcript": record.get("transcript"),
+            "revision_of": parent_id,
+            "revised_scenes": record.get("revised_scenes"),
+        })
+
+
+def cancel_job(job_id: str):
+    """
+    Cancel a queued or processing job; returns its record (None if unknown).
+    Finished jobs are returned unchanged. The job's worker, in whichever
+    process, notices the marker in the workspace, kills its manim/ffmpeg
+    process groups and removes the workspace. A job whose generation other
+    coalesced jobs are waiting for is only detached: the work goes on for them.
+    """
+    record = jobs.get_fresh(job_id)
+    if record is None or record.get("status") not in ("queued", "processing"):
+        return record
+
+    key = record.get("flight_key")
+    if record.get("coalesced_with"):
+        # the leader keeps going for everyone else; nothing runs for this job
+        leave(key, job_id)
+        JOBS_TOTAL.inc(status="cancelled")
+    elif abandon(key, job_id):
+        request_cancel(record.get("workspace"))
+    else:
+        print(f"🔗 Job {job_id} cancelled, generation continues for coalesced jobs")
+    return jobs.update(job_id, status="cancelled", finished_at=time.time())
+
+
+# -----------------------
+# Resume after a crash or restart
+# -----------------------
+@contextmanager
+def _resume_lock():
+    """Serializes resume scans of all worker processes."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(JOB_RECORD_DIR, "resume.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _owner_alive(job_id, record):
+    pid = record.get("pid")
+    if pid == os.getpid():
+        # our pid on a record we didn't write: left by a previous container/process
+        return jobs.is_local(job_id)
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def resume_interrupted_jobs():
+    """
+    Re-queue jobs left queued or processing by a process that no longer runs.
+    They continue from the checkpoints in their workspace manifest. Jobs whose
+    workspace is gone, or that were resumed MAX_RESUMES times already, fail.
+    Call once per process at startup; returns the resumed job ids.
+    """
+    global _pending
+    if not CHECKPOINTS_ENABLED or not os.path.isdir(JOB_RECORD_DIR):
+        return []
+    resumed = []
+    followers = {}
+    with _resume_lock():
+        for name in sorted(os.listdir(JOB_RECORD_DIR)):
+            if not name.endswith(".json"):
+                continue
+            job_id = name[:-len(".json")]
+            record = jobs.get(job_id)
+            if not record or record.get("status") not in ("queued", "processing"):
+                continue
+            if record.get("coalesced_with"):
+                followers[job_id] = record
+                continue
+            if _owner_alive(job_id, record):
+                continue
+
+            workspace = record.get("workspace")
+            attempts = record.get("resume_attempts", 0)
+            # revisions are cheap to resubmit and have no upload to resume from
+            if not workspace or not os.path.isdir(workspace) or attempts >= MAX_RESUMES \
+                    or record.get("revision_of"):
+                jobs[job_id] = {
+                    "status": "error",
+                    "error": "Generation interrupted",
+                    "created_at": record.get("created_at"),
+                    "transcript": record.get("transcript"),
+                }
+                JOBS_TOTAL.inc(status="error")
+                remove_workspace(workspace)
+                continue
+
+            print(f"🔁 Resuming interrupted job {job_id} (attempt {attempts + 1})")
+            with _pending_lock:
+                _pending += 1
+            QUEUE_DEPTH.inc()
+            jobs.update(job_id, status="queued", pid=os.getpid(), resume_attempts=attempts + 1)
+            _executor.submit(run_generation_job, job_id, record["wav_path"], record.get("manual_duration"), workspace)
+            resumed.append(job_id)
+
+        # followers of a leader that finished (or failed) while nobody could hand its result over
+        for job_id, record in followers.items():
+            leader = jobs.get(record["coalesced_with"], {})
+            if leader.get("status") in ("done", "error"):
+                result = {k: v for k, v in leader.items() if k not in _RESUME_FIELDS}
+                jobs[job_id] = {**result, "created_at": record.get("created_at"),
+                                "transcript": record.get("transcript"), "coalesced_with": record["coalesced_with"]}
+                JOBS_TOTAL.inc(status=leader["status"])
+    return resumed
+
+
+def get_job_view(job_id: str):
+    """Job record plus its stage spans, or None if the job is unknown."""
+    job = jobs.get(job_id)
+    if job is None:
+        return None
+    return {
+        **{k: v for k, v in job.items() if k not in _RESUME_FIELDS},
+        "job_id": job_id,
+        "eta_seconds": _eta_seconds(job_id, job),
+        "stages": get_job_spans(job_id),
+        "stage_totals": stage_totals(job_id),
+        "llm_usage": job_llm_usage(job_id),
+    }
+
+
+def _eta_seconds(job_id, job):
+    """
+    Seconds until the job should be done, or None before its cost is known
+    (intake) and once it finished. Waiting jobs add the predicted work ahead
+    of them when they wait in this process; generating ones use the scene
+    throughput measured so far, or the prediction before the first scene.
+    """
+    predicted = job.get("predicted_seconds")
+    if predicted is None:
+        return None
+    if job.get("status") == "queued":
+        return round(predicted + (scheduler.expected_wait(job_id) or 0.0), 1)
+    if job.get("status") == "processing" and job.get("generation_started_at"):
+        eta = job_events.latest_eta(job_id)
+        if eta is not None:
+            return eta
+        return round(max(predicted - (time.time() - job["generation_started_at"]), 0.0), 1)
+    return None
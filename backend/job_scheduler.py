@@ -0,0 +1,181 @@
+# job_scheduler.py — cost-aware scheduling of generation work
+#
+# After intake (ASR, caches, coalescing) a job knows its duration tier and is
+# handed to the LaneScheduler instead of a FIFO pool:
+#
+# - Lanes: tiers up to VOICEMATION_SHORT_LANE_MAX_SECONDS are "short", the rest
+#   "long". VOICEMATION_SHORT_LANE_WORKERS of the JOB_WORKERS generation workers
+#   never take long jobs, so a 30 s explainer never waits behind 16-scene
+#   renders on every worker.
+# - Within what a free worker may take, the job with the smallest predicted
+#   cost goes first (shortest job first, FIFO among equals).
+# - Starvation protection: a job waiting longer than VOICEMATION_SCHED_MAX_WAIT
+#   seconds goes before any newer job, oldest first.
+#
+# Predicted cost comes from the learned cost model (cost_model.py).
+import itertools
+import os
+import threading
+import time
+
+from metrics_utils import LANE_QUEUE_DEPTH, LANE_RUNNING, LANE_WAIT_SECONDS, register_collector
+from prompt_templates import DURATION_TIERS
+from cost_model import cost_model
+
+JOB_WORKERS = int(os.environ.get("VOICEMATION_JOB_WORKERS", "2"))
+SHORT_LANE_MAX_SECONDS = int(os.environ.get("VOICEMATION_SHORT_LANE_MAX_SECONDS", "60"))
+SHORT_LANE_WORKERS = int(os.environ.get("VOICEMATION_SHORT_LANE_WORKERS", "1" if JOB_WORKERS > 1 else "0"))
+MAX_WAIT_SECONDS = float(os.environ.get("VOICEMATION_SCHED_MAX_WAIT", "300"))
+
+LANES = ("short", "long")
+
+
+def lane_for(desired_duration):
+    return "short" if desired_duration <= SHORT_LANE_MAX_SECONDS else "long"
+
+
+class LaneScheduler:
+    """Runs submitted callables on `workers` threads, picking by lane, cost and age."""
+
+    def __init__(self, workers=JOB_WORKERS, short_workers=SHORT_LANE_WORKERS, max_wait=MAX_WAIT_SECONDS):
+        self.workers = max(workers, 1)
+        # long jobs may use every worker but the reserved ones
+        self.long_limit = max(self.workers - min(short_workers, self.workers - 1), 1)
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._running = {lane: 0 for lane in LANES}
+        self._active = []
+        self._seq = itertools.count()
+        self._threads = []
+
+    def predict_seconds(self, desired_duration):
+        return cost_model.predict_seconds(desired_duration)
+
+    # -------------------------
+    # Queueing
+    # -------------------------
+    def submit(self, fn, *args, desired_duration, job_id=None, cost=None):
+        """Queue fn(*args); returns (lane, predicted seconds). cost: a prediction the caller already made."""
+        lane = lane_for(desired_duration)
+        cost = self.predict_seconds(desired_duration) if cost is None else cost
+        entry = {
+            "seq": next(self._seq),
+            "job_id": job_id,
+            "lane": lane,
+            "cost": cost,
+            "enqueued": time.monotonic(),
+            "call": (fn, args),
+        }
+        with self._cond:
+            self._start_workers()
+            self._waiting.append(entry)
+            LANE_QUEUE_DEPTH.inc(lane=lane)
+            self._cond.notify_all()
+        return lane, cost
+
+    def position(self, job_id):
+        """1-based position of a waiting job in dispatch order right now, or None."""
+        with self._cond:
+            order = sorted(self._waiting, key=self._priority)
+        for i, entry in enumerate(order, start=1):
+            if entry["job_id"] == job_id:
+                return i
+        return None
+
+    def expected_wait(self, job_id):
+        """
+        Seconds until a waiting job should start: predicted work ahead of it
+        (including what running jobs have left) spread over all workers.
+        None if the job isn't waiting here.
+        """
+        with self._cond:
+            now = time.monotonic()
+            order = sorted(self._waiting, key=self._priority)
+            running_left = sum(max(e["cost"] - (now - e["started"]), 0.0) for e in self._active)
+        ahead = 0.0
+        for entry in order:
+            if entry["job_id"] == job_id:
+                return round((running_left + ahead) / self.workers, 1)
+            ahead += entry["cost"]
+        return None
+
+    def stats(self):
+        with self._cond:
+            waiting = {lane: sum(1 for e in self._waiting if e["lane"] == lane) for lane in LANES}
+            return {
+                "workers": self.workers,
+                "long_limit": self.long_limit,
+                "waiting": waiting,
+                "running": dict(self._running),
+            }
+
+    def _priority(self, entry):
+        waited = time.monotonic() - entry["enqueued"]
+        if waited > self.max_wait:
+            return (0, entry["seq"], 0)
+        return (1, entry["cost"], entry["seq"])
+
+    def _pick(self):
+        # caller holds self._cond
+        busy = sum(self._running.values())
+        if busy >= self.workers:
+            return None
+        eligible = [
+            e for e in self._waiting
+            if e["lane"] == "short" or self._running["long"] < self.long_limit
+        ]
+        if not eligible:
+            return None
+        entry = min(eligible, key=self._priority)
+        self._waiting.remove(entry)
+        return entry
+
+    def _start_workers(self):
+        # caller holds self._cond
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._work, name=f"voicemation-job-{len(self._threads)}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                entry = self._pick()
+                while entry is None:
+                    # wake up periodically so aged jobs get promoted
+                    self._cond.wait(timeout=5)
+                    entry = self._pick()
+                lane = entry["lane"]
+                entry["started"] = time.monotonic()
+                self._active.append(entry)
+                self._running[lane] += 1
+                LANE_QUEUE_DEPTH.dec(lane=lane)
+                LANE_RUNNING.inc(lane=lane)
+            LANE_WAIT_SECONDS.observe(time.monotonic() - entry["enqueued"], lane=lane)
+            fn, args = entry["call"]
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"⚠️ Scheduled job {entry['job_id']} raised:", e)
+            finally:
+                with self._cond:
+                    self._active.remove(entry)
+                    self._running[lane] -= 1
+                    LANE_RUNNING.dec(lane=lane)
+                    self._cond.notify_all()
+
+
+scheduler = LaneScheduler()
+
+
+@register_collector
+def _scheduler_metrics():
+    lines = [
+        "# HELP voicemation_predicted_job_seconds Predicted generation time per duration tier",
+        "# TYPE voicemation_predicted_job_seconds gauge",
+    ]
+    for tier in DURATION_TIERS:
+        seconds = tier["max_seconds"] or 300
+        lines.append(f'voicemation_predicted_job_seconds{{tier="{tier["name"]}"}} {scheduler.predict_seconds(seconds)}')
+    return lines
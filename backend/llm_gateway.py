@@ -0,0 +1,249 @@
+# llm_gateway.py — one process-wide chat-completions client for the pipeline
+#
+# - a single ChatCompletionsClient whose requests session keeps pooled
+#   keep-alive connections (no TLS handshake per job)
+# - per-attempt connect/read timeouts plus an overall deadline per call
+# - retries on 429 / 5xx / connection errors with jittered exponential backoff
+#   (honours Retry-After)
+# - a semaphore capping concurrent in-flight requests
+# - an answer cut off at max_tokens is retried once with a larger budget, then
+#   fails (complete_text) instead of silently losing its last scene
+# - latency and token usage go to the metrics registry and the job trace
+#
+# Point VOICEMATION_LLM_ENDPOINT at llm_standin.py to run without the real API.
+# The azure SDK and requests are imported when the client is first built, so
+# importing the pipeline (and the web apps) stays cheap; see warmup.py.
+import os
+import random
+import threading
+import time
+
+from metrics_utils import span, LLM_CALL_SECONDS, LLM_REQUESTS, LLM_TOKENS, LLM_INFLIGHT
+from process_utils import check_cancelled
+
+# -------------------------
+# Configuration
+# -------------------------
+LLM_ENDPOINT = os.environ.get("VOICEMATION_LLM_ENDPOINT", "https://models.github.ai/inference")
+LLM_MODEL = os.environ.get("VOICEMATION_LLM_MODEL", "gpt-4.1")
+LLM_CONNECT_TIMEOUT = float(os.environ.get("VOICEMATION_LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.environ.get("VOICEMATION_LLM_READ_TIMEOUT", "120"))
+# whole call including retries and backoff
+LLM_DEADLINE_SECONDS = float(os.environ.get("VOICEMATION_LLM_DEADLINE", "300"))
+LLM_MAX_RETRIES = int(os.environ.get("VOICEMATION_LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.environ.get("VOICEMATION_LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.environ.get("VOICEMATION_LLM_BACKOFF_MAX", "30"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("VOICEMATION_LLM_MAX_CONCURRENCY", "4"))
+# a completion cut off at max_tokens is retried once with this many times the budget
+LLM_TRUNCATION_RETRY_FACTOR = float(os.environ.get("VOICEMATION_LLM_TRUNCATION_RETRY_FACTOR", "2"))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    pass
+
+
+class LLMTruncated(RuntimeError):
+    """The completion stopped at max_tokens, also after a retry with a larger budget."""
+
+
+def _backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff; a server Retry-After wins if larger."""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def _retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error):
+    try:
+        from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+    except ImportError:  # a client from set_client() without the SDK installed
+        return False
+
+    if isinstance(error, (ServiceRequestError, ServiceResponseError)):
+        return True  # connection reset, DNS, read timeout
+    if isinstance(error, HttpResponseError):
+        return error.status_code in RETRYABLE_STATUS
+    return False
+
+
+class LLMGateway:
+    def __init__(self, endpoint=LLM_ENDPOINT, model=LLM_MODEL, max_concurrency=LLM_MAX_CONCURRENCY):
+        self.endpoint = endpoint
+        self.model = model
+        self._client = None
+        self._session = None
+        self._client_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._max_concurrency = max_concurrency
+        self._override = None
+
+    def set_client(self, client):
+        """Use `client` (anything with .complete(messages=..., **kw)) instead of the endpoint."""
+        self._override = client
+
+    def _get_client(self):
+        if self._override is not None:
+            return self._override
+        with self._client_lock:
+            if self._client is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from azure.ai.inference import ChatCompletionsClient
+                from azure.core.credentials import AzureKeyCredential
+                from azure.core.pipeline.transport import RequestsTransport
+
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self._max_concurrency
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+                self._client = ChatCompletionsClient(
+                    endpoint=self.endpoint,
+                    credential=AzureKeyCredential(os.environ.get("GITHUB_TOKEN", "")),
+                    transport=RequestsTransport(session=session, session_owner=False),
+                    retry_total=0,  # retries are handled here, with jitter and a deadline
+                )
+            return self._client
+
+    def warm(self, connect=True):
+        """
+        Build the client now instead of on the first job; with connect, also open
+        one pooled connection (DNS + TLS) to the endpoint. Call after forking:
+        sockets must not be shared between worker processes.
+        """
+        client = self._get_client()
+        if connect and self._session is not None:
+            try:
+                self._session.head(self.endpoint, timeout=LLM_CONNECT_TIMEOUT)
+            except Exception as e:
+                print(f"⚠️ LLM endpoint warm-up failed: {e}")
+        return client
+
+    def complete(self, messages, deadline=None, labels=None, **kwargs):
+        """
+        Send one chat completion and return the response object.
+        labels (e.g. prompt version, tier) go on the span and token metrics.
+        Raises the last error once retries or the deadline run out.
+        """
+        labels = labels or {}
+        kwargs.setdefault("model", self.model)
+        deadline_at = time.monotonic() + (deadline or LLM_DEADLINE_SECONDS)
+        client = self._get_client()
+        attempt = 0
+
+        while True:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                LLM_REQUESTS.inc(outcome="deadline")
+                raise LLMDeadlineExceeded(f"LLM call exceeded {deadline or LLM_DEADLINE_SECONDS:.0f}s deadline")
+
+            # the wait for a slot comes out of the same deadline as the call
+            if not self._slots.acquire(timeout=remaining):
+                LLM_REQUESTS.inc(outcome="deadline")
+                raise LLMDeadlineExceeded(
+                    f"LLM call exceeded {deadline or LLM_DEADLINE_SECONDS:.0f}s deadline waiting for a slot"
+                )
+            try:
+                try:
+                    remaining = deadline_at - time.monotonic()
+                    with span("llm_call", attempt=attempt, **labels) as attrs:
+                        # the job may have been cancelled while this call waited for a slot or backed off
+                        check_cancelled()
+                        LLM_INFLIGHT.inc()
+                        t0 = time.perf_counter()
+                        try:
+                            response = client.complete(
+                                messages=messages,
+                                connection_timeout=max(min(LLM_CONNECT_TIMEOUT, remaining), 0.001),
+                                read_timeout=max(min(LLM_READ_TIMEOUT, remaining), 0.001),
+                                **kwargs,
+                            )
+                        finally:
+                            LLM_INFLIGHT.dec()
+                            LLM_CALL_SECONDS.observe(time.perf_counter() - t0, model=kwargs["model"])
+                        attrs.update(self._record_usage(response, labels.get("prompt", "unknown")))
+                finally:
+                    # not held through the backoff sleep below
+                    self._slots.release()
+                LLM_REQUESTS.inc(outcome="ok")
+                return response
+
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= LLM_MAX_RETRIES:
+                    LLM_REQUESTS.inc(outcome="error")
+                    raise
+                delay = _backoff_delay(attempt, _retry_after_seconds(e))
+                if time.monotonic() + delay >= deadline_at:
+                    LLM_REQUESTS.inc(outcome="deadline")
+                    raise
+                LLM_REQUESTS.inc(outcome="retry")
+                print(f"⚠️ LLM call failed ({e.__class__.__name__}: {str(e)[:120]}), retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def _record_usage(self, response, prompt_version):
+        usage = getattr(response, "usage", None)
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        LLM_TOKENS.inc(prompt, kind="prompt", prompt=prompt_version)
+        LLM_TOKENS.inc(completion, kind="completion", prompt=prompt_version)
+        finish_reason = _finish_reason(response)
+        if finish_reason == "length":
+            # spent on an answer that was cut off
+            LLM_TOKENS.inc(completion, kind="truncated", prompt=prompt_version)
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "finish_reason": finish_reason}
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """The process-wide gateway (created on first use)."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+
+def _finish_reason(response):
+    choices = getattr(response, "choices", None)
+    reason = getattr(choices[0], "finish_reason", None) if choices else None
+    return str(getattr(reason, "value", reason)) if reason is not None else None
+
+
+def complete_text(messages, **kwargs):
+    """
+    Chat completion through the shared gateway, returning the message text.
+    A completion cut off at max_tokens (its last scene would be lost) is
+    retried once with a larger budget; raises LLMTruncated if that one is cut
+    off as well.
+    """
+    response = get_gateway().complete(messages, **kwargs)
+    if _finish_reason(response) == "length" and kwargs.get("max_tokens"):
+        LLM_REQUESTS.inc(outcome="truncated")
+        kwargs["max_tokens"] = int(kwargs["max_tokens"] * LLM_TRUNCATION_RETRY_FACTOR)
+        print(f"⚠️ LLM answer hit the token cap, retrying with max_tokens={kwargs['max_tokens']}")
+        response = get_gateway().complete(messages, **kwargs)
+        if _finish_reason(response) == "length":
+            LLM_REQUESTS.inc(outcome="truncated")
+            raise LLMTruncated(f"LLM answer cut off at max_tokens={kwargs['max_tokens']}")
+    if response.choices and response.choices[0].message:
+        return response.choices[0].message.content or ""
+    return ""
@@ -0,0 +1,153 @@
+# llm_standin.py — local HTTP stand-in for the chat-completions endpoint
+#
+# Answers POST .../chat/completions like the real API, replaying the recorded
+# scenes from bench_fixtures, and can inject latency and failures to exercise
+# the gateway's timeouts and retries.
+#
+#   python llm_standin.py --port 8765 --delay 0.5 --fail-rate 0.2 --fail-status 429
+#   VOICEMATION_LLM_ENDPOINT=http://127.0.0.1:8765 GITHUB_TOKEN=x uvicorn main:app
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures", "recorded_responses.json")
+
+_stats = {"requests": 0, "failed": 0}
+_stats_lock = threading.Lock()
+
+
+def _scene_block(fixture, i):
+    scenes = fixture["scenes"]
+    scene = scenes[i % len(scenes)]
+    code = scene["code"]
+    if i >= len(scenes):
+        # reuse the scene under a fresh class name, like a longer lesson would
+        code = re.sub(r"class\s+(\w+)\s*\(Scene\)", rf"class \g<1>Part{i}(Scene)", code, count=1)
+    return f"{scene['explanation']}\n\n```python\n{code}\n```"
+
+
+def replay_response(fixture, prompt):
+    """
+    Recorded answer for the prompt: a JSON outline for outline prompts, one
+    scene for single-scene prompts, else all scenes of the duration tier.
+    """
+    outline = re.search(r"OUTLINE_SCENES: (\d+)", prompt)
+    if outline:
+        scenes = fixture["scenes"]
+        return json.dumps({"scenes": [
+            {"title": f"Part {i + 1}", "beats": scenes[i % len(scenes)]["explanation"][:160]}
+            for i in range(int(outline.group(1)))
+        ]})
+    scene_index = re.search(r"SCENE_INDEX: (\d+)", prompt)
+    if scene_index:
+        return _scene_block(fixture, int(scene_index.group(1)) - 1)
+
+    match = re.search(r"TOTAL_TARGET_SECONDS: (\d+)", prompt)
+    requested = int(match.group(1)) if match else 60
+    tiers = sorted(int(t) for t in fixture["scene_counts"])
+    tier = next((t for t in tiers if requested <= t), tiers[-1])
+
+    return "\n\n".join(_scene_block(fixture, i) for i in range(fixture["scene_counts"][str(tier)]))
+
+
+def build_completion(fixture, messages, model):
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content", "") for m in messages if m.get("role") == "user"), "")
+    content = replay_response(fixture, system)
+    prompt_tokens = (len(system) + len(user)) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"standin-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model or "standin",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def make_handler(fixture, args):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with _stats_lock:
+                self._send_json(200, dict(_stats))
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.split("?")[0].endswith("/chat/completions"):
+                self._send_json(404, {"error": {"code": "NotFound", "message": self.path}})
+                return
+
+            with _stats_lock:
+                _stats["requests"] += 1
+            time.sleep(args.delay + random.uniform(0, args.jitter))
+
+            if random.random() < args.fail_rate:
+                with _stats_lock:
+                    _stats["failed"] += 1
+                headers = {"Retry-After": str(args.retry_after)} if args.fail_status == 429 else None
+                self._send_json(
+                    args.fail_status,
+                    {"error": {"code": str(args.fail_status), "message": "injected failure"}},
+                    headers,
+                )
+                return
+
+            self._send_json(200, build_completion(fixture, payload.get("messages", []), payload.get("model")))
+
+        def log_message(self, fmt, *log_args):
+            if args.verbose:
+                super().log_message(fmt, *log_args)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the chat-completions endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixture", default=FIXTURE_PATH)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra delay up to this many seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with injected 429s")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.fixture, encoding="utf-8") as f:
+        fixture = json.load(f)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(fixture, args))
+    print(f"🧪 LLM stand-in on http://{args.host}:{args.port} (GET / for request counts)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
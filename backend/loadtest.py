@@ -0,0 +1,222 @@
+# loadtest.py — concurrent upload / poll / download load generator for main.py and app.py
+#
+# Start a backend first, optionally with the heavy pipeline stubbed out:
+#   VOICEMATION_STUB_PIPELINE=1 VOICEMATION_STUB_DELAY=2 uvicorn main:app --port 8000
+#   VOICEMATION_STUB_PIPELINE=1 gunicorn -w 2 -b :5001 app:app
+#
+# Every simulated user sends the same clip, so identical jobs are coalesced and
+# served from the topic cache; add VOICEMATION_SINGLEFLIGHT=0
+# VOICEMATION_TOPIC_CACHE=0 to the server env to load the pipeline itself.
+#
+# Then ramp concurrency and look for the saturation point:
+#   python loadtest.py --base-url http://127.0.0.1:8000 --levels 1,2,4,8,16 --requests 20
+#
+# Works against both APIs: job-style responses ({job_id}) are polled on
+# /status/<job_id> and fetched from /download/<job_id>; synchronous responses
+# ({video_url}) are fetched directly.
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def make_sample_webm(path, seconds=3):
+    """A short opus/webm clip like the browser MediaRecorder uploads."""
+    subprocess.run(
+        ["ffmpeg", "-y", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+         "-c:a", "libopus", path],
+        check=True, capture_output=True, text=True,
+    )
+    return path
+
+
+def encode_multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, (filename, data, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n".encode() + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def http(method, url, body=None, headers=None, timeout=600):
+    req = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.status, resp.read(), dict(resp.headers)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+# -------------------------
+# One simulated user
+# -------------------------
+def run_one(base_url, audio_bytes, duration_limit, poll_interval, job_timeout):
+    result = {"ok": False, "error": None, "submit_s": None, "total_s": None, "download_s": None, "polls": 0}
+    t0 = time.perf_counter()
+    try:
+        body, ctype = encode_multipart(
+            {"duration_limit": str(duration_limit)},
+            {"audio": ("speech.webm", audio_bytes, "audio/webm")},
+        )
+        status, raw, _ = http("POST", f"{base_url}/generate_audio", body, {"Content-Type": ctype})
+        result["submit_s"] = time.perf_counter() - t0
+        payload = json.loads(raw)
+
+        if "job_id" in payload and not payload.get("video_url"):
+            job_id = payload["job_id"]
+            deadline = time.perf_counter() + job_timeout
+            while True:
+                time.sleep(poll_interval)
+                _, raw, _ = http("GET", f"{base_url}/status/{job_id}")
+                result["polls"] += 1
+                state = json.loads(raw)
+                if state.get("status") == "done":
+                    video_url = state.get("video_url") or f"/download/{job_id}"
+                    break
+                if state.get("status") in ("error", "unknown", "cancelled"):
+                    raise RuntimeError(f"job {state.get('status')}: {state.get('error', '')}")
+                if time.perf_counter() > deadline:
+                    raise TimeoutError("job did not finish in time")
+        else:
+            video_url = payload.get("video_url")
+            if not video_url:
+                raise RuntimeError(payload.get("error", "no video_url in response"))
+
+        t_dl = time.perf_counter()
+        url = video_url if video_url.startswith("http") else f"{base_url}{video_url}"
+        http("GET", url)
+        result["download_s"] = time.perf_counter() - t_dl
+        result["ok"] = True
+    except urllib.error.HTTPError as e:
+        result["error"] = f"HTTP {e.code}"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["total_s"] = time.perf_counter() - t0
+    return result
+
+
+# -------------------------
+# Ramp
+# -------------------------
+def run_level(args, audio_bytes, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(run_one, args.base_url, audio_bytes, args.duration_limit,
+                        args.poll_interval, args.job_timeout)
+            for _ in range(args.requests)
+        ]
+        results = [f.result() for f in futures]
+    wall = time.perf_counter() - start
+
+    ok = [r for r in results if r["ok"]]
+    totals = [r["total_s"] for r in ok]
+    submits = [r["submit_s"] for r in results if r["submit_s"] is not None]
+    errors = {}
+    for r in results:
+        if r["error"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": len(ok),
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else 0.0,
+        "errors": errors,
+        "throughput_jobs_per_min": round(len(ok) / wall * 60, 2) if wall else 0.0,
+        "latency_s": {
+            "p50": round(percentile(totals, 50), 3),
+            "p95": round(percentile(totals, 95), 3),
+            "p99": round(percentile(totals, 99), 3),
+        },
+        "submit_latency_s": {
+            "p50": round(percentile(submits, 50), 3),
+            "p95": round(percentile(submits, 95), 3),
+            "p99": round(percentile(submits, 99), 3),
+        },
+        "mean_polls": round(sum(r["polls"] for r in results) / len(results), 1) if results else 0,
+        "wall_s": round(wall, 2),
+    }
+
+
+def find_saturation(levels, max_error_rate):
+    """
+    First concurrency level where throughput stops growing (< 10% gain over the
+    previous level) or the error rate exceeds max_error_rate.
+    """
+    best = None
+    for level in levels:
+        if level["error_rate"] > max_error_rate:
+            return level["concurrency"], "error rate"
+        if best and level["throughput_jobs_per_min"] < best["throughput_jobs_per_min"] * 1.1:
+            return level["concurrency"], "throughput plateau"
+        best = level
+    return None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load test for the Voicemation backends.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--audio", help="webm clip to upload (default: generated 3 s tone)")
+    parser.add_argument("--levels", default="1,2,4,8", help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=10, help="Requests per level")
+    parser.add_argument("--duration-limit", type=int, default=30)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--job-timeout", type=float, default=1800)
+    parser.add_argument("--max-error-rate", type=float, default=0.05)
+    parser.add_argument("--json", dest="json_path", help="Write the report to this file")
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip("/")
+
+    audio_path = args.audio or make_sample_webm(os.path.join(tempfile.gettempdir(), "loadtest_sample.webm"))
+    with open(audio_path, "rb") as f:
+        audio_bytes = f.read()
+
+    levels = []
+    print(f"{'conc':>5} {'ok':>5} {'err%':>6} {'jobs/min':>9} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'submit p95':>11}")
+    for concurrency in [int(c) for c in args.levels.split(",")]:
+        level = run_level(args, audio_bytes, concurrency)
+        levels.append(level)
+        lat = level["latency_s"]
+        print(f"{concurrency:>5} {level['ok']:>5} {level['error_rate'] * 100:>5.1f}% "
+              f"{level['throughput_jobs_per_min']:>9.2f} {lat['p50']:>8.2f} {lat['p95']:>8.2f} {lat['p99']:>8.2f} "
+              f"{level['submit_latency_s']['p95']:>11.3f}")
+        if level["errors"]:
+            print("      errors:", level["errors"])
+
+    saturation, reason = find_saturation(levels, args.max_error_rate)
+    if saturation:
+        print(f"\n📈 Saturation at concurrency {saturation} ({reason}).")
+    else:
+        print("\n📈 No saturation within the tested levels.")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"base_url": args.base_url, "levels": levels,
+                       "saturation": {"concurrency": saturation, "reason": reason}}, f, indent=2)
+        print(f"📄 Report written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,47 @@
 # main.py — Render-safe FastAPI backend for Voicemation
 
-from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse, PlainTextResponse
 
 import os
 import uuid
-import tempfile
-import subprocess
-import traceback
-import speech_recognition as sr
 
-from voicemation import process_speech
-from subtitle_utils import parse_srt_to_json
+from starlette.concurrency import run_in_threadpool
+
+from metrics_utils import render_prometheus
+from delivery_utils import (
+    strong_etag,
+    cache_control_for,
+    etag_matches,
+    parse_range_header,
+    iter_file_range,
+    is_content_addressed,
+)
+from rendition_utils import rendition_file, rendition_mimetype, pick_rendition
+from workspace_utils import (
+    FINAL_VIDEO_DIR,
+    create_workspace,
+    remove_workspace,
+    touch_output,
+    start_janitor,
+    get_janitor_stats,
+)
+from job_runner import (
+    jobs,
+    submit_job,
+    cancel_job,
+    submit_revision,
+    get_job_scenes,
+    decode_upload,
+    get_job_view,
+    resume_interrupted_jobs,
+    QueueFullError,
+    RevisionError,
+)
+from warmup import start_background_warmup
+from cost_model import cost_model, TARGET_P95_SECONDS
+from job_events import sse_stream_async, parse_last_event_id
 
 # -----------------------
 # App setup
@@ -28,165 +57,219 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-FFMPEG_BIN = os.environ.get("FFMPEG_BIN", "ffmpeg")
-
-# In-memory job store (OK for demos)
-jobs = {}
-
 # -----------------------
 # Helpers
 # -----------------------
 
-def ffprobe_duration(path: str) -> float:
-    try:
-        proc = subprocess.run(
-            [FFMPEG_BIN.replace("ffmpeg", "ffprobe"),
-             "-v", "error",
-             "-show_entries", "format=duration",
-             "-of", "default=noprint_wrappers=1:nokey=1",
-             path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=True,
-        )
-        return float(proc.stdout.strip())
-    except Exception:
-        return 0.0
-
-
-def scale_subtitles_to_video(subs, video_duration):
-    if not subs:
-        return subs
-
-    last_end = subs[-1]["end"]
-    if last_end <= 0:
-        return subs
-
-    scale = video_duration / last_end
-    scaled = []
-
-    for s in subs:
-        start = round(s["start"] * scale, 3)
-        end = round(s["end"] * scale, 3)
-        if end <= start:
-            end = start + 0.01
-        scaled.append({
-            "start": start,
-            "end": end,
-            "text": s["text"]
-        })
+def video_file_response(request: Request, path: str, stable_url: bool = True, media_type: str = "video/mp4"):
+    """
+    Serve an mp4 with a strong ETag, cache headers and single byte-range
+    support, so seeking in the player doesn't re-download the video.
+    """
+    size = os.path.getsize(path)
+    etag = strong_etag(path)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control_for(path, stable_url),
+    }
 
-    return scaled
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                iter_file_range(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=headers,
+            )
+
+    return FileResponse(path, media_type=media_type, headers=headers)
 
 
 # -----------------------
-# Background job
+# Routes
 # -----------------------
 
-def run_generation_job(job_id: str, wav_path: str, manual_duration: int | None):
-    try:
-        recognizer = sr.Recognizer()
-        with sr.AudioFile(wav_path) as source:
-            audio_data = recognizer.record(source)
-            speech_text = recognizer.recognize_google(audio_data)
-
-        video_path, srt_files = process_speech(
-            speech_text,
-            return_srt=True,
-            manual_duration=manual_duration,
-        )
+@app.on_event("startup")
+def start_background_cleanup():
+    start_janitor()
+    # jobs a crashed or restarted process left unfinished continue from their checkpoints
+    resume_interrupted_jobs()
+    # VOICEMATION_WARMUP: load the pipeline's heavy dependencies off the request path
+    start_background_warmup()
 
-        subtitles = []
-        for srt in srt_files or []:
-            if os.path.exists(srt):
-                subtitles.extend(parse_srt_to_json(srt))
 
-        duration = ffprobe_duration(video_path)
-        if subtitles and duration > 0:
-            subtitles = scale_subtitles_to_video(subtitles, duration)
+@app.get("/health")
+def health():
+    return {"status": "ok"}
 
-        jobs[job_id] = {
-            "status": "done",
-            "video_path": video_path,
-            "subtitles": subtitles,
-            "duration": duration,
-        }
 
-    except Exception as e:
-        jobs[job_id] = {
-            "status": "error",
-            "error": str(e),
-            "trace": traceback.format_exc(),
-        }
-    finally:
-        if os.path.exists(wav_path):
-            os.remove(wav_path)
+@app.get("/storage")
+def storage_stats():
+    return get_janitor_stats()
 
 
-# -----------------------
-# Routes
-# -----------------------
+@app.get("/capacity")
+def capacity(target_p95: float = TARGET_P95_SECONDS):
+    """Jobs/hour per core per tier at target_p95 seconds, from recorded job costs."""
+    return cost_model.capacity_report(target_p95)
 
-@app.get("/health")
-def health():
-    return {"status": "ok"}
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
 
 
 @app.post("/generate_audio")
 async def generate_audio(
-    background_tasks: BackgroundTasks,
     audio: UploadFile = File(...),
     duration_limit: int = Form(0),
 ):
     job_id = str(uuid.uuid4())
-    jobs[job_id] = {"status": "processing"}
-
     manual_duration = duration_limit if duration_limit > 0 else None
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp:
-        tmp.write(await audio.read())
-        webm_path = tmp.name
+    workspace = create_workspace(job_id)
+    webm_path = os.path.join(workspace, "upload.webm")
+    wav_path = os.path.join(workspace, "upload.wav")
 
-    wav_fd, wav_path = tempfile.mkstemp(suffix=".wav")
-    os.close(wav_fd)
+    with open(webm_path, "wb") as tmp:
+        tmp.write(await audio.read())
 
     try:
-        subprocess.run(
-            f'"{FFMPEG_BIN}" -y -i "{webm_path}" "{wav_path}"',
-            shell=True,
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+        # ffmpeg blocks; keep it off the event loop
+        await run_in_threadpool(decode_upload, job_id, webm_path, wav_path)
     except Exception as e:
+        remove_workspace(workspace)
         raise HTTPException(status_code=500, detail=f"ffmpeg failed: {e}")
-    finally:
-        if os.path.exists(webm_path):
-            os.remove(webm_path)
-
-    background_tasks.add_task(
-        run_generation_job,
-        job_id,
-        wav_path,
-        manual_duration,
-    )
 
-    return {
-        "job_id": job_id,
-        "status": "processing",
-    }
+    try:
+        submit_job(job_id, wav_path, manual_duration, workspace)
+    except QueueFullError as e:
+        remove_workspace(workspace)
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return JSONResponse(
+        {"job_id": job_id, "status": "queued"},
+        status_code=202,
+    )
 
 
 @app.get("/status/{job_id}")
 def get_status(job_id: str):
-    return jobs.get(job_id, {"status": "unknown"})
+    return get_job_view(job_id) or {"status": "unknown"}
+
+
+@app.get("/events/{job_id}")
+def job_events_stream(job_id: str, request: Request):
+    """
+    Server-sent events for a job: stage, plan, scene, progress (with ETA),
+    status and a final result event, after which the stream ends.
+    """
+    if get_job_view(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    last_event_id = parse_last_event_id(request.headers.get("last-event-id"))
+    return StreamingResponse(
+        sse_stream_async(job_id, get_job_view, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.delete("/jobs/{job_id}")
+def delete_job(job_id: str):
+    """Cancel a queued or running job (e.g. its tab was closed); 409 once it finished."""
+    job = cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if job.get("status") != "cancelled":
+        raise HTTPException(status_code=409, detail=f"Job already {job.get('status')}")
+    return JSONResponse({"job_id": job_id, "status": "cancelled"}, status_code=202)
+
+
+@app.get("/jobs/{job_id}/scenes")
+def job_scenes(job_id: str):
+    """Scenes of a finished job that a revision can change (empty once no longer stored)."""
+    scenes = get_job_scenes(job_id)
+    if scenes is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return {"job_id": job_id, "scenes": scenes}
+
+
+@app.post("/jobs/{job_id}/revisions")
+async def revise_job(job_id: str, request: Request):
+    """
+    JSON {"scenes": [{"scene": 2, "narration": "...", "code": "..."}]}: re-run
+    only those scenes and rebuild the video. Returns 202 with the revision's
+    job id; follow it like any job (/status, /events, /download).
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        body = {}
+    try:
+        revision_id = await run_in_threadpool(
+            submit_revision, job_id, body.get("scenes") if isinstance(body, dict) else None
+        )
+    except RevisionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if revision_id is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return JSONResponse({"job_id": revision_id, "revision_of": job_id, "status": "queued"}, status_code=202)
 
 
 @app.get("/download/{job_id}")
-def download_video(job_id: str):
+def download_video(job_id: str, request: Request):
     job = jobs.get(job_id)
-    if not job or job.get("status") != "done":
+    if not job or job.get("status") != "done" or not os.path.exists(job.get("video_path", "")):
         raise HTTPException(status_code=404, detail="Video not ready")
 
-    return FileResponse(job["video_path"], media_type="video/mp4")
+    touch_output(job["video_path"])
+    # ?quality=360p, or a lower rendition for Save-Data / slow-connection client hints
+    path = pick_rendition(
+        job["video_path"],
+        quality=request.query_params.get("quality"),
+        save_data=request.headers.get("save-data"),
+        ect=request.headers.get("ect"),
+        downlink=request.headers.get("downlink"),
+    )
+    # a job's output never changes, so the URL is stable (per quality and hints)
+    response = video_file_response(request, path)
+    response.headers["Vary"] = "Save-Data, ECT, Downlink"
+    return response
+
+
+@app.get("/videos/{filename}")
+def download_by_content(filename: str, request: Request):
+    path = os.path.join(FINAL_VIDEO_DIR, filename)
+    if not is_content_addressed(path) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    touch_output(path)
+    return video_file_response(request, path)
+
+
+@app.get("/videos/{stem}/{filename}")
+def download_rendition(stem: str, filename: str, request: Request):
+    """A rendition mp4, HLS playlist or segment of final video <stem>.mp4."""
+    path = rendition_file(stem, filename)
+    if not path or not is_content_addressed(f"{stem}.mp4"):
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    # renditions live and expire with their final video
+    touch_output(os.path.join(FINAL_VIDEO_DIR, f"{stem}.mp4"))
+    return video_file_response(request, path, media_type=rendition_mimetype(path))
@@ -0,0 +1,268 @@
+# metrics_utils.py — per-stage spans and Prometheus text exposition
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Job the current thread/task is working for (set by the job runner)
+current_job_id = contextvars.ContextVar("voicemation_job_id", default=None)
+
+# Stage latency buckets in seconds: ffmpeg probes take milliseconds, LLM calls
+# and 16-scene renders take minutes.
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+MAX_TRACKED_JOBS = 1000
+
+_lock = threading.Lock()
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in items)
+    return "{" + body + "}"
+
+
+# -------------------------
+# Minimal metric types
+# -------------------------
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        with _lock:
+            self.values[_label_key(labels)] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}  # label key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with _lock:
+            series = self.series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.series.items()):
+            for i, bound in enumerate(self.buckets):
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {series[i]}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+# -------------------------
+# Registry
+# -------------------------
+STAGE_SECONDS = Histogram("voicemation_stage_seconds", "Duration of pipeline stages")
+STAGE_ERRORS = Counter("voicemation_stage_errors_total", "Pipeline stages that raised")
+JOBS_TOTAL = Counter("voicemation_jobs_total", "Finished jobs by outcome")
+QUEUE_DEPTH = Gauge("voicemation_queue_depth", "Jobs accepted but not yet started")
+ACTIVE_JOBS = Gauge("voicemation_active_jobs", "Jobs currently running")
+ACTIVE_RENDERS = Gauge("voicemation_active_renders", "manim processes currently running")
+CACHE_REQUESTS = Counter("voicemation_cache_requests_total", "Cache lookups by cache and result")
+LLM_CALL_SECONDS = Histogram("voicemation_llm_call_seconds", "Latency of single LLM HTTP calls")
+LLM_REQUESTS = Counter("voicemation_llm_requests_total", "LLM calls by outcome (ok, retry, error, deadline, truncated)")
+LLM_TOKENS = Counter("voicemation_llm_tokens_total", "LLM tokens used by kind (prompt, completion, truncated) and prompt version")
+LLM_INFLIGHT = Gauge("voicemation_llm_inflight", "LLM requests currently in flight")
+CHECKPOINT_RESTORES = Counter(
+    "voicemation_checkpoint_restores_total", "Pipeline stages skipped because a job manifest had them"
+)
+WARMUP_SECONDS = Gauge("voicemation_warmup_seconds", "Time spent in each start-up warm-up step")
+EVENT_SUBSCRIBERS = Gauge("voicemation_event_subscribers", "Open job event streams")
+LANE_QUEUE_DEPTH = Gauge("voicemation_lane_queue_depth", "Jobs waiting for a generation worker, by lane")
+LANE_RUNNING = Gauge("voicemation_lane_running", "Jobs generating, by lane")
+LANE_WAIT_SECONDS = Histogram("voicemation_lane_wait_seconds", "Time jobs waited for a generation worker, by lane")
+ASR_AUDIO_SECONDS = Histogram(
+    "voicemation_asr_audio_seconds", "Length of uploaded audio before (raw) and after (trimmed) silence removal",
+    buckets=(1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 300),
+)
+
+for _gauge in (QUEUE_DEPTH, ACTIVE_JOBS, ACTIVE_RENDERS, LLM_INFLIGHT, EVENT_SUBSCRIBERS):
+    _gauge.set(0)
+for _lane in ("short", "long"):
+    LANE_QUEUE_DEPTH.set(0, lane=_lane)
+    LANE_RUNNING.set(0, lane=_lane)
+
+REGISTRY = [
+    STAGE_SECONDS, STAGE_ERRORS, JOBS_TOTAL, QUEUE_DEPTH, ACTIVE_JOBS, ACTIVE_RENDERS, CACHE_REQUESTS,
+    LLM_CALL_SECONDS, LLM_REQUESTS, LLM_TOKENS, LLM_INFLIGHT, CHECKPOINT_RESTORES,
+    WARMUP_SECONDS, EVENT_SUBSCRIBERS, LANE_QUEUE_DEPTH, LANE_RUNNING, LANE_WAIT_SECONDS, ASR_AUDIO_SECONDS,
+]
+
+# extra exporters called at scrape time, returning lines of exposition text
+_collectors = []
+
+
+def register_collector(fn):
+    _collectors.append(fn)
+    return fn
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+
+    # hit ratio per cache, derived from the counters
+    caches = sorted({dict(k)["cache"] for k in CACHE_REQUESTS.values})
+    if caches:
+        lines.append("# HELP voicemation_cache_hit_ratio Fraction of cache lookups that hit")
+        lines.append("# TYPE voicemation_cache_hit_ratio gauge")
+        for cache in caches:
+            hits = CACHE_REQUESTS.get(cache=cache, result="hit")
+            total = hits + CACHE_REQUESTS.get(cache=cache, result="miss")
+            ratio = hits / total if total else 0.0
+            lines.append(f'voicemation_cache_hit_ratio{{cache="{cache}"}} {ratio:.4f}')
+
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            print("⚠️ Metrics collector failed:", e)
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------
+# Per-job spans
+# -------------------------
+_job_spans = OrderedDict()
+# called as fn(job_id, "start" | "end", record) for spans of a job (see job_events)
+_span_listeners = []
+
+
+def add_span_listener(fn):
+    _span_listeners.append(fn)
+    return fn
+
+
+def _notify_span(job_id, phase, record):
+    for listener in _span_listeners:
+        try:
+            listener(job_id, phase, record)
+        except Exception as e:
+            print("⚠️ Span listener failed:", e)
+
+
+@contextmanager
+def job_context(job_id):
+    """Attribute all spans recorded inside this block to job_id."""
+    token = current_job_id.set(job_id)
+    try:
+        yield
+    finally:
+        current_job_id.reset(token)
+
+
+def _append_span(job_id, record):
+    with _lock:
+        spans = _job_spans.get(job_id)
+        if spans is None:
+            spans = _job_spans[job_id] = []
+            while len(_job_spans) > MAX_TRACKED_JOBS:
+                _job_spans.popitem(last=False)
+        spans.append(record)
+
+
+@contextmanager
+def span(stage, job_id=None, **attrs):
+    """
+    Time a pipeline stage. The duration goes to the stage histogram and, when
+    a job is known, into that job's trace (returned by get_job_spans).
+    Extra attrs (scene index, class name, ...) are kept on the span record.
+    """
+    job_id = job_id or current_job_id.get()
+    started = time.time()
+    t0 = time.perf_counter()
+    status = "ok"
+    if job_id:
+        _notify_span(job_id, "start", {"stage": stage, "start": round(started, 3), **attrs})
+    try:
+        yield attrs
+    except BaseException:
+        status = "error"
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        record = {"stage": stage, "start": round(started, 3), "seconds": round(elapsed, 3), "status": status}
+        record.update(attrs)
+        if job_id:
+            _append_span(job_id, record)
+            _notify_span(job_id, "end", record)
+        scene = f" scene={attrs['scene']}" if "scene" in attrs else ""
+        print(f"⏱ [{job_id or '-'}] {stage}{scene} took {elapsed:.2f}s ({status})")
+
+
+def get_job_spans(job_id):
+    with _lock:
+        return list(_job_spans.get(job_id, []))
+
+
+def stage_totals(job_id):
+    """Seconds spent per stage for a job (scenes summed)."""
+    totals = {}
+    for record in get_job_spans(job_id):
+        totals[record["stage"]] = round(totals.get(record["stage"], 0.0) + record["seconds"], 3)
+    return totals
+
+
+def job_llm_usage(job_id):
+    """LLM calls, tokens and call seconds of a job, from its llm_call spans."""
+    usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "seconds": 0.0}
+    for record in get_job_spans(job_id):
+        if record["stage"] != "llm_call":
+            continue
+        usage["calls"] += 1
+        usage["prompt_tokens"] += record.get("prompt_tokens", 0)
+        usage["completion_tokens"] += record.get("completion_tokens", 0)
+        usage["seconds"] = round(usage["seconds"] + record["seconds"], 3)
+    return usage
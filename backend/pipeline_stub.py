@@ -0,0 +1,67 @@
+# pipeline_stub.py — stand-in for ASR + process_speech, for load-testing the HTTP layer
+#
+# Enable with VOICEMATION_STUB_PIPELINE=1. The apps then skip speech recognition
+# and the LLM/TTS/manim pipeline; each job sleeps for a configurable time and
+# returns a small pre-built video, so queueing, job store and downloads can be
+# measured on their own.
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from delivery_utils import content_addressed_name
+from workspace_utils import FINAL_VIDEO_DIR
+
+STUB_ENABLED = os.environ.get("VOICEMATION_STUB_PIPELINE", "0") == "1"
+# fixed cost per job plus a cost per second of requested video
+STUB_DELAY_SECONDS = float(os.environ.get("VOICEMATION_STUB_DELAY", "2.0"))
+STUB_SECONDS_PER_VIDEO_SECOND = float(os.environ.get("VOICEMATION_STUB_DELAY_PER_SECOND", "0"))
+STUB_TRANSCRIPT = "explain ohm's law"
+
+_sample_lock = threading.Lock()
+_sample_video = None
+
+
+def _get_sample_video():
+    """Build (once per process) a short test-pattern mp4 with silent audio."""
+    global _sample_video
+    with _sample_lock:
+        if _sample_video and os.path.exists(_sample_video):
+            return _sample_video
+        path = os.path.join(FINAL_VIDEO_DIR, "stub_sample.mp4")
+        subprocess.run(
+            ["ffmpeg", "-y",
+             "-f", "lavfi", "-i", "testsrc2=size=854x480:rate=15:duration=5",
+             "-f", "lavfi", "-i", "anullsrc=r=24000:cl=mono",
+             "-t", "5", "-c:v", "libx264", "-preset", "veryfast", "-c:a", "aac",
+             "-movflags", "+faststart", path],
+            check=True, capture_output=True, text=True,
+        )
+        _sample_video = path
+        return path
+
+
+def stub_transcribe(wav_path):
+    return STUB_TRANSCRIPT
+
+
+def stub_process_speech(speech_text, return_srt=False, manual_duration=None, workspace=None, **kwargs):
+    """Same signature and return shape as voicemation.process_speech."""
+    duration = manual_duration or 60
+    time.sleep(STUB_DELAY_SECONDS + STUB_SECONDS_PER_VIDEO_SECOND * duration)
+
+    # served like a real output: content-addressed name in FINAL_VIDEO_DIR
+    sample = _get_sample_video()
+    video_path = os.path.join(FINAL_VIDEO_DIR, content_addressed_name(sample))
+    if not os.path.exists(video_path):
+        shutil.copyfile(sample, video_path)
+
+    if not return_srt:
+        return video_path
+
+    srt_dir = workspace or FINAL_VIDEO_DIR
+    srt_path = os.path.join(srt_dir, f"stub_{time.time_ns()}.srt")
+    with open(srt_path, "w", encoding="utf-8") as f:
+        f.write(f"1\n00:00:00,000 --> 00:00:05,000\n{speech_text}\n")
+    return video_path, [srt_path]
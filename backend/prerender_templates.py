@@ -0,0 +1,107 @@
+# prerender_templates.py — render scene template packs at deploy time
+#
+# Renders every scene of every pack in template_packs/ and synthesizes its
+# narration, writing both to template_packs/rendered/<pack>/ under a digest of
+# the scene, so an edited scene is re-rendered and a stale file is never used.
+# Requests matching a pack then only mux and concatenate.
+#
+# Usage:
+#   python prerender_templates.py                    # everything missing
+#   python prerender_templates.py --pack ohms_law --force
+#   python prerender_templates.py --check            # list missing renders, exit 1 if any
+
+import argparse
+import os
+import shutil
+import sys
+
+import voicemation
+from scene_templates import TEMPLATE_RENDER_DIR, load_packs, rendered_paths
+from voiceover_utils import generate_voiceover
+from workspace_utils import job_workspace
+
+
+def prerender_scene(pack_id, index, scene, force=False, narration=True):
+    """Render one scene (and its narration) if missing. Returns True when both exist."""
+    video_path, narration_path = rendered_paths(pack_id, index, scene)
+    os.makedirs(os.path.dirname(video_path), exist_ok=True)
+
+    with job_workspace(f"template_{pack_id}_{index}") as work_dir:
+        if force or not os.path.exists(video_path):
+            temp_path = voicemation.save_manim_code_to_temp_file(scene["code"], index=index, work_dir=work_dir)
+            class_name = voicemation.extract_class_name(scene["code"])
+            rendered = voicemation.render_manim_file(
+                temp_path, class_name, media_dir=os.path.join(work_dir, "media")
+            )
+            if not rendered:
+                print(f"❌ {pack_id}[{index}] failed to render.")
+                return False
+            shutil.copyfile(rendered, video_path)
+            print(f"🎬 {pack_id}[{index}] -> {video_path}")
+
+        if narration and (force or not os.path.exists(narration_path)):
+            audio = generate_voiceover(scene["explanation"], out_dir=work_dir)
+            if not audio:
+                print(f"❌ {pack_id}[{index}] narration failed.")
+                return False
+            shutil.copyfile(audio, narration_path)
+            print(f"🔊 {pack_id}[{index}] -> {narration_path}")
+
+    return os.path.exists(video_path) and (not narration or os.path.exists(narration_path))
+
+
+def prune_stale(packs):
+    """Remove renders whose scene digest no longer matches a pack scene."""
+    wanted = {
+        path
+        for pack in packs
+        for index, scene in enumerate(pack["scenes"])
+        for path in rendered_paths(pack["id"], index, scene)
+    }
+    removed = 0
+    for root, _dirs, files in os.walk(TEMPLATE_RENDER_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            if path not in wanted:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render scene template packs.")
+    parser.add_argument("--pack", action="append", help="Only this pack id (repeatable)")
+    parser.add_argument("--force", action="store_true", help="Re-render even if the files exist")
+    parser.add_argument("--no-narration", action="store_true", help="Skip gTTS (narration is then made per request)")
+    parser.add_argument("--check", action="store_true", help="Only report missing renders")
+    args = parser.parse_args()
+
+    packs = load_packs()
+    selected = [p for p in packs if not args.pack or p["id"] in args.pack]
+    if args.pack and len(selected) != len(set(args.pack)):
+        parser.error(f"unknown pack id; available: {', '.join(p['id'] for p in packs)}")
+
+    missing = []
+    for pack in selected:
+        for index, scene in enumerate(pack["scenes"]):
+            video_path, narration_path = rendered_paths(pack["id"], index, scene)
+            needed = [video_path] if args.no_narration else [video_path, narration_path]
+            if args.check:
+                missing += [p for p in needed if not os.path.exists(p)]
+            elif not prerender_scene(pack["id"], index, scene, force=args.force,
+                                     narration=not args.no_narration):
+                missing.append(f"{pack['id']}[{index}]")
+
+    if not args.check and not args.pack:
+        removed = prune_stale(packs)
+        if removed:
+            print(f"🧹 Removed {removed} stale render(s).")
+
+    for item in missing:
+        print(f"⚠️ missing: {item}")
+    print(f"✅ {len(selected)} pack(s), {len(missing)} missing.")
+    sys.exit(1 if missing else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# process_utils.py — cancellable subprocesses that take their children with them
+#
+# manim and ffmpeg are started in their own process group (session), so a
+# timeout or a cancelled job kills the whole tree, including anything manim
+# spawned itself, instead of just the direct child.
+#
+# Cancellation is cooperative: job_runner marks a job cancelled by creating
+# CANCEL_MARKER in its workspace (which works across worker processes), and
+# the pipeline calls check_cancelled() between stages. run_process() polls the
+# marker while its process runs and kills the group as soon as it appears.
+import os
+import signal
+import subprocess
+import time
+from contextlib import contextmanager
+import contextvars
+
+CANCEL_MARKER = ".cancelled"
+POLL_SECONDS = 0.25
+# after SIGTERM, how long a process group gets before SIGKILL
+KILL_GRACE_SECONDS = 3
+
+_cancel_marker = contextvars.ContextVar("voicemation_cancel_marker", default=None)
+
+
+class JobCancelled(BaseException):
+    """
+    The current job was cancelled. A BaseException (like asyncio.CancelledError)
+    so the pipeline's broad `except Exception` handlers don't swallow it.
+    """
+
+
+@contextmanager
+def cancel_scope(workspace):
+    """Cancellation checks inside this block look for the marker in workspace."""
+    token = _cancel_marker.set(os.path.join(workspace, CANCEL_MARKER) if workspace else None)
+    try:
+        yield
+    finally:
+        _cancel_marker.reset(token)
+
+
+def request_cancel(workspace):
+    """Mark the job owning workspace as cancelled. False if the workspace is gone."""
+    try:
+        with open(os.path.join(workspace, CANCEL_MARKER), "w", encoding="utf-8") as f:
+            f.write(str(time.time()))
+        return True
+    except (OSError, TypeError):
+        return False
+
+
+def is_cancelled():
+    marker = _cancel_marker.get()
+    return marker is not None and os.path.exists(marker)
+
+
+def check_cancelled():
+    """Raise JobCancelled if the current job was cancelled."""
+    if is_cancelled():
+        raise JobCancelled()
+
+
+def kill_process_tree(proc, grace=KILL_GRACE_SECONDS):
+    """SIGTERM the process group of proc, SIGKILL it if still alive after grace seconds."""
+    try:
+        if os.name == "nt":
+            proc.kill()
+        else:
+            os.killpg(proc.pid, signal.SIGTERM)
+            try:
+                proc.wait(timeout=grace)
+            except subprocess.TimeoutExpired:
+                pass
+            # descendants may outlive the leader; the group id stays valid while any do
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    try:
+        proc.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        pass
+
+
+def run_process(command, timeout=None, check=True, capture_output=True, text=True):
+    """
+    subprocess.run() replacement: same CompletedProcess / CalledProcessError /
+    TimeoutExpired behaviour, but the process runs in its own group, the whole
+    group is killed on timeout, and JobCancelled is raised (after the kill)
+    when the current job is cancelled.
+    """
+    check_cancelled()
+    pipe = subprocess.PIPE if capture_output else None
+    proc = subprocess.Popen(
+        command,
+        stdout=pipe,
+        stderr=pipe,
+        text=text,
+        start_new_session=(os.name != "nt"),
+    )
+    deadline = time.monotonic() + timeout if timeout else None
+    stdout = stderr = None
+    while True:
+        try:
+            stdout, stderr = proc.communicate(timeout=POLL_SECONDS)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        if is_cancelled():
+            kill_process_tree(proc)
+            proc.communicate()
+            raise JobCancelled()
+        if deadline is not None and time.monotonic() > deadline:
+            kill_process_tree(proc)
+            stdout, stderr = proc.communicate()
+            raise subprocess.TimeoutExpired(command, timeout, output=stdout, stderr=stderr)
+
+    if check and proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, command, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(command, proc.returncode, stdout, stderr)
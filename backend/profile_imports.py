@@ -0,0 +1,138 @@
+# profile_imports.py — track start-up (import) cost of the backend modules
+#
+# Imports each target in a fresh interpreter with `python -X importtime`,
+# records its total import time and the most expensive modules, and flags
+# heavy pipeline dependencies that were loaded eagerly (they should only be
+# imported on first use or by warmup.py).
+#
+# Usage:
+#   python profile_imports.py                        # main, app, job_runner, voicemation
+#   python profile_imports.py --targets main --repeat 5 --top 15
+#   python profile_imports.py --compare bench_results/imports_20260101_120000.json
+#   python profile_imports.py --budget-ms 800        # exit 1 if a target is slower
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from warmup import HEAVY_DEPENDENCIES
+
+RESULTS_DIR = "bench_results"
+DEFAULT_TARGETS = "main,app,job_runner,voicemation"
+
+# import time:       self [us] |  cumulative | imported package
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_target(target):
+    """
+    One cold import of target in a new interpreter.
+    Returns {"wall_ms", "total_ms", "modules": {name: (self_ms, cumulative_ms)}} or {"error"}.
+    """
+    env = dict(os.environ, VOICEMATION_WARMUP="0")
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True, text=True, env=env,
+    )
+    wall_ms = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"}
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)) / 1000, int(match.group(2)) / 1000)
+    total_ms = modules.get(target, (0, 0))[1]
+    return {"wall_ms": wall_ms, "total_ms": total_ms, "modules": modules}
+
+
+def summarize(target, runs, top):
+    errors = [r["error"] for r in runs if "error" in r]
+    if errors:
+        return {"error": errors[0]}
+    last = runs[-1]["modules"]
+    by_cumulative = sorted(last.items(), key=lambda kv: kv[1][1], reverse=True)
+    by_self = sorted(last.items(), key=lambda kv: kv[1][0], reverse=True)
+    return {
+        "median_total_ms": round(statistics.median(r["total_ms"] for r in runs), 1),
+        "median_wall_ms": round(statistics.median(r["wall_ms"] for r in runs), 1),
+        "modules_loaded": len(last),
+        "top_cumulative": [[name, round(cum, 1)] for name, (_s, cum) in by_cumulative if name != target][:top],
+        "top_self": [[name, round(self_ms, 1)] for name, (self_ms, _c) in by_self][:top],
+        "eager_heavy_imports": [m for m in HEAVY_DEPENDENCIES if m in last],
+    }
+
+
+def print_summary(summary):
+    for target, s in summary.items():
+        if "error" in s:
+            print(f"\n❌ {target}: {s['error']}")
+            continue
+        print(f"\n📦 {target}: {s['median_total_ms']:.0f} ms import, {s['median_wall_ms']:.0f} ms process, "
+              f"{s['modules_loaded']} modules")
+        for name, ms in s["top_cumulative"]:
+            print(f"   {ms:8.1f} ms  {name}")
+        if s["eager_heavy_imports"]:
+            print(f"   ⚠️ heavy modules imported eagerly: {', '.join(s['eager_heavy_imports'])}")
+
+
+def compare(current, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\n📊 Compared with {previous_path}:")
+    for target, cur in current["summary"].items():
+        prev = previous.get("summary", {}).get(target)
+        if not prev or "error" in prev or "error" in cur or not prev["median_total_ms"]:
+            continue
+        delta = (cur["median_total_ms"] - prev["median_total_ms"]) / prev["median_total_ms"] * 100
+        print(f"  {target:>12}: {prev['median_total_ms']:.0f} ms -> {cur['median_total_ms']:.0f} ms ({delta:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of the backend modules.")
+    parser.add_argument("--targets", default=DEFAULT_TARGETS, help="Comma separated modules to import")
+    parser.add_argument("--repeat", type=int, default=3, help="Cold imports per target (median is reported)")
+    parser.add_argument("--top", type=int, default=10, help="Most expensive modules to list")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if a target's import takes longer")
+    parser.add_argument("--out", default=None, help="Result JSON path (default: bench_results/imports_<time>.json)")
+    parser.add_argument("--compare", default=None, help="Previous result JSON to compare against")
+    args = parser.parse_args()
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    summary = {
+        target: summarize(target, [profile_target(target) for _ in range(args.repeat)], args.top)
+        for target in targets
+    }
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "summary": summary,
+    }
+    print_summary(summary)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.out or os.path.join(RESULTS_DIR, f"imports_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\n💾 Results written to {out}")
+
+    if args.compare:
+        compare(result, args.compare)
+
+    if args.budget_ms is not None:
+        over = [t for t, s in summary.items() if "error" in s or s["median_total_ms"] > args.budget_ms]
+        if over:
+            print(f"❌ Over the {args.budget_ms:.0f} ms budget (or failed): {', '.join(over)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
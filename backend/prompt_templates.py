@@ -0,0 +1,182 @@
+# prompt_templates.py — versioned system prompts and per-tier token budgets
+#
+# Each duration tier gets only the rules it needs and a max_tokens cap sized
+# for its scene count (about 450 output tokens per scene: narration + code).
+# Pick a version with VOICEMATION_PROMPT_VERSION; "v1" is the original long
+# prompt, kept so quality and latency can be compared against it.
+import os
+
+PROMPT_VERSION = os.environ.get("VOICEMATION_PROMPT_VERSION", "v2")
+
+# Rough output tokens one scene needs (narration paragraph + Manim code)
+TOKENS_PER_SCENE = 450
+WORDS_PER_SECOND = 2.5  # gTTS narration pace
+
+DURATION_TIERS = [
+    # longest duration (s), tier name, detail level, min scenes, max scenes
+    {"max_seconds": 30, "name": "30s", "detail": "VERY short and simple", "min_scenes": 1, "max_scenes": 2},
+    {"max_seconds": 60, "name": "1m", "detail": "short and simple", "min_scenes": 3, "max_scenes": 5},
+    {"max_seconds": 120, "name": "2m", "detail": "NORMAL detail", "min_scenes": 5, "max_scenes": 8},
+    {"max_seconds": 180, "name": "3m", "detail": "DETAIL and thorough", "min_scenes": 8, "max_scenes": 12},
+    {"max_seconds": None, "name": "5m", "detail": "VERY DETAIL and extensive", "min_scenes": 12, "max_scenes": 16},
+]
+
+
+def duration_tier(desired_duration):
+    """Tier dict for a target duration in seconds, with its max_tokens budget."""
+    for tier in DURATION_TIERS:
+        if tier["max_seconds"] is None or desired_duration <= tier["max_seconds"]:
+            return dict(tier, max_tokens=TOKENS_PER_SCENE * tier["max_scenes"] + 200)
+
+
+def estimate_tokens(text):
+    """~4 characters per token for English prose and Python."""
+    return len(text) // 4
+
+
+# -------------------------
+# Rule blocks (v2)
+# -------------------------
+FORMAT_RULES = (
+    "For each scene write a short plain-text narration paragraph, then its Manim Community v0.18 "
+    "code in one ```python block. Nothing else: no markdown, no code outside the blocks."
+)
+CODE_RULES = (
+    "Each block defines one Scene subclass with a unique name. Only built-in Mobjects "
+    "(Text, MathTex, Circle, Arrow, Axes, VGroup, ...); no SVGMobject/ImageMobject or other files. "
+    "`Brace.get_text()` takes no font_size; use .scale()."
+)
+LAYOUT_RULES = (
+    "Never let Mobjects overlap: place them with next_to/to_edge/move_to and use "
+    "arrange(buff=0.5 or more)."
+)
+MULTI_SCENE_RULES = (
+    "Scenes are sequential and build on each other; each starts from an empty screen and "
+    "fades its Mobjects out at the end. Give separate regions to separate ideas."
+)
+
+
+def _scene_plan(desired_duration, tier):
+    target = (tier["min_scenes"] + tier["max_scenes"]) // 2 or 1
+    words = int(desired_duration * WORDS_PER_SECOND / target)
+    if tier["max_scenes"] <= 2:
+        return f"Write {tier['min_scenes']}-{tier['max_scenes']} scene(s), about {words} narration words each, one idea only."
+    return (
+        f"Write {tier['min_scenes']}-{tier['max_scenes']} scenes (flexible; natural pacing first), "
+        f"about {words} narration words each."
+    )
+
+
+def _generation_v2(desired_duration, tier):
+    rules = [FORMAT_RULES, CODE_RULES, LAYOUT_RULES]
+    if tier["max_scenes"] > 2:
+        rules.append(MULTI_SCENE_RULES)
+    return (
+        "You turn a spoken request into a narrated Manim explainer video.\n"
+        f"TOTAL_TARGET_SECONDS: {desired_duration}\n"
+        f"Detail: {tier['detail']}. {_scene_plan(desired_duration, tier)}\n"
+        + "\n".join(f"- {rule}" for rule in rules)
+    )
+
+
+def _generation_v1(desired_duration, tier):
+    num_scenes_instruction = f"aim for {tier['min_scenes']} to {tier['max_scenes']} SCENES"
+    duration_minutes = desired_duration / 60
+    return (
+        "You are an assistant that generates BOTH:\n"
+        "1. A short natural language explanation of the concept (for voiceover).\n"
+        "2. Valid Manim Community v0.18 Python code (inside triple backticks).\n\n"
+        "⚠️ Important rules:\n"
+        "- Wrap ONLY the code in triple backticks.\n"
+        "- Do NOT wrap the explanation in code blocks.\n"
+        "- Do NOT include markdown or text outside explanation + code.\n"
+        "- In Manim Community v0.18, `Brace.get_text()` does not take `font_size`; use `.scale()`.\n\n"
+        "### DYNAMIC ANIMATION CONSTRAINT (MANDATORY) ###\n"
+        f"Current Duration: {desired_duration} seconds ({duration_minutes:.1f} minutes).\n"
+        f"Animation Detail Level MUST be: **{tier['detail'].upper()}**.\n"
+        f"**FLEXIBLE SCENE COUNT:** Split the content into multiple short, sequential Manim SCENES "
+        f"(Scene subclasses), and **{num_scenes_instruction}**.\n"
+        "The scene count is a flexible guideline. Prioritize natural flow and pacing that meets the "
+        "total duration, even if it slightly deviates from the number of scenes suggested.\n"
+        "### VISUAL LAYOUT & OVERLAP CONSTRAINT (MANDATORY) ###\n"
+        "You MUST ensure all Mobjects are clearly separated and DO NOT overlap:\n"
+        "1. **Positioning:** Use `Mobject.next_to()`, `Mobject.to_edge()`, or `Mobject.move_to()`.\n"
+        "2. **Grouping & Spacing:** Use `VGroup` and ALWAYS include a `buff` parameter (e.g., `buff=0.7`) "
+        "in `.arrange()`.\n"
+        "3. **Clear Regions:** Allocate specific, non-overlapping regions for different visual concepts.\n"
+        "STRICT CONSTRAINT: DO NOT use external files. Only use built-in Manim Mobjects and primitives. "
+        "Do NOT use SVGMobject or ImageMobject with filenames.\n"
+        f"TOTAL_TARGET_SECONDS: {desired_duration}\n"
+    )
+
+
+GENERATION_TEMPLATES = {
+    "v1": _generation_v1,
+    "v2": _generation_v2,
+}
+
+
+def _template(version):
+    version = version or PROMPT_VERSION
+    if version not in GENERATION_TEMPLATES:
+        print(f"⚠️ Unknown prompt version '{version}', using v2.")
+        version = "v2"
+    return version, GENERATION_TEMPLATES[version]
+
+
+def build_generation_prompt(desired_duration, version=None):
+    """
+    System prompt for the single-completion path.
+    Returns {'version', 'tier', 'system', 'max_tokens'}.
+    """
+    tier = duration_tier(desired_duration)
+    version, template = _template(version)
+    return {
+        "version": version,
+        "tier": tier["name"],
+        "system": template(desired_duration, tier),
+        "max_tokens": tier["max_tokens"],
+    }
+
+
+# -------------------------
+# Outline / per-scene prompts (fan-out mode)
+# -------------------------
+def build_outline_prompt(desired_duration):
+    tier = duration_tier(desired_duration)
+    num_scenes = (tier["min_scenes"] + tier["max_scenes"]) // 2
+    return {
+        "version": "outline-v1",
+        "tier": tier["name"],
+        "num_scenes": num_scenes,
+        "system": (
+            "You plan short educational Manim videos. "
+            "Split the user's topic into sequential scenes that build on each other.\n"
+            f"OUTLINE_SCENES: {num_scenes}\n"
+            f"TOTAL_TARGET_SECONDS: {desired_duration}\n"
+            f"Detail level: {tier['detail']}.\n"
+            'Respond ONLY with JSON: {"scenes": [{"title": "...", "beats": "..."}]} where '
+            "beats is one or two sentences on what the scene narrates and shows. No code."
+        ),
+        "max_tokens": 60 * num_scenes + 100,
+    }
+
+
+def build_scene_prompt(outline, index, desired_duration):
+    scene = outline[index]
+    scene_seconds = max(5, round(desired_duration / len(outline)))
+    plan = "\n".join(f"{i + 1}. {s['title']}: {s['beats']}" for i, s in enumerate(outline))
+    return {
+        "version": "scene-v1",
+        "tier": duration_tier(desired_duration)["name"],
+        "system": (
+            "You write ONE scene of a narrated Manim explainer video.\n"
+            f"SCENE_INDEX: {index + 1} of {len(outline)}\n"
+            f"Full outline:\n{plan}\n"
+            f"This scene: {scene['title']} - {scene['beats']}\n"
+            f"Narration: about {int(scene_seconds * WORDS_PER_SECOND)} words (~{scene_seconds} seconds).\n"
+            f"Name the class Scene{index + 1:02d}(Scene).\n"
+            f"- {FORMAT_RULES}\n- {CODE_RULES}\n- {LAYOUT_RULES}"
+        ),
+        "max_tokens": TOKENS_PER_SCENE + 200,
+    }
@@ -0,0 +1,410 @@
+# render_queue.py — shared queue of manim render tasks
+#
+# With VOICEMATION_RENDER_QUEUE set, API processes don't run manim themselves:
+# each scene becomes a task (module source, scene class, quality) that render
+# workers (render_worker.py, any number, on any node) claim, render and write
+# to the shared artifact directory as <task id>.mp4. Task ids hash the task, so
+# identical scenes, including repeats across jobs, render once.
+#
+#   VOICEMATION_RENDER_QUEUE=sqlite   SQLite file under the artifact dir (one host,
+#                                     or a shared filesystem with working locks)
+#   VOICEMATION_RENDER_QUEUE=redis    Redis (or compatible) at VOICEMATION_REDIS_URL;
+#                                     needs the optional `redis` package
+#
+# Workers hold a lease on the task they render and extend it while manim runs;
+# tasks whose lease expires (worker died) are handed out again. If no worker
+# claims a task within VOICEMATION_RENDER_CLAIM_TIMEOUT, the client cancels it
+# and renders locally; it also renders locally once the lease of the worker
+# rendering its task ran out, instead of waiting for another worker to poll.
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import redis
+except ImportError:  # optional: only needed for VOICEMATION_RENDER_QUEUE=redis
+    redis = None
+
+from metrics_utils import register_collector
+from process_utils import check_cancelled
+from workspace_utils import FINAL_VIDEO_DIR
+
+RENDER_QUEUE_BACKEND = os.environ.get("VOICEMATION_RENDER_QUEUE", "").lower()
+RENDER_ARTIFACT_DIR = os.environ.get(
+    "VOICEMATION_RENDER_ARTIFACT_DIR", os.path.join(FINAL_VIDEO_DIR, "render_artifacts")
+)
+RENDER_QUEUE_DB = os.environ.get("VOICEMATION_RENDER_QUEUE_DB", os.path.join(RENDER_ARTIFACT_DIR, "queue.sqlite"))
+REDIS_URL = os.environ.get("VOICEMATION_REDIS_URL", "redis://localhost:6379/0")
+REDIS_PREFIX = os.environ.get("VOICEMATION_REDIS_PREFIX", "voicemation:render")
+
+RENDER_LEASE_SECONDS = int(os.environ.get("VOICEMATION_RENDER_LEASE", "60"))
+RENDER_MAX_ATTEMPTS = int(os.environ.get("VOICEMATION_RENDER_MAX_ATTEMPTS", "3"))
+RENDER_WAIT_SECONDS = int(os.environ.get("VOICEMATION_RENDER_WAIT", "900"))
+RENDER_CLAIM_TIMEOUT = int(os.environ.get("VOICEMATION_RENDER_CLAIM_TIMEOUT", "60"))
+RENDER_POLL_SECONDS = 0.5
+
+# task states: queued -> running -> done | failed; queued -> cancelled
+FINISHED = ("done", "failed", "cancelled")
+
+
+class RenderQueueUnavailable(Exception):
+    """No queue, or no worker took the task: render locally instead."""
+
+
+def task_id_for(code, class_name, quality):
+    raw = f"{quality}\n{class_name}\n{code}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def artifact_path(task_id):
+    return os.path.join(RENDER_ARTIFACT_DIR, f"{task_id}.mp4")
+
+
+# -------------------------
+# SQLite backend
+# -------------------------
+class SQLiteRenderQueue:
+    def __init__(self, path=RENDER_QUEUE_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                " id TEXT PRIMARY KEY, code TEXT, class_name TEXT, quality TEXT,"
+                " status TEXT, attempts INTEGER DEFAULT 0, worker TEXT, lease_until REAL,"
+                " video_path TEXT, error TEXT, created REAL, updated REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, created)")
+
+    @contextmanager
+    def _connect(self):
+        # autocommit; multi-statement updates take BEGIN IMMEDIATE themselves
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        except BaseException:
+            if db.in_transaction:
+                db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def submit(self, code, class_name, quality):
+        task_id = task_id_for(code, class_name, quality)
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT status FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                db.execute(
+                    "INSERT INTO tasks (id, code, class_name, quality, status, created, updated)"
+                    " VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                    (task_id, code, class_name, quality, now, now),
+                )
+            elif row["status"] in ("failed", "cancelled") or (
+                    row["status"] == "done" and not os.path.exists(artifact_path(task_id))):
+                # retry a failure, or re-render an artifact removed by retention
+                db.execute(
+                    "UPDATE tasks SET status = 'queued', attempts = 0, error = NULL, worker = NULL,"
+                    " created = ?, updated = ? WHERE id = ?",
+                    (now, now, task_id),
+                )
+            else:
+                # reused: keeps the artifact away from pruning
+                db.execute("UPDATE tasks SET updated = ? WHERE id = ?", (now, task_id))
+            db.execute("COMMIT")
+        return task_id
+
+    def claim(self, worker):
+        """Oldest queued task (or one whose lease expired) as a dict, or None."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,"
+                " error = CASE WHEN attempts >= ? THEN 'worker lost' ELSE error END, updated = ?"
+                " WHERE status = 'running' AND lease_until < ?",
+                (RENDER_MAX_ATTEMPTS, RENDER_MAX_ATTEMPTS, now, now),
+            )
+            row = db.execute(
+                "SELECT * FROM tasks WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            db.execute(
+                "UPDATE tasks SET status = 'running', worker = ?, attempts = attempts + 1,"
+                " lease_until = ?, updated = ? WHERE id = ?",
+                (worker, now + RENDER_LEASE_SECONDS, now, row["id"]),
+            )
+            db.execute("COMMIT")
+        return dict(row, status="running", worker=worker, attempts=row["attempts"] + 1)
+
+    def heartbeat(self, task_id, worker):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + RENDER_LEASE_SECONDS, task_id, worker),
+            )
+
+    def complete(self, task_id, worker, video_path):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE tasks SET status = 'done', video_path = ?, updated = ? WHERE id = ? AND worker = ?",
+                (video_path, time.time(), task_id, worker),
+            )
+
+    def fail(self, task_id, worker, error):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE tasks SET status = 'failed', error = ?, updated = ? WHERE id = ? AND worker = ?",
+                (error[:2000], time.time(), task_id, worker),
+            )
+
+    def cancel(self, task_id):
+        """Withdraw a task nobody claimed yet. True if it was still queued."""
+        with self._connect() as db:
+            cur = db.execute(
+                "UPDATE tasks SET status = 'cancelled', updated = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), task_id),
+            )
+            return cur.rowcount == 1
+
+    def get(self, task_id):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT id, class_name, quality, status, attempts, worker, lease_until, video_path, error,"
+                " created, updated"
+                " FROM tasks WHERE id = ?",
+                (task_id,),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def stats(self):
+        with self._connect() as db:
+            rows = db.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def prune(self, max_age):
+        """Forget finished tasks not touched for max_age seconds. Returns their ids."""
+        cutoff = time.time() - max_age
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            ids = [r[0] for r in db.execute(
+                "SELECT id FROM tasks WHERE status IN ('done', 'failed', 'cancelled') AND updated < ?", (cutoff,)
+            )]
+            db.execute(
+                "DELETE FROM tasks WHERE status IN ('done', 'failed', 'cancelled') AND updated < ?", (cutoff,)
+            )
+            db.execute("COMMIT")
+        return ids
+
+
+# -------------------------
+# Redis backend
+# -------------------------
+class RedisRenderQueue:
+    """
+    <prefix>:task:<id>  hash with the task fields
+    <prefix>:queue      list of queued ids (LPUSH / BRPOP)
+    <prefix>:leases     sorted set id -> lease expiry of running tasks
+    """
+
+    def __init__(self, url=REDIS_URL, prefix=REDIS_PREFIX):
+        if redis is None:
+            raise RenderQueueUnavailable("VOICEMATION_RENDER_QUEUE=redis needs the `redis` package")
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def _key(self, *parts):
+        return ":".join((self.prefix,) + parts)
+
+    def submit(self, code, class_name, quality):
+        task_id = task_id_for(code, class_name, quality)
+        key = self._key("task", task_id)
+        now = time.time()
+        status = self.r.hget(key, "status")
+        if status in (None, "failed", "cancelled") or (status == "done" and not os.path.exists(artifact_path(task_id))):
+            # WATCH-free: a duplicate LPUSH only makes a worker find the task already running
+            self.r.hset(key, mapping={
+                "id": task_id, "code": code, "class_name": class_name, "quality": quality,
+                "status": "queued", "attempts": 0, "error": "", "worker": "", "created": now, "updated": now,
+            })
+            self.r.lpush(self._key("queue"), task_id)
+        else:
+            self.r.hset(key, "updated", now)
+        return task_id
+
+    def _requeue_expired(self):
+        now = time.time()
+        for task_id in self.r.zrangebyscore(self._key("leases"), "-inf", now):
+            if not self.r.zrem(self._key("leases"), task_id):
+                continue  # another worker got it
+            key = self._key("task", task_id)
+            if int(self.r.hget(key, "attempts") or 0) >= RENDER_MAX_ATTEMPTS:
+                self.r.hset(key, mapping={"status": "failed", "error": "worker lost", "updated": now})
+            else:
+                self.r.hset(key, mapping={"status": "queued", "updated": now})
+                self.r.rpush(self._key("queue"), task_id)
+
+    def claim(self, worker, block_seconds=1):
+        self._requeue_expired()
+        item = self.r.brpop(self._key("queue"), timeout=block_seconds)
+        if not item:
+            return None
+        task_id = item[1]
+        key = self._key("task", task_id)
+        if self.r.hget(key, "status") != "queued":
+            return None  # cancelled, or a duplicate entry of a running task
+        now = time.time()
+        self.r.hset(key, mapping={"status": "running", "worker": worker, "updated": now})
+        self.r.hincrby(key, "attempts", 1)
+        self.r.zadd(self._key("leases"), {task_id: now + RENDER_LEASE_SECONDS})
+        return self.r.hgetall(key)
+
+    def heartbeat(self, task_id, worker):
+        if self.r.hget(self._key("task", task_id), "worker") == worker:
+            self.r.zadd(self._key("leases"), {task_id: time.time() + RENDER_LEASE_SECONDS}, xx=True)
+
+    def _finish(self, task_id, worker, **fields):
+        key = self._key("task", task_id)
+        if self.r.hget(key, "worker") != worker:
+            return
+        self.r.zrem(self._key("leases"), task_id)
+        self.r.hset(key, mapping={**fields, "updated": time.time()})
+
+    def complete(self, task_id, worker, video_path):
+        self._finish(task_id, worker, status="done", video_path=video_path)
+
+    def fail(self, task_id, worker, error):
+        self._finish(task_id, worker, status="failed", error=error[:2000])
+
+    def cancel(self, task_id):
+        key = self._key("task", task_id)
+        with self.r.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.hget(key, "status") != "queued":
+                    return False
+                pipe.multi()
+                pipe.hset(key, mapping={"status": "cancelled", "updated": time.time()})
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def get(self, task_id):
+        task = self.r.hgetall(self._key("task", task_id))
+        if not task:
+            return None
+        task.pop("code", None)
+        for field in ("created", "updated"):
+            task[field] = float(task.get(field) or 0)
+        task["lease_until"] = self.r.zscore(self._key("leases"), task_id)
+        return task
+
+    def stats(self):
+        counts = {}
+        for key in self.r.scan_iter(self._key("task", "*")):
+            status = self.r.hget(key, "status")
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def prune(self, max_age):
+        cutoff = time.time() - max_age
+        removed = []
+        for key in self.r.scan_iter(self._key("task", "*")):
+            status, updated = self.r.hmget(key, "status", "updated")
+            if status in FINISHED and float(updated or 0) < cutoff:
+                self.r.delete(key)
+                removed.append(key.rsplit(":", 1)[-1])
+        return removed
+
+
+# -------------------------
+# Client
+# -------------------------
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def render_queue_enabled():
+    return RENDER_QUEUE_BACKEND in ("sqlite", "redis")
+
+
+def get_render_queue():
+    """The configured queue backend (created on first use)."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            if RENDER_QUEUE_BACKEND == "redis":
+                _queue = RedisRenderQueue()
+            elif RENDER_QUEUE_BACKEND == "sqlite":
+                _queue = SQLiteRenderQueue()
+            else:
+                raise RenderQueueUnavailable(f"unknown render queue '{RENDER_QUEUE_BACKEND}'")
+        return _queue
+
+
+def submit_render(module_source, class_name, quality):
+    """Queue a render without waiting (idempotent). Returns the task id."""
+    return get_render_queue().submit(module_source, class_name, quality)
+
+
+def await_render(task_id, wait_seconds=RENDER_WAIT_SECONDS, claim_timeout=RENDER_CLAIM_TIMEOUT):
+    """
+    Wait for a task. Returns the artifact path, or None if the render failed or
+    timed out. Raises RenderQueueUnavailable when no worker claimed the task in
+    time (it is cancelled; the caller renders locally), also for the other jobs
+    waiting on the same task, and when the lease of the worker rendering it
+    expired (the worker died). A cancelled job stops waiting but leaves the
+    task queued: identical scenes of other jobs share it.
+    """
+    queue = get_render_queue()
+    started = time.time()
+    while True:
+        check_cancelled()
+        task = queue.get(task_id)
+        if task is None:
+            raise RenderQueueUnavailable(f"render task {task_id} vanished")
+        status = task["status"]
+        if status == "done" and task.get("video_path") and os.path.exists(task["video_path"]):
+            return task["video_path"]
+        if status == "cancelled":
+            # another job sharing this task gave up on the workers; render locally too
+            raise RenderQueueUnavailable(f"render task {task_id} was cancelled")
+        if status in FINISHED:
+            print(f"⚠️ Render task {task_id} {status}: {(task.get('error') or '')[:300]}")
+            return None
+        now = time.time()
+        if status == "running" and task.get("lease_until") and float(task["lease_until"]) < now:
+            # the next claim() requeues it, but there may be no other worker to make that call
+            raise RenderQueueUnavailable(f"the worker rendering {task_id} stopped renewing its lease")
+        if status == "queued" and now - max(task["created"], started) > claim_timeout and queue.cancel(task_id):
+            raise RenderQueueUnavailable(f"no render worker claimed {task_id} within {claim_timeout}s")
+        if now - started > wait_seconds:
+            print(f"⏱ Gave up waiting for render task {task_id} after {wait_seconds}s")
+            return None
+        time.sleep(RENDER_POLL_SECONDS)
+
+
+@register_collector
+def _render_queue_metrics():
+    if not render_queue_enabled():
+        return []
+    try:
+        counts = get_render_queue().stats()
+    except Exception:
+        return []
+    lines = [
+        "# HELP voicemation_render_queue_tasks Render tasks in the shared queue by status",
+        "# TYPE voicemation_render_queue_tasks gauge",
+    ]
+    for status, count in sorted(counts.items()):
+        lines.append(f'voicemation_render_queue_tasks{{status="{status}"}} {count}')
+    return lines
@@ -0,0 +1,134 @@
+# render_worker.py — render service pulling manim tasks from the shared queue
+#
+# Run as many as the render boxes allow; each needs manim, ffmpeg and access
+# to the queue (VOICEMATION_RENDER_QUEUE / _DB or VOICEMATION_REDIS_URL) and to
+# the artifact directory (VOICEMATION_RENDER_ARTIFACT_DIR) the API reads from.
+#
+#   VOICEMATION_RENDER_QUEUE=sqlite python render_worker.py --concurrency 2
+#   VOICEMATION_RENDER_QUEUE=redis VOICEMATION_REDIS_URL=redis://queue:6379/0 python render_worker.py
+import argparse
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+
+import voicemation
+from render_queue import (
+    RENDER_ARTIFACT_DIR,
+    RENDER_LEASE_SECONDS,
+    artifact_path,
+    get_render_queue,
+    render_queue_enabled,
+)
+from workspace_utils import job_workspace
+
+IDLE_SLEEP_SECONDS = 1.0
+# finished tasks (and their artifacts) untouched for this long are removed
+ARTIFACT_MAX_AGE_SECONDS = int(os.environ.get("VOICEMATION_RENDER_ARTIFACT_MAX_AGE", str(24 * 3600)))
+PRUNE_INTERVAL_SECONDS = 600
+
+
+def _keep_lease(queue, task_id, worker, done):
+    while not done.wait(RENDER_LEASE_SECONDS / 3):
+        try:
+            queue.heartbeat(task_id, worker)
+        except Exception as e:
+            print(f"⚠️ Lease heartbeat for {task_id} failed: {e}")
+
+
+def run_task(queue, task, worker):
+    """Render one claimed task into the artifact directory and report the result."""
+    task_id = task["id"]
+    done = threading.Event()
+    heartbeat = threading.Thread(target=_keep_lease, args=(queue, task_id, worker, done), daemon=True)
+    heartbeat.start()
+    t0 = time.perf_counter()
+    try:
+        with job_workspace(f"render_{task_id}") as work_dir:
+            module_path = os.path.join(work_dir, f"render_task_{task_id[:12]}.py")
+            with open(module_path, "w", encoding="utf-8") as f:
+                f.write(task["code"])
+            rendered = voicemation.render_manim_file(
+                module_path, task["class_name"], media_dir=os.path.join(work_dir, "media"),
+                quality=task["quality"],
+            )
+            if not rendered:
+                queue.fail(task_id, worker, "manim render failed")
+                return False
+            target = artifact_path(task_id)
+            tmp = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+            shutil.copyfile(rendered, tmp)
+            os.replace(tmp, target)
+        queue.complete(task_id, worker, target)
+        print(f"✅ {task_id} ({task['class_name']}) rendered in {time.perf_counter() - t0:.1f}s")
+        return True
+    except Exception as e:
+        queue.fail(task_id, worker, f"{e.__class__.__name__}: {e}")
+        return False
+    finally:
+        done.set()
+
+
+def prune_artifacts(queue, max_age=ARTIFACT_MAX_AGE_SECONDS):
+    """Forget old finished tasks and delete their artifacts."""
+    removed = 0
+    for task_id in queue.prune(max_age):
+        try:
+            os.remove(artifact_path(task_id))
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def worker_loop(worker, stop, once=False):
+    queue = get_render_queue()
+    while not stop.is_set():
+        task = queue.claim(worker)
+        if task is None:
+            if once:
+                return
+            stop.wait(IDLE_SLEEP_SECONDS)
+            continue
+        print(f"🎬 {worker} took {task['id']} ({task['class_name']}, attempt {task['attempts']})")
+        run_task(queue, task, worker)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render worker for the shared manim task queue.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Tasks rendered in parallel")
+    parser.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    args = parser.parse_args()
+
+    if not render_queue_enabled():
+        parser.error("set VOICEMATION_RENDER_QUEUE=sqlite or =redis")
+    os.makedirs(RENDER_ARTIFACT_DIR, exist_ok=True)
+
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=worker_loop, args=(f"{args.name}-{i}", stop, args.once), daemon=True)
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    print(f"🧵 Render worker {args.name}: {args.concurrency} slot(s), artifacts in {RENDER_ARTIFACT_DIR}")
+
+    last_prune = 0.0
+    try:
+        while any(t.is_alive() for t in threads):
+            if time.time() - last_prune > PRUNE_INTERVAL_SECONDS:
+                removed = prune_artifacts(get_render_queue())
+                if removed:
+                    print(f"🧹 Removed {removed} old render artifact(s).")
+                last_prune = time.time()
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping; tasks in progress are handed out again when their lease expires.")
+        stop.set()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# rendition_utils.py — lower-resolution renditions and an HLS ladder of a final video
+#
+# Optional output stage (VOICEMATION_RENDITIONS=360p,480p,720p): once the final
+# video is published, ONE ffmpeg process decodes it once, splits the frames
+# into a scale per rung and encodes each rung once. The tee muxer writes that
+# single encode both as a progressive mp4 (downloads) and as HLS segments, and
+# a master playlist ties the rungs together for adaptive players.
+#
+# Output lives next to the final video, keyed by its content-addressed name:
+#   output_videos/renditions/final_<hash>/{360p.mp4, 360p.m3u8, 360p_000.ts, ..., master.m3u8}
+# Rungs taller than the source are skipped. The source itself is not
+# re-encoded: the same process stream-copies it into the top HLS variant.
+import json
+import os
+import re
+import shutil
+import subprocess
+
+from encoder_utils import video_encode_args, frame_rate_args
+from process_utils import run_process, JobCancelled
+from workspace_utils import RENDITION_DIR, rendition_dir
+
+# height / video bitrate cap / audio bitrate (kbit/s); CRF still comes from the encoder profile
+RENDITION_LADDER = {
+    "360p": {"height": 360, "video_kbps": 700, "audio_kbps": 64},
+    "480p": {"height": 480, "video_kbps": 1200, "audio_kbps": 96},
+    "720p": {"height": 720, "video_kbps": 2500, "audio_kbps": 128},
+    "1080p": {"height": 1080, "video_kbps": 4500, "audio_kbps": 128},
+}
+RENDITIONS = [
+    name.strip() for name in os.environ.get("VOICEMATION_RENDITIONS", "").split(",")
+    if name.strip() in RENDITION_LADDER
+]
+HLS_SEGMENT_SECONDS = int(os.environ.get("VOICEMATION_HLS_SEGMENT_SECONDS", "4"))
+MASTER_PLAYLIST = "master.m3u8"
+SOURCE_VARIANT = "source"
+# clients on these Effective-Connection-Type hints get the lowest rung
+SLOW_CONNECTION_TYPES = ("slow-2g", "2g", "3g")
+
+_SAFE_FILENAME = re.compile(r"^[\w-]+(\.[\w]+)?$")
+MIMETYPES = {
+    ".mp4": "video/mp4",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+}
+
+
+def renditions_enabled():
+    return bool(RENDITIONS)
+
+
+def probe_video(video_path):
+    """{"width", "height", "bitrate"} of a video (bitrate in bit/s over the whole file), or None."""
+    command = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=width,height:format=duration,size", "-of", "json", video_path,
+    ]
+    try:
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
+        info = json.loads(result.stdout)
+        stream, fmt = info["streams"][0], info["format"]
+        return {
+            "width": int(stream["width"]),
+            "height": int(stream["height"]),
+            "bitrate": int(int(fmt["size"]) * 8 / max(float(fmt["duration"]), 0.001)),
+        }
+    except Exception as e:
+        print("⚠️ ffprobe could not read the video:", e)
+        return None
+
+
+def ladder_for(source_height, names=None):
+    """Rungs of `names` (default VOICEMATION_RENDITIONS) below the source height, lowest first."""
+    names = RENDITIONS if names is None else names
+    rungs = [(name, RENDITION_LADDER[name]) for name in names if name in RENDITION_LADDER]
+    rungs = [(name, rung) for name, rung in rungs if rung["height"] < source_height]
+    return sorted(rungs, key=lambda item: item[1]["height"])
+
+
+def _even(value):
+    return max(2, int(round(value / 2.0)) * 2)
+
+
+def build_rendition_command(video_path, out_dir, rungs, encoder_profile=None):
+    """
+    One ffmpeg invocation: decode once, split + scale per rung, one encode per
+    rung teed into <rung>.mp4 and <rung>.m3u8 (+ segments), and the source
+    copied into source.m3u8.
+    """
+    graph = [f"[0:v]split={len(rungs)}" + "".join(f"[s{i}]" for i in range(len(rungs)))]
+    graph += [f"[s{i}]scale=-2:{rung['height']}[v{i}]" for i, (_, rung) in enumerate(rungs)]
+    command = ["ffmpeg", "-y", "-i", video_path, "-filter_complex", ";".join(graph)]
+
+    for i, (name, rung) in enumerate(rungs):
+        mp4_path = os.path.join(out_dir, f"{name}.mp4")
+        playlist = os.path.join(out_dir, f"{name}.m3u8")
+        segments = os.path.join(out_dir, f"{name}_%03d.ts")
+        tee = (
+            f"[f=mp4:movflags=+faststart]{mp4_path}|"
+            f"[f=hls:hls_time={HLS_SEGMENT_SECONDS}:hls_playlist_type=vod:"
+            f"hls_segment_filename={segments}]{playlist}"
+        )
+        command += [
+            "-map", f"[v{i}]",
+            "-map", "0:a?",
+            *video_encode_args(encoder_profile),
+            "-maxrate", f"{rung['video_kbps']}k",
+            "-bufsize", f"{rung['video_kbps'] * 2}k",
+            # keyframes at the same times in every rung so players can switch at segment borders
+            "-sc_threshold", "0",
+            "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+            *frame_rate_args(),
+            "-c:a", "aac",
+            "-b:a", f"{rung['audio_kbps']}k",
+            # the tee muxer can't ask for it itself; mp4 needs the headers out of band
+            "-flags", "+global_header",
+            "-f", "tee", tee,
+        ]
+    command += [
+        "-map", "0:v:0", "-map", "0:a?", "-c", "copy",
+        "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+        "-hls_segment_filename", os.path.join(out_dir, f"{SOURCE_VARIANT}_%03d.ts"),
+        os.path.join(out_dir, f"{SOURCE_VARIANT}.m3u8"),
+    ]
+    return command
+
+
+def write_master_playlist(out_dir, rungs, source):
+    variants = [
+        (name, (rung["video_kbps"] + rung["audio_kbps"]) * 1000,
+         _even(source["width"] * rung["height"] / source["height"]), rung["height"])
+        for name, rung in rungs
+    ]
+    # average rate of the source; peaks run higher
+    variants.append((SOURCE_VARIANT, int(source["bitrate"] * 1.5), source["width"], source["height"]))
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for name, bandwidth, width, height in variants:
+        lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={width}x{height},NAME=\"{name}\"")
+        lines.append(f"{name}.m3u8")
+    with open(os.path.join(out_dir, MASTER_PLAYLIST), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def build_renditions(video_path, encoder_profile=None, names=None):
+    """
+    Encode the configured ladder for a published final video. Returns the
+    rendition directory, or None (disabled, nothing below the source, failure).
+    An existing directory is reused: the final video name is content-addressed.
+    """
+    target = rendition_dir(video_path)
+    if os.path.exists(os.path.join(target, MASTER_PLAYLIST)):
+        return target
+    source = probe_video(video_path)
+    if not source:
+        return None
+    rungs = ladder_for(source["height"], names)
+    if not rungs:
+        return None
+
+    os.makedirs(RENDITION_DIR, exist_ok=True)
+    tmp_dir = f"{target}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        print(f"📶 Encoding renditions {', '.join(n for n, _ in rungs)} ->", target)
+        run_process(build_rendition_command(video_path, tmp_dir, rungs, encoder_profile))
+        write_master_playlist(tmp_dir, rungs, source)
+        try:
+            os.replace(tmp_dir, target)
+        except OSError:
+            # another process published the same video's renditions first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return target
+    except subprocess.CalledProcessError as e:
+        print("❌ Rendition encode failed:", "\n".join((e.stderr or "").splitlines()[-5:]))
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return None
+    except JobCancelled:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+# -------------------------
+# Serving
+# -------------------------
+def available_renditions(video_path):
+    """{rung name: mp4 path} of the renditions of video_path, lowest first."""
+    directory = rendition_dir(video_path)
+    found = {}
+    for name, rung in sorted(RENDITION_LADDER.items(), key=lambda item: item[1]["height"]):
+        path = os.path.join(directory, f"{name}.mp4")
+        if os.path.exists(path):
+            found[name] = path
+    return found
+
+
+def rendition_fields(video_path):
+    """Job record fields pointing at the renditions of video_path ({} if there are none)."""
+    available = available_renditions(video_path)
+    if not available:
+        return {}
+    stem = os.path.basename(rendition_dir(video_path))
+    return {
+        "renditions": {name: f"/videos/{stem}/{name}.mp4" for name in available},
+        "hls_url": f"/videos/{stem}/{MASTER_PLAYLIST}",
+    }
+
+
+def rendition_file(stem, filename):
+    """Path of a file of a rendition directory, or None if absent or not a plain name."""
+    if not _SAFE_FILENAME.match(stem) or not _SAFE_FILENAME.match(filename):
+        return None
+    if os.path.splitext(filename)[1] not in MIMETYPES:
+        return None
+    path = os.path.join(RENDITION_DIR, stem, filename)
+    return path if os.path.isfile(path) else None
+
+
+def rendition_mimetype(path):
+    return MIMETYPES.get(os.path.splitext(path)[1], "application/octet-stream")
+
+
+def pick_rendition(video_path, quality=None, save_data=None, ect=None, downlink=None):
+    """
+    File to serve for a download of video_path. ?quality= picks a rung by name
+    ("source" for the original); otherwise Save-Data or a slow ECT client hint
+    gets the lowest rung and a Downlink hint (Mbit/s) the highest rung it can
+    stream. Anything else gets the original.
+    """
+    available = available_renditions(video_path)
+    if not available or quality == "source":
+        return video_path
+    if quality:
+        return available.get(quality, video_path)
+    if (save_data or "").strip().lower() == "on" or (ect or "").strip().lower() in SLOW_CONNECTION_TYPES:
+        return next(iter(available.values()))
+    try:
+        mbps = float(downlink)
+    except (TypeError, ValueError):
+        return video_path
+    fitting = [
+        path for name, path in available.items()
+        if (RENDITION_LADDER[name]["video_kbps"] + RENDITION_LADDER[name]["audio_kbps"]) * 1.5 <= mbps * 1000
+    ]
+    # faster than every rung needs: the original
+    if len(fitting) == len(available):
+        return video_path
+    return fitting[-1] if fitting else next(iter(available.values()))
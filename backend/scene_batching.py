@@ -0,0 +1,115 @@
+# scene_batching.py — merge several generated scenes into one Manim module
+import ast
+import re
+
+
+def _node_names(node):
+    """
+    Names a top-level statement defines, or None if it is not a plain
+    definition (function, class, or `NAME = ...` assignment).
+    """
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return (node.name,)
+    if isinstance(node, ast.Assign) and all(isinstance(t, ast.Name) for t in node.targets):
+        return tuple(t.id for t in node.targets)
+    if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+        return (node.target.id,)
+    return None
+
+
+def _rename_class(source, old_name, new_name):
+    return re.sub(rf"\bclass\s+{re.escape(old_name)}\b", f"class {new_name}", source, count=1)
+
+
+def build_batched_module(scenes):
+    """
+    Combine sanitized scene codes into a single module source.
+
+    :param scenes: list of {'code': str, 'class_name': str}
+    :return: (module_source, class_names, solo_indices)
+        class_names[i] is the (possibly renamed) class for scenes[i], or None
+        if that scene could not be batched; solo_indices lists those scenes,
+        which must be rendered on their own.
+
+    Imports and helpers (functions, classes, NAME = ... assignments) that are
+    textually identical across scenes are emitted once. A scene whose helper
+    clashes with a different definition of the same name, or which has other
+    module-level statements, is left out of the batch so its behaviour can't
+    change.
+    """
+    imports = ["from manim import *"]
+    defined = {}          # name -> source of the definition already emitted
+    body = []
+    class_names = [None] * len(scenes)
+    solo_indices = []
+
+    for idx, scene in enumerate(scenes):
+        code = scene['code']
+        class_name = scene['class_name']
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            solo_indices.append(idx)
+            continue
+
+        scene_imports = []
+        helpers = []
+        scene_node = None
+        ok = True
+
+        for node in tree.body:
+            segment = ast.get_source_segment(code, node)
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                scene_imports.append(segment)
+                continue
+            if isinstance(node, ast.ClassDef) and node.name == class_name and scene_node is None:
+                scene_node = segment
+                continue
+            names = _node_names(node)
+            if names is None:
+                ok = False
+                break
+            helpers.append((names, segment))
+
+        if not ok or scene_node is None:
+            solo_indices.append(idx)
+            continue
+
+        new_helpers = []
+        for names, segment in helpers:
+            for name in names:
+                if name in defined and defined[name] != segment:
+                    ok = False
+            if not ok:
+                break
+            if not all(name in defined for name in names):
+                new_helpers.append((names, segment))
+        if not ok:
+            solo_indices.append(idx)
+            continue
+
+        # Scene class names must be unique within the module
+        final_name = class_name
+        if final_name in defined:
+            final_name = f"{class_name}_{idx}"
+            scene_node = _rename_class(scene_node, class_name, final_name)
+
+        for line in scene_imports:
+            if line not in imports:
+                imports.append(line)
+        for names, segment in new_helpers:
+            for name in names:
+                defined[name] = segment
+            body.append(segment)
+        defined[final_name] = scene_node
+        body.append(scene_node)
+        class_names[idx] = final_name
+
+    module_source = "\n".join(imports) + "\n\n\n" + "\n\n\n".join(body) + "\n"
+    return module_source, class_names, solo_indices
+
+
+def chunk_indices(indices, chunk_size):
+    """Split a list of scene indices into runs of at most chunk_size."""
+    chunk_size = max(1, int(chunk_size))
+    return [indices[i:i + chunk_size] for i in range(0, len(indices), chunk_size)]
@@ -0,0 +1,104 @@
+# scene_store.py — keep the scenes of finished jobs so single scenes can be revised
+#
+# A job's workspace is removed when it ends, and with it every narration,
+# render and muxed clip. With VOICEMATION_SCENE_EDITS on, the scenes that made
+# it into the final video are copied (hard-linked where possible) to
+#   output_videos/scenes/<job_id>/{scenes.json, 00_video.mp4, 00_raw.mp4, 00_narration.mp3, 00_subs.srt, ...}
+# A revision (job_runner.submit_revision) re-runs only the edited scenes and
+# stream-copies the stored clips of the others into the new video; its own
+# scenes are stored under the revision's job id, so revisions can be revised.
+# The janitor removes stores older than VOICEMATION_SCENE_STORE_MAX_AGE, and the
+# least recently used ones once they exceed VOICEMATION_SCENE_STORE_MAX_BYTES.
+import json
+import os
+import shutil
+import time
+
+from workspace_utils import SCENE_STORE_DIR
+
+SCENE_EDITS_ENABLED = os.environ.get("VOICEMATION_SCENE_EDITS", "1") == "1"
+STORE_NAME = "scenes.json"
+# section keys kept per scene; the *_path ones are files
+SCENE_FIELDS = ("class_name", "explanation", "code")
+SCENE_FILES = {
+    "video_path": "video",
+    "raw_video_path": "raw",
+    "narration_path": "narration",
+    "srt_path": "subs",
+}
+
+
+def scene_record(sec):
+    """The part of a processed section a revision needs."""
+    return {key: sec.get(key) for key in (*SCENE_FIELDS, *SCENE_FILES)}
+
+
+def _store_dir(job_id):
+    return os.path.join(SCENE_STORE_DIR, os.path.basename(job_id))
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def save(job_id, scenes):
+    """Store the scenes (scene_record dicts, in video order) of job_id. Returns the count stored."""
+    if not scenes:
+        return 0
+    target = _store_dir(job_id)
+    tmp_dir = f"{target}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    stored = []
+    try:
+        for i, scene in enumerate(scenes):
+            entry = {key: scene.get(key) for key in SCENE_FIELDS}
+            for key, kind in SCENE_FILES.items():
+                src = scene.get(key)
+                if not src or not os.path.exists(src):
+                    entry[key] = None
+                    continue
+                name = f"{i:02d}_{kind}{os.path.splitext(src)[1]}"
+                _link_or_copy(src, os.path.join(tmp_dir, name))
+                entry[key] = name
+            if not entry["video_path"]:
+                raise OSError(f"scene {i + 1} has no clip")
+            stored.append(entry)
+        with open(os.path.join(tmp_dir, STORE_NAME), "w", encoding="utf-8") as f:
+            json.dump({"job_id": job_id, "stored_at": time.time(), "scenes": stored}, f)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp_dir, target)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return len(stored)
+
+
+def load(job_id):
+    """Stored scenes of job_id with absolute file paths, or None if they are gone."""
+    if not job_id:
+        return None
+    directory = _store_dir(job_id)
+    try:
+        with open(os.path.join(directory, STORE_NAME), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    scenes = []
+    for entry in data.get("scenes", []):
+        scene = {key: entry.get(key) for key in SCENE_FIELDS}
+        for key in SCENE_FILES:
+            path = os.path.join(directory, entry[key]) if entry.get(key) else None
+            scene[key] = path if path and os.path.exists(path) else None
+        if not scene["video_path"]:
+            return None
+        scenes.append(scene)
+    # in use: keep it from the janitor a while longer
+    try:
+        os.utime(directory, None)
+    except OSError:
+        pass
+    return scenes or None
@@ -0,0 +1,122 @@
+# scene_templates.py — keyword-routed, hand-checked scene packs
+#
+# The generalized form of ohmslaw.py: instead of routing "ohm" to a fixed
+# prompt, common topics map to a pack of finished scenes (narration + Manim
+# code) in template_packs/<id>.json. prerender_templates.py renders every
+# scene and synthesizes its narration at deploy time; a matching request then
+# skips both the LLM and the render stage.
+#
+# Pack format:
+#   {"id": ..., "title": ...,
+#    "keywords": ["ohm law", ...],    # any phrase's tokens inside the transcript -> candidate
+#    "vocabulary": ["voltage", ...],  # other words the pack also covers
+#    "max_seconds": 180,              # longer requests go to the LLM for more depth
+#    "scenes": [{"explanation": ..., "code": ..., "core": true}, ...]}
+# Short duration tiers keep the "core" scenes first.
+import glob
+import hashlib
+import json
+import os
+
+from prompt_templates import duration_tier
+from topic_cache import topic_tokens
+
+TEMPLATES_ENABLED = os.environ.get("VOICEMATION_TEMPLATES", "1") == "1"
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "template_packs")
+TEMPLATE_RENDER_DIR = os.environ.get(
+    "VOICEMATION_TEMPLATE_RENDER_DIR", os.path.join(TEMPLATE_DIR, "rendered")
+)
+# Topic tokens of the transcript the pack's vocabulary may leave uncovered:
+# none, so "ohm's law and thevenin equivalents" isn't answered with the Ohm's
+# law pack alone; one stray word is tolerated in transcripts of
+# LONG_TRANSCRIPT_TOKENS topic tokens or more.
+LONG_TRANSCRIPT_TOKENS = int(os.environ.get("VOICEMATION_TEMPLATE_LONG_TOKENS", "12"))
+MAX_UNCOVERED_LONG = 1
+
+
+def max_uncovered(token_count):
+    return MAX_UNCOVERED_LONG if token_count >= LONG_TRANSCRIPT_TOKENS else 0
+
+
+_packs = None
+
+
+def load_packs(template_dir=TEMPLATE_DIR):
+    """All packs, parsed once per process."""
+    global _packs
+    if _packs is None:
+        packs = []
+        for path in sorted(glob.glob(os.path.join(template_dir, "*.json"))):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    pack = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping template pack {path}: {e}")
+                continue
+            pack["_keywords"] = [set(topic_tokens(k)) for k in pack.get("keywords", [])]
+            pack["_vocabulary"] = set().union(*pack["_keywords"], topic_tokens(" ".join(pack.get("vocabulary", []))))
+            packs.append(pack)
+        _packs = packs
+    return _packs
+
+
+def scene_digest(scene):
+    return hashlib.sha256((scene["code"] + "\n" + scene["explanation"]).encode("utf-8")).hexdigest()[:12]
+
+
+def rendered_paths(pack_id, index, scene):
+    """(video, narration) paths of a pre-rendered scene; the digest invalidates stale renders."""
+    stem = os.path.join(TEMPLATE_RENDER_DIR, pack_id, f"{index:02d}_{scene_digest(scene)}")
+    return stem + ".mp4", stem + ".mp3"
+
+
+def select_scenes(pack, desired_duration):
+    """
+    Scenes for the duration tier, in pack order: all of them if they fit the
+    tier's scene budget, else the core scenes topped up with the others.
+    """
+    scenes = list(enumerate(pack["scenes"]))
+    max_scenes = duration_tier(desired_duration)["max_scenes"]
+    if len(scenes) <= max_scenes:
+        return scenes
+    core = [(i, s) for i, s in scenes if s.get("core")][:max_scenes]
+    extra = [(i, s) for i, s in scenes if not s.get("core")][:max_scenes - len(core)]
+    return sorted(core + extra, key=lambda item: item[0])
+
+
+def match_template(transcript, desired_duration):
+    """
+    The pack for this request, or None. Returns
+    {'id', 'title', 'coverage', 'scenes': [{'explanation', 'code', 'video_path', 'narration_path'}]}
+    where the paths are None when that scene hasn't been pre-rendered.
+    """
+    if not TEMPLATES_ENABLED:
+        return None
+    tokens = set(topic_tokens(transcript))
+    if not tokens:
+        return None
+
+    allowed = max_uncovered(len(tokens))
+    best, best_uncovered = None, None
+    for pack in load_packs():
+        if desired_duration > pack.get("max_seconds", 180):
+            continue
+        if not any(k and k <= tokens for k in pack["_keywords"]):
+            continue
+        uncovered = len(tokens - pack["_vocabulary"])
+        if uncovered <= allowed and (best is None or uncovered < best_uncovered):
+            best, best_uncovered = pack, uncovered
+    if best is None:
+        return None
+
+    scenes = []
+    for index, scene in select_scenes(best, desired_duration):
+        video, narration = rendered_paths(best["id"], index, scene)
+        scenes.append({
+            "explanation": scene["explanation"],
+            "code": scene["code"],
+            "video_path": video if os.path.exists(video) else None,
+            "narration_path": narration if os.path.exists(narration) else None,
+        })
+    return {"id": best["id"], "title": best.get("title", best["id"]), "coverage": round(1 - best_uncovered / len(tokens), 3),
+            "scenes": scenes}
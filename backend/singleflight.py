@@ -0,0 +1,148 @@
+# singleflight.py — coalesce identical in-flight generations
+#
+# After ASR, a job looks up its flight key (normalized transcript + duration).
+# The first job becomes the leader and runs the pipeline; identical jobs that
+# arrive while it runs register as followers and return at once, freeing their
+# worker. When the leader finishes it writes its result into every follower's
+# job record. Flights are small JSON files next to the job records, guarded by
+# a file lock, so followers in other worker processes are picked up as well.
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescing stays within one process
+    fcntl = None
+
+from workspace_utils import JOB_RECORD_DIR
+
+FLIGHT_DIR = os.path.join(JOB_RECORD_DIR, "flights")
+# A flight older than this (or whose leader process is gone) is taken over
+FLIGHT_MAX_AGE_SECONDS = int(os.environ.get("VOICEMATION_FLIGHT_MAX_AGE", "3600"))
+SINGLEFLIGHT_ENABLED = os.environ.get("VOICEMATION_SINGLEFLIGHT", "1") == "1"
+
+os.makedirs(FLIGHT_DIR, exist_ok=True)
+_thread_lock = threading.Lock()
+
+
+def normalize_transcript(text):
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = re.sub(r"[^\w\s]", "", (text or "").lower())
+    return " ".join(text.split())
+
+
+def flight_key(transcript, manual_duration=None):
+    raw = f"{normalize_transcript(transcript)}|{manual_duration or 'auto'}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _flight_path(key):
+    return os.path.join(FLIGHT_DIR, f"{key}.json")
+
+
+@contextmanager
+def _flight_lock(key):
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(_flight_path(key) + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_flight(key):
+    try:
+        with open(_flight_path(key), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_flight(key, flight):
+    with open(_flight_path(key), "w", encoding="utf-8") as f:
+        json.dump(flight, f)
+
+
+def _leader_alive(flight):
+    if time.time() - flight.get("started", 0) > FLIGHT_MAX_AGE_SECONDS:
+        return False
+    try:
+        os.kill(flight["pid"], 0)
+    except (OSError, KeyError, TypeError):
+        return False
+    return True
+
+
+def join_or_lead(key, job_id):
+    """
+    Register job_id on the flight for key. Returns None if job_id leads it
+    (and must run the pipeline), else the leader's job id.
+    """
+    if not SINGLEFLIGHT_ENABLED:
+        return None
+    with _flight_lock(key):
+        flight = _read_flight(key)
+        if flight and _leader_alive(flight):
+            flight["followers"].append(job_id)
+            _write_flight(key, flight)
+            return flight["leader"]
+        # new flight, or take over one whose leader died (keeping its followers)
+        followers = flight["followers"] if flight else []
+        _write_flight(key, {"leader": job_id, "pid": os.getpid(), "started": time.time(), "followers": followers})
+        return None
+
+
+def finish(key, job_id):
+    """Close the flight led by job_id and return the follower job ids to resolve."""
+    if not SINGLEFLIGHT_ENABLED:
+        return []
+    with _flight_lock(key):
+        flight = _read_flight(key)
+        if not flight or flight.get("leader") != job_id:
+            return []
+        # the .lock file stays: another process may be waiting on it
+        try:
+            os.remove(_flight_path(key))
+        except OSError:
+            pass
+        return flight["followers"]
+
+
+def leave(key, job_id):
+    """Drop a (cancelled) follower from the flight for key."""
+    if not SINGLEFLIGHT_ENABLED or not key:
+        return
+    with _flight_lock(key):
+        flight = _read_flight(key)
+        if flight and job_id in flight["followers"]:
+            flight["followers"].remove(job_id)
+            _write_flight(key, flight)
+
+
+def abandon(key, job_id):
+    """
+    Close the flight led by job_id so its generation can be cancelled. Returns
+    False, leaving the flight alone, while followers still wait for the result.
+    """
+    if not SINGLEFLIGHT_ENABLED or not key:
+        return True
+    with _flight_lock(key):
+        flight = _read_flight(key)
+        if not flight or flight.get("leader") != job_id:
+            return True
+        if flight["followers"]:
+            return False
+        try:
+            os.remove(_flight_path(key))
+        except OSError:
+            pass
+        return True
@@ -16,6 +16,90 @@ let currentDurationSetting = 'ai'; // 'ai' or 'manual'
 
 // Backend API URL
 const BACKEND_URL = "http://127.0.0.1:5001";  // ⬅️ IMPORTANT
+const POLL_INTERVAL_MS = 2000;
+
+// ------------------------
+// Job progress: /generate_audio answers 202 { job_id }
+// ------------------------
+function jobOutcome(job) {
+    if (job.status === "done") {
+        return job;
+    }
+    if (job.status === "error" || job.status === "unknown" || job.status === "cancelled") {
+        return { error: job.error || (job.status === "cancelled" ? "Job cancelled" : "Job failed") };
+    }
+    return null;
+}
+
+// Server-sent events from /events/<job_id>; resolves with the result event,
+// or null if the stream can't be used (then waitForJob polls /status)
+function streamJob(jobId) {
+    return new Promise((resolve) => {
+        if (typeof EventSource === "undefined") {
+            resolve(null);
+            return;
+        }
+        const source = new EventSource(`${BACKEND_URL}/events/${jobId}`);
+        let errors = 0;
+        source.addEventListener("status", (e) => {
+            errors = 0;
+            const { status } = JSON.parse(e.data);
+            statusElement.innerText = status === "queued"
+                ? "⏳ Waiting for a free worker..."
+                : "⏳ Generating...";
+        });
+        source.addEventListener("progress", (e) => {
+            const { done, total, eta_seconds } = JSON.parse(e.data);
+            const eta = done < total ? `, about ${Math.ceil(eta_seconds)}s left` : "";
+            statusElement.innerText = `⏳ Generating... ${done}/${total} scenes${eta}`;
+        });
+        source.addEventListener("result", (e) => {
+            source.close();
+            resolve(JSON.parse(e.data));
+        });
+        source.onerror = () => {
+            errors += 1;
+            // CLOSED: the browser won't reconnect (e.g. a non-200 answer), fall back now
+            if (source.readyState === EventSource.CLOSED || errors >= 3) {
+                source.close();
+                resolve(null);
+            }
+        };
+    });
+}
+
+async function waitForJob(jobId) {
+    // closing the tab cancels the job so the server stops rendering for nobody
+    const cancelJob = () => {
+        fetch(`${BACKEND_URL}/jobs/${jobId}`, { method: "DELETE", keepalive: true }).catch(() => {});
+    };
+    window.addEventListener("pagehide", cancelJob);
+    try {
+        const streamed = await streamJob(jobId);
+        if (streamed) {
+            return jobOutcome(streamed) || { error: "Job failed" };
+        }
+        while (true) {
+            await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+            const response = await fetch(`${BACKEND_URL}/status/${jobId}`, {
+                headers: { "Accept": "application/json" }
+            });
+            if (!response.ok) {
+                throw new Error(`Status check returned ${response.status}`);
+            }
+            const job = await response.json();
+            const outcome = jobOutcome(job);
+            if (outcome) {
+                return outcome;
+            }
+            statusElement.innerText = job.status === "queued"
+                ? "⏳ Waiting for a free worker..."
+                : "⏳ Generating...";
+        }
+    } finally {
+        window.removeEventListener("pagehide", cancelJob);
+    }
+}
 
 // ------------------------
 // Duration Control
@@ -147,9 +231,13 @@ recordBtn.addEventListener("click", async () => {
                     );
                 }
 
+                if (result.job_id && !result.video_url) {
+                    result = await waitForJob(result.job_id);
+                }
+
                 if (result.video_url) {
                     subtitleData = result.subtitles_json || [];
-                    videoElement.src = `${BACKEND_URL}${result.video_url}?t=${Date.now()}`;
+                    videoElement.src = `${BACKEND_URL}${result.video_url}`;
                     videoElement.load();
                     videoElement.style.display = "block";
 
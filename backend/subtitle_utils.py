@@ -4,10 +4,9 @@ import uuid
 import re
 from typing import List, Dict, Any
 from typing import List, Dict
-from mutagen.mp3 import MP3
 import subprocess
 
-def generate_srt_file(explanation_text: str, audio_duration: float, index: int) -> str:
+def generate_srt_file(explanation_text: str, audio_duration: float, index: int, out_dir: str = None) -> str:
     """
     Creates a time-synced SubRip (.srt) file for a single narration segment.
     Simulates word timings by dividing the total duration based on the number of characters 
@@ -16,6 +15,7 @@ def generate_srt_file(explanation_text: str, audio_duration: float, index: int)
     :param explanation_text: The narration text for the scene.
     :param audio_duration: The exact duration of the generated voiceover in seconds.
     :param index: The scene index (used for unique filename generation).
+    :param out_dir: Directory to write into (the job workspace); defaults to the temp dir.
     :return: The absolute path to the generated .srt file.
     """
     
@@ -82,7 +82,7 @@ def generate_srt_file(explanation_text: str, audio_duration: float, index: int)
         subtitle_index += 1
         
     # --- Step 3: Save to file ---
-    temp_dir = tempfile.gettempdir()
+    temp_dir = out_dir or tempfile.gettempdir()
     unique_filename = f"scene_{index}_subs_{uuid.uuid4().hex[:4]}.srt"
     srt_path = os.path.join(temp_dir, unique_filename)
     
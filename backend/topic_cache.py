@@ -0,0 +1,180 @@
+# topic_cache.py — reuse finished videos for requests on the same topic
+#
+# Completed jobs are indexed by the normalized token set of their transcript
+# and their duration tier. A new request whose tokens overlap an entry of the
+# same tier by at least VOICEMATION_TOPIC_SIMILARITY (Jaccard) gets that
+# entry's video and subtitles instead of a new pipeline run, so
+# "explain ohm's law" and "ohms law explanation" share one video.
+#
+# The index is a JSON file next to the outputs, guarded by a file lock, so
+# all worker processes share it. Entries whose video was removed by output
+# retention are dropped on lookup; beyond MAX_ENTRIES the least recently
+# hit ones are evicted.
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: index writes are only serialized per process
+    fcntl = None
+
+from workspace_utils import FINAL_VIDEO_DIR, touch_output
+
+TOPIC_CACHE_ENABLED = os.environ.get("VOICEMATION_TOPIC_CACHE", "1") == "1"
+TOPIC_INDEX_PATH = os.path.join(FINAL_VIDEO_DIR, "topic_index.json")
+SIMILARITY_THRESHOLD = float(os.environ.get("VOICEMATION_TOPIC_SIMILARITY", "0.8"))
+MAX_ENTRIES = int(os.environ.get("VOICEMATION_TOPIC_CACHE_MAX", "500"))
+
+# Words that carry no topic: request phrasing, fillers, articles
+STOPWORDS = {
+    "a", "an", "the", "of", "to", "in", "on", "for", "and", "or", "is", "are", "was", "be",
+    "it", "its", "this", "that", "with", "by", "as", "at", "from", "about", "into",
+    "what", "how", "why", "does", "do", "can", "could", "would", "you", "me", "my", "i",
+    "we", "us", "please", "tell", "show", "explain", "explaining", "explained", "explanation",
+    "describe", "teach", "video", "animation", "animate", "make", "create", "give",
+    "some", "simple", "quick", "short", "basic", "basics", "intro", "introduction",
+    "um", "uh", "like", "so", "okay", "ok", "hey", "works", "work", "working",
+}
+
+_lock = threading.Lock()
+_index_cache = {"mtime": None, "entries": []}
+
+
+# -------------------------
+# Normalization
+# -------------------------
+def _stem(word):
+    # crude plural/possessive folding: "ohms" -> "ohm", "circuits" -> "circuit"
+    if len(word) > 3 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def topic_tokens(text):
+    """Sorted unique topic tokens of a transcript."""
+    words = re.findall(r"[a-z0-9]+", (text or "").lower().replace("'", ""))
+    return sorted({_stem(w) for w in words if w not in STOPWORDS})
+
+
+def jaccard(a, b):
+    a, b = set(a), set(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# -------------------------
+# Index file
+# -------------------------
+@contextmanager
+def _index_lock():
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        with open(TOPIC_INDEX_PATH + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _load_entries():
+    """Index entries, re-read only when the file changed."""
+    try:
+        mtime = os.stat(TOPIC_INDEX_PATH).st_mtime_ns
+    except OSError:
+        return []
+    if _index_cache["mtime"] != mtime:
+        try:
+            with open(TOPIC_INDEX_PATH, encoding="utf-8") as f:
+                _index_cache["entries"] = json.load(f).get("entries", [])
+        except (OSError, ValueError):
+            _index_cache["entries"] = []
+        _index_cache["mtime"] = mtime
+    return _index_cache["entries"]
+
+
+def _save_entries(entries):
+    tmp = TOPIC_INDEX_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"entries": entries}, f)
+    os.replace(tmp, TOPIC_INDEX_PATH)
+
+
+# -------------------------
+# Lookup / store
+# -------------------------
+def lookup(transcript, tier):
+    """
+    Best cached entry for (transcript, tier) at or above the similarity
+    threshold, or None. Updates the entry's hit bookkeeping.
+    """
+    if not TOPIC_CACHE_ENABLED:
+        return None
+    tokens = topic_tokens(transcript)
+    if not tokens:
+        return None
+
+    with _index_lock():
+        entries = _load_entries()
+        best, best_score = None, 0.0
+        for entry in entries:
+            if entry["tier"] != tier:
+                continue
+            score = jaccard(tokens, entry["tokens"])
+            if score > best_score:
+                best, best_score = entry, score
+        if best is None or best_score < SIMILARITY_THRESHOLD:
+            return None
+
+        if not os.path.exists(best["video_path"]):
+            # removed by output retention
+            _save_entries([e for e in entries if e is not best])
+            return None
+
+        best["hits"] = best.get("hits", 0) + 1
+        best["last_hit"] = time.time()
+        _save_entries(entries)
+
+    touch_output(best["video_path"])
+    return dict(best, similarity=round(best_score, 3))
+
+
+def store(transcript, tier, video_path, subtitles, duration):
+    """Index a finished video. Replaces an entry with the same tokens and tier."""
+    if not TOPIC_CACHE_ENABLED:
+        return
+    tokens = topic_tokens(transcript)
+    if not tokens:
+        return
+
+    now = time.time()
+    entry = {
+        "tokens": tokens,
+        "tier": tier,
+        "transcript": transcript,
+        "video_path": video_path,
+        "subtitles": subtitles,
+        "duration": duration,
+        "created": now,
+        "last_hit": now,
+        "hits": 0,
+    }
+    with _index_lock():
+        entries = [
+            e for e in _load_entries()
+            if not (e["tier"] == tier and e["tokens"] == tokens) and os.path.exists(e["video_path"])
+        ]
+        entries.append(entry)
+        if MAX_ENTRIES > 0 and len(entries) > MAX_ENTRIES:
+            entries.sort(key=lambda e: e.get("last_hit", 0))
+            entries = entries[-MAX_ENTRIES:]
+        _save_entries(entries)
@@ -0,0 +1,121 @@
+# vad_utils.py — drop silence from an uploaded recording before speech recognition
+#
+# The recognizer gets the whole clip: leading/trailing silence and every long
+# pause travel to the ASR service and are processed there. An energy-based
+# voice activity detector on the decoded PCM keeps the speech (with a little
+# padding around it), trims leading and trailing silence and shortens pauses
+# longer than VAD_MAX_PAUSE_MS to that length, so words never run together.
+#
+# Frames count as speech when they are VAD_THRESHOLD_DB above the recording's
+# noise floor (its quietest frames) and above an absolute floor, which adapts
+# to both a quiet room and a noisy laptop microphone.
+import array
+import math
+import os
+import sys
+import wave
+from operator import mul
+
+VAD_ENABLED = os.environ.get("VOICEMATION_VAD", "1") == "1"
+FRAME_MS = 30
+VAD_THRESHOLD_DB = float(os.environ.get("VOICEMATION_VAD_THRESHOLD_DB", "12"))
+# quieter than this is never speech, however quiet the noise floor
+ABSOLUTE_FLOOR_DBFS = -55.0
+# speech kept before and after every voiced span
+VAD_PAD_MS = int(os.environ.get("VOICEMATION_VAD_PAD_MS", "200"))
+# silences longer than this (after padding) are shortened to it
+VAD_MAX_PAUSE_MS = int(os.environ.get("VOICEMATION_VAD_MAX_PAUSE_MS", "500"))
+# not worth a rewrite below this share of audio removed
+MIN_SAVING = 0.05
+
+
+def frame_levels(samples, channels, frame_len):
+    """Loudness (dBFS) of consecutive frames of interleaved 16-bit samples."""
+    levels = []
+    step = frame_len * channels
+    for start in range(0, len(samples), step):
+        frame = samples[start:start + step]
+        power = sum(map(mul, frame, frame)) / len(frame)
+        levels.append(10 * math.log10(power / 32768.0 ** 2) if power > 0 else -120.0)
+    return levels
+
+
+def speech_frames(levels, threshold_db=None):
+    """Per-frame speech flags: above the noise floor by threshold_db and above the absolute floor."""
+    threshold_db = VAD_THRESHOLD_DB if threshold_db is None else threshold_db
+    if not levels:
+        return []
+    # the quietest tenth of the recording is taken as its noise floor
+    floor = sorted(levels)[len(levels) // 10]
+    threshold = max(floor + threshold_db, ABSOLUTE_FLOOR_DBFS)
+    return [level > threshold for level in levels]
+
+
+def keep_spans(voiced, pad_frames, max_pause_frames):
+    """
+    [start, end) frame ranges to keep: voiced frames padded by pad_frames,
+    gaps up to max_pause_frames kept whole, longer gaps cut to that length
+    (half after the speech before, half before the speech after).
+    """
+    spans = []
+    n = len(voiced)
+    i = 0
+    while i < n:
+        if not voiced[i]:
+            i += 1
+            continue
+        start = i
+        while i < n and voiced[i]:
+            i += 1
+        start, end = max(start - pad_frames, 0), min(i + pad_frames, n)
+        if spans and start - spans[-1][1] <= max_pause_frames:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            if spans:
+                half = max_pause_frames // 2
+                spans[-1][1] += half
+                start -= max_pause_frames - half
+            spans.append([start, end])
+    return [tuple(span) for span in spans]
+
+
+def trim_silence(wav_path, out_path=None):
+    """
+    Write the voiced parts of a 16-bit PCM wav to out_path (default:
+    <wav>.trimmed.wav). Returns (path to recognize, input seconds, output
+    seconds); the original path when nothing is voiced, the saving is
+    negligible or the file isn't 16-bit PCM.
+    """
+    with wave.open(wav_path, "rb") as src:
+        params = src.getparams()
+        raw = src.readframes(params.nframes)
+    rate, channels = params.framerate, params.nchannels
+    input_seconds = params.nframes / float(rate) if rate else 0.0
+    if params.sampwidth != 2 or not params.nframes:
+        return wav_path, input_seconds, input_seconds
+
+    samples = array.array("h")
+    samples.frombytes(raw)
+    if sys.byteorder == "big":
+        samples.byteswap()
+
+    frame_len = max(int(rate * FRAME_MS / 1000), 1)
+    voiced = speech_frames(frame_levels(samples, channels, frame_len))
+    spans = keep_spans(voiced, VAD_PAD_MS // FRAME_MS, VAD_MAX_PAUSE_MS // FRAME_MS)
+    if not spans:
+        # nothing above the threshold: let the recognizer decide
+        return wav_path, input_seconds, input_seconds
+
+    bytes_per_frame = frame_len * channels * 2
+    kept = b"".join(raw[start * bytes_per_frame:end * bytes_per_frame] for start, end in spans)
+    output_seconds = len(kept) / float(channels * 2 * rate)
+    if output_seconds > input_seconds * (1 - MIN_SAVING):
+        return wav_path, input_seconds, input_seconds
+
+    out_path = out_path or os.path.splitext(wav_path)[0] + ".trimmed.wav"
+    with wave.open(out_path, "wb") as dst:
+        dst.setnchannels(channels)
+        dst.setsampwidth(2)
+        dst.setframerate(rate)
+        dst.writeframes(kept)
+    return out_path, input_seconds, output_seconds
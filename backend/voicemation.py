@@ -1,17 +1,30 @@
 import os 
 import re 
+import json
+import contextvars
 import subprocess
-import speech_recognition as sr
-from azure.ai.inference import ChatCompletionsClient
-from azure.ai.inference.models import SystemMessage, UserMessage
-from azure.core.credentials import AzureKeyCredential
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from voiceover_utils import generate_voiceover, add_voiceover_to_video
 from subtitle_utils import generate_srt_file  # or wherever you saved it
+from scene_batching import build_batched_module, chunk_indices
+from encoder_utils import video_encode_args, frame_rate_args, container_args
+from workspace_utils import FINAL_VIDEO_DIR, create_workspace, remove_workspace
+from delivery_utils import content_addressed_name
+from metrics_utils import span, record_cache, ACTIVE_RENDERS
+from llm_gateway import get_gateway, complete_text
+from prompt_templates import build_generation_prompt, build_outline_prompt, build_scene_prompt, estimate_tokens
+from scene_templates import match_template
+from job_manifest import current_manifest, manifest_for, manifest_context, manifest_key
+from render_queue import render_queue_enabled, submit_render, await_render
+from process_utils import run_process, check_cancelled, JobCancelled
+from job_events import start_plan, scene_finished
+from cost_model import cost_model
+from rendition_utils import renditions_enabled, build_renditions
+from scene_store import scene_record
 
 from dotenv import load_dotenv
 
 # extra imports for syncing / file discovery
-from mutagen.mp3 import MP3
 import uuid
 import time
 
@@ -22,8 +35,21 @@ import re
 # -------------------------
 # Configuration
 # -------------------------
-FINAL_VIDEO_DIR = os.path.join(os.getcwd(), "output_videos")
-os.makedirs(FINAL_VIDEO_DIR, exist_ok=True)
+# FINAL_VIDEO_DIR lives in workspace_utils together with its retention policy.
+# Everything else a job writes goes into its own workspace directory.
+
+# Render all scenes of a job in one manim process (or a few chunked ones)
+BATCH_RENDER = os.environ.get("VOICEMATION_BATCH_RENDER", "0") == "1"
+BATCH_CHUNK_SIZE = int(os.environ.get("VOICEMATION_BATCH_CHUNK_SIZE", "6"))
+
+# Outline-then-fan-out generation for long videos: one short outline call,
+# then one LLM call per scene in parallel, each scene rendered as it arrives.
+FANOUT_MIN_SECONDS = int(os.environ.get("VOICEMATION_FANOUT_MIN_SECONDS", "150"))
+# Scenes of one job rendered/muxed concurrently in fan-out mode
+RENDER_WORKERS = int(os.environ.get("VOICEMATION_RENDER_WORKERS", "2"))
+# manim quality flag: l (480p15), m, h, ...
+RENDER_QUALITY = os.environ.get("VOICEMATION_RENDER_QUALITY", "l")
+
 
 def sanitize_manim_code(manim_code: str) -> str:
     """
@@ -280,99 +306,73 @@ def extract_explanation_and_code(gpt_response):
 # -------------------------
 # GPT request (modified to accept desired_duration, but otherwise same)
 # -------------------------
-# ... (rest of the script remains the same)
+# Calls go through the shared llm_gateway (pooled client, timeouts, retries).
+def set_chat_client(client):
+    """Use `client` for all GPT calls; pass None to go back to the real endpoint."""
+    get_gateway().set_client(client)
 
-def get_gpt_response(speech_text, desired_duration):
-    endpoint = "https://models.github.ai/inference"
-    model = "gpt-4.1"
-    token = os.environ.get("GITHUB_TOKEN", "")
-
-    client = ChatCompletionsClient(
-        endpoint=endpoint,
-        credential=AzureKeyCredential(token),
-    )
+# ... (rest of the script remains the same)
 
-    # --- DYNAMIC INSTRUCTION GENERATION BASED ON DURATION ---
-    duration_minutes = desired_duration / 60
-    
-    # Determine Animation Detail and Scene Count Range (Flexible)
-    if duration_minutes <= 0.5:  # 30 seconds
-        detail = "VERY short and simple"
-        scene_range = "1-2 SCENES"
-        num_scenes_instruction = "aim for 1 to 2 SCENES"
-    elif duration_minutes <= 1.0:  # 1 minute
-        detail = "short and simple"
-        scene_range = "3-5 SCENES" # Adjusted from 3-6
-        num_scenes_instruction = "aim for 3 to 5 SCENES" # Adjusted from 3 to 6
-    elif duration_minutes <= 2.0:  # 2 minutes
-        detail = "NORMAL detail"
-        scene_range = "5-8 SCENES" # Adjusted from 6-9
-        num_scenes_instruction = "aim for 5 to 8 SCENES" # Adjusted from 6 to 9
-    elif duration_minutes <= 3.0:  # 3 minutes
-        detail = "DETAIL and thorough"
-        scene_range = "8-12 SCENES" 
-        num_scenes_instruction = "aim for 8 to 12 SCENES"
-    else:  # 5 minutes (or more)
-        detail = "VERY DETAIL and extensive"
-        scene_range = "12-16 SCENES"
-        num_scenes_instruction = "aim for 12 to 16 SCENES"
-
-    # --- START MODIFIED SYSTEM PROMPT ---
-    system_prompt = (
-        " You are an assistant that converts user speech into Manim animations. "
-        "Always respond ONLY with valid Python Manim code wrapped in triple backticks. "
-        "Do not include explanations, markdown, or text outside the code block."
-        "Important: In Manim Community v0.18, `Brace.get_text()` does not take `font_size`. "
-        "If you need to resize text, use `.scale()` after creating the text."
-        "You are an assistant that generates BOTH:\n"
-        "1. A short natural language explanation of the concept (for voiceover).\n"
-        "2. Valid Manim Community v0.18 Python code (inside triple backticks).\n\n"
-        "⚠️ Important rules:\n"
-        "- Wrap ONLY the code in triple backticks.\n"
-        "- Do NOT wrap the explanation in code blocks.\n"
-        "- Do NOT include markdown or text outside explanation + code.\n\n"
-        
-        # <<< DYNAMIC SCENE GENERATION CONSTRAINT (FINAL FLEXIBLE VERSION) >>>
-        f"### DYNAMIC ANIMATION CONSTRAINT (MANDATORY) ###\n"
-        f"Current Duration: {desired_duration} seconds ({duration_minutes:.1f} minutes).\n"
-        f"Animation Detail Level MUST be: **{detail.upper()}**.\n"
-        f"**FLEXIBLE SCENE COUNT:** Split the content into multiple short, sequential Manim SCENES (Scene subclasses), and **{num_scenes_instruction}**.\n"
-        f"The scene count is a flexible guideline. Prioritize natural flow and pacing that meets the total duration, even if it slightly deviates from the number of scenes suggested.\n"
-        f"####################################################\n"
-        # <<< END DYNAMIC SCENE CONSTRAINT >>>
-
-        "### VISUAL LAYOUT & OVERLAP CONSTRAINT (MANDATORY) ###\n"
-        "You MUST ensure all Mobjects are clearly separated and DO NOT overlap. Use Manim's layout tools extensively:\n"
-        "1. **Positioning:** Use `Mobject.next_to()`, `Mobject.to_edge()`, or `Mobject.move_to()` to prevent crowding.\n"
-        "2. **Grouping & Spacing:** Use `VGroup` (vertical) and `HGroup` (horizontal) and ALWAYS include a `buff` parameter (e.g., `buff=0.7`) in `.arrange()` to add clear space between elements.\n"
-        "3. **Clear Regions:** Design the scene by allocating specific, non-overlapping regions for different visual concepts (Input, Process, Output).\n"
-        "##########################################################\n"
-
-        "STRICT CONSTRAINT: DO NOT use external files. Only use built-in Manim Mobjects (Circle, Square, Text, MathTex, Line, Arrow, VGroup, etc.) and primitives. Do NOT use SVGMobject or ImageMobject with filenames."
-        
-        f"TOTAL_TARGET_SECONDS: {desired_duration}\n"
-        "Based on the target duration, split the explanation into multiple short, sequential Manim SCENES (Scene subclasses), and **{num_scenes_instruction}** to approximate the requested total duration.\n"
-        "For each scene, include only valid Manim code wrapped in triple backticks.\n"
-        "Also include short plain-text explanation paragraphs before each code block for narration (do not place those explanations inside code blocks)."
-    )
-    # --- END MODIFIED SYSTEM PROMPT ---
-    
-    response_object = client.complete(
-        messages=[
-            SystemMessage(system_prompt),
+def _complete_with_prompt(prompt, speech_text, temperature):
+    from azure.ai.inference.models import SystemMessage, UserMessage
+    print(f"📝 Prompt {prompt['version']} ({prompt['tier']}): ~{estimate_tokens(prompt['system'])} tokens, "
+          f"max_tokens={prompt['max_tokens']}")
+    return complete_text(
+        [
+            SystemMessage(prompt["system"]),
             UserMessage(speech_text),
         ],
-        temperature=0.7,
+        temperature=temperature,
         top_p=1.0,
-        model=model
+        max_tokens=prompt["max_tokens"],
+        labels={"prompt": prompt["version"], "tier": prompt["tier"]},
     )
-    
-    # CRITICAL FIX: Extract the text content from the response object
-    if response_object.choices and response_object.choices[0].message:
-        return response_object.choices[0].message.content
-    
-    return ""
-# ... (rest of the script remains the same)
+
+
+def get_gpt_response(speech_text, desired_duration):
+    """All scenes (narration + code) in one completion; prompt from prompt_templates."""
+    return _complete_with_prompt(build_generation_prompt(desired_duration), speech_text, 0.7)
+
+
+# -------------------------
+# Outline-then-fan-out generation (long videos)
+# -------------------------
+def get_scene_outline(speech_text, desired_duration):
+    """
+    Ask for a short JSON outline: [{"title": ..., "beats": ...}, ...].
+    Returns the list of scenes, or None if the answer can't be parsed.
+    """
+    text = _complete_with_prompt(build_outline_prompt(desired_duration), speech_text, 0.4)
+    return parse_scene_outline(text)
+
+
+def parse_scene_outline(text):
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end <= start:
+        return None
+    try:
+        scenes = json.loads(text[start:end + 1]).get("scenes")
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(scenes, list):
+        return None
+    outline = [
+        {"title": str(s.get("title", "")).strip(), "beats": str(s.get("beats", "")).strip()}
+        for s in scenes if isinstance(s, dict)
+    ]
+    return [s for s in outline if s["title"] or s["beats"]] or None
+
+
+def generate_scene_section(speech_text, outline, index, desired_duration):
+    """
+    One LLM call for scene `index` of the outline. Returns
+    {'explanation': ..., 'code': ...} or None when no code came back.
+    """
+    text = _complete_with_prompt(build_scene_prompt(outline, index, desired_duration), speech_text, 0.7)
+    for section in extract_all_sections(text):
+        if section.get("code"):
+            return section
+    return None
 
 
 # Keep old single-block extractor (still used in some places)
@@ -396,10 +396,10 @@ def extract_class_name(manim_code):
 
 
 # Save code to a temp .py file (modified to accept index & unique filename)
-def save_manim_code_to_temp_file(manim_code, index=0):
+def save_manim_code_to_temp_file(manim_code, index=0, work_dir=None):
     unique_suffix = uuid.uuid4().hex[:8]
     filename = f"generated_manim_code_part_{index}_{unique_suffix}.py"
-    temp_file_path = os.path.join(os.getenv("TEMP", "/tmp"), filename)
+    temp_file_path = os.path.join(work_dir or os.getenv("TEMP", "/tmp"), filename)
 
     with open(temp_file_path, "w", encoding="utf-8") as file:
         # 🔥 Automatically add required imports for Manim
@@ -415,6 +415,7 @@ def save_manim_code_to_temp_file(manim_code, index=0):
 def get_audio_duration(audio_path):
     # This uses mutagen.mp3.MP3, which is suitable for MP3 files
     # If generate_voiceover produces other formats (e.g., wav), this may need adjustment.
+    from mutagen.mp3 import MP3
     audio = MP3(audio_path)
     return audio.info.length  # seconds
 
@@ -422,17 +423,24 @@ def get_audio_duration(audio_path):
 # -------------------------
 # NEW: find manim output for a given class name after rendering
 # -------------------------
-def find_manim_output_file(class_name, timeout=10):
+def find_manim_output_file(class_name, timeout=10, module_path=None, media_dir=None):
     """
-    Searches the 'media' directory for a mp4 named <class_name>.mp4.
+    Searches the media directory ('media', or media_dir) for a mp4 named <class_name>.mp4.
+    If module_path is given, only <media>/videos/<module name>/ is searched, so
+    an older render of a same-named scene from another job is never picked up.
     Waits up to `timeout` seconds for the file to appear (useful after subprocess).
     Returns the first matching path or None.
     """
-    media_root = "media"
+    media_root = media_dir or "media"
+    if module_path:
+        module_name = os.path.splitext(os.path.basename(module_path))[0]
+        media_root = os.path.join(media_root, "videos", module_name)
     deadline = time.time() + timeout
     found = None
     while time.time() < deadline:
         for root, dirs, files in os.walk(media_root):
+            if "partial_movie_files" in root:
+                continue
             for f in files:
                 if f == f"{class_name}.mp4":
                     found = os.path.join(root, f)
@@ -441,20 +449,37 @@ def find_manim_output_file(class_name, timeout=10):
     return None
 
 
+def run_manim_process(command, timeout):
+    """
+    Run manim in its own process group, tracked in the active-renders gauge.
+    A timeout or a cancelled job kills manim together with its ffmpeg children.
+    """
+    ACTIVE_RENDERS.inc()
+    try:
+        return run_process(command, timeout=timeout)
+    finally:
+        ACTIVE_RENDERS.dec()
+
+
 # -------------------------
 # Render a single Manim file and return the produced mp4 path
 # -------------------------
-def render_manim_file(temp_file_path, class_name, timeout_per_scene=180):
+def render_manim_file(temp_file_path, class_name, timeout_per_scene=180, media_dir=None, quality=None):
     """
     Runs manim for the given file and returns the output video path (or None).
+    media_dir redirects manim's media tree (e.g. into the job workspace).
     """
-    command = ["manim", "-pql", temp_file_path, class_name]
+    command = ["manim", f"-pq{quality or RENDER_QUALITY}", temp_file_path, class_name]
+    if media_dir:
+        command[1:1] = ["--media_dir", media_dir]
     try:
         print("🎬 Running Manim command:", " ".join(command))
-        subprocess.run(command, capture_output=True, text=True, check=True, timeout=timeout_per_scene)
+        run_manim_process(command, timeout_per_scene)
         print("✅ Manim animation complete for", class_name)
         # attempt to find the output file
-        video_path = find_manim_output_file(class_name, timeout=10)
+        video_path = find_manim_output_file(
+            class_name, timeout=10, module_path=temp_file_path, media_dir=media_dir
+        )
         if video_path:
             print("📁 Found Manim output:", video_path)
             return video_path
@@ -471,20 +496,122 @@ def render_manim_file(temp_file_path, class_name, timeout_per_scene=180):
         return None
 
 
+# -------------------------
+# Render through the shared queue (render_worker.py), or locally
+# -------------------------
+def _read_module(sec):
+    with open(sec['temp_path'], encoding="utf-8") as f:
+        return f.read()
+
+
+def submit_section_render(sec):
+    """Queue the section's render for the render workers; keeps the task id on the section."""
+    sec['render_task'] = submit_render(_read_module(sec), sec['class_name'], RENDER_QUALITY)
+    return sec['render_task']
+
+
+def render_section(sec, media_dir=None):
+    """
+    Raw video of a prepared section. With VOICEMATION_RENDER_QUEUE the render
+    workers make it; when the queue is unreachable or no worker claims the
+    task in time, manim runs here as before.
+    """
+    if render_queue_enabled():
+        try:
+            task_id = sec.get('render_task') or submit_section_render(sec)
+            return await_render(task_id)
+        except Exception as e:
+            print(f"⚠️ Render queue unavailable ({e}); rendering {sec['class_name']} locally.")
+    return render_manim_file(sec['temp_path'], sec['class_name'], media_dir=media_dir)
+
+
+# -------------------------
+# Batched render: several scenes per manim process
+# -------------------------
+def render_manim_batch(sections, chunk_size=None, timeout_per_scene=180, work_dir=None):
+    """
+    Renders the given sections with as few manim processes as possible.
+    Each chunk of scenes is written into one module (shared helpers emitted
+    once) and rendered with a single `manim` call naming every scene class.
+
+    Returns {section index: raw video path}. Scenes that can't be merged, or
+    whose output is missing after the batch run, are rendered on their own.
+    With work_dir, modules and manim's media tree are written inside it.
+    """
+    media_dir = os.path.join(work_dir, "media") if work_dir else None
+    chunk_size = chunk_size or BATCH_CHUNK_SIZE
+    rendered = {}
+    solo = []
+
+    for chunk in chunk_indices(list(range(len(sections))), chunk_size):
+        scenes = [{'code': sections[i]['code'], 'class_name': sections[i]['class_name']} for i in chunk]
+        module_source, class_names, solo_positions = build_batched_module(scenes)
+        solo.extend(chunk[p] for p in solo_positions)
+
+        batched = [(chunk[p], name) for p, name in enumerate(class_names) if name]
+        if not batched:
+            continue
+
+        module_path = os.path.join(
+            work_dir or os.getenv("TEMP", "/tmp"),
+            f"generated_manim_batch_{uuid.uuid4().hex[:8]}.py"
+        )
+        with open(module_path, "w", encoding="utf-8") as f:
+            f.write(module_source)
+
+        command = ["manim", f"-q{RENDER_QUALITY}", module_path] + [name for _, name in batched]
+        if media_dir:
+            command[1:1] = ["--media_dir", media_dir]
+        try:
+            print(f"🎬 Running batched Manim render ({len(batched)} scenes):", " ".join(command))
+            run_manim_process(command, timeout_per_scene * len(batched))
+        except subprocess.CalledProcessError as e:
+            # manim stops at the first failing scene; earlier outputs are still usable
+            print("⚠️ Batched Manim run failed, falling back per scene for missing outputs.")
+            print("Errors:", e.stderr[-2000:] if e.stderr else e.stderr)
+        except subprocess.TimeoutExpired:
+            print("⏱ Batched Manim command timed out.")
+
+        for idx, name in batched:
+            video_path = find_manim_output_file(
+                name, timeout=2, module_path=module_path, media_dir=media_dir
+            )
+            if video_path:
+                rendered[idx] = video_path
+            else:
+                solo.append(idx)
+
+    for idx in sorted(solo):
+        sec = sections[idx]
+        print(f"🎬 Rendering scene {idx + 1} ({sec['class_name']}) on its own")
+        video_path = render_manim_file(
+            sec['temp_path'], sec['class_name'], timeout_per_scene, media_dir=media_dir
+        )
+        if video_path:
+            rendered[idx] = video_path
+
+    return rendered
+
+
 # -------------------------
 # NEW: concatenate multiple videos into one final file (fast concat)
 # -------------------------
-def concatenate_videos(video_paths, output_path):
+def concatenate_videos(video_paths, output_path, encoder_profile=None, work_dir=None):
     """
-    Concatenate videos using ffmpeg concat demuxer. If concat fails, falls back to re-encoding.
+    Concatenate videos using ffmpeg concat demuxer. If concat fails, falls back to re-encoding
+    with the given encoder profile. The result is always written to output_path, since the
+    inputs usually live in a job workspace that is about to be removed. A single input is
+    still remuxed so the container arguments of the profile apply (+faststart puts the
+    moov atom up front, letting playback start before the whole file has downloaded).
     """
     if not video_paths:
         return None
-    if len(video_paths) == 1:
-        # nothing to concatenate
-        return video_paths[0]
+    container = container_args(encoder_profile)
 
-    list_file = os.path.join(os.getenv("TEMP", "/tmp"), f"video_list_{uuid.uuid4().hex[:8]}.txt")
+    list_file = os.path.join(
+        work_dir or os.getenv("TEMP", "/tmp"),
+        f"video_list_{uuid.uuid4().hex[:8]}.txt"
+    )
     with open(list_file, "w", encoding="utf-8") as f:
         for vp in video_paths:
             f.write(f"file '{os.path.abspath(vp)}'\n")
@@ -492,11 +619,11 @@ def concatenate_videos(video_paths, output_path):
     # Try fast concat
     cmd_concat = [
         "ffmpeg", "-y", "-f", "concat", "-safe", "0",
-        "-i", list_file, "-c", "copy", output_path
+        "-i", list_file, "-c", "copy", *container, output_path
     ]
     try:
         print("🔗 Concatenating videos (fast copy) ->", output_path)
-        subprocess.run(cmd_concat, check=True, capture_output=True, text=True)
+        run_process(cmd_concat)
         print("✅ Concatenation successful (copy).")
         return output_path
     except subprocess.CalledProcessError as e:
@@ -504,15 +631,44 @@ def concatenate_videos(video_paths, output_path):
         # Fallback: re-encode (slower but more compatible)
         cmd_reencode = [
             "ffmpeg", "-y", "-f", "concat", "-safe", "0",
-            "-i", list_file, "-c:v", "libx264", "-tune", "animation", "-c:a", "aac", output_path
+            "-i", list_file, *video_encode_args(encoder_profile), *frame_rate_args(), "-c:a", "aac",
+            *container, output_path
         ]
         try:
-            subprocess.run(cmd_reencode, check=True, capture_output=True, text=True)
+            run_process(cmd_reencode)
             print("✅ Concatenation successful (re-encoded).")
             return output_path
         except subprocess.CalledProcessError as e2:
             print("❌ Concatenation failed:", e2)
             return None
+        except JobCancelled:
+            _remove_partial(output_path)
+            raise
+    except JobCancelled:
+        # output_path is outside the workspace; don't leave a truncated file behind
+        _remove_partial(output_path)
+        raise
+
+
+def _remove_partial(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def publish_final_video(path):
+    """
+    Rename a finished video to its content-addressed name (final_<sha256 prefix>.mp4)
+    so the file can be served with immutable cache headers. Identical bytes map to the
+    same file, in which case the new copy is dropped.
+    """
+    target = os.path.join(os.path.dirname(os.path.abspath(path)), content_addressed_name(path))
+    if os.path.exists(target):
+        os.remove(path)
+    else:
+        os.replace(path, target)
+    return target
 
 
 # -------------------------
@@ -523,61 +679,156 @@ def concatenate_videos(video_paths, output_path):
 #    ... (renders all, THEN generates one combined voiceover, THEN merges)
 
 # --- PROPOSED NEW STRUCTURE ---
-def run_manim_for_sections(sections_to_process: list):
+def run_manim_for_sections(sections_to_process: list, batch_render=False, encoder_profile=None,
+                           work_dir=None, source="single"):
     synchronized_videos = []
+    start_plan(len(sections_to_process), source)
+
+    prerendered = None
+    # scenes rendered before an interruption keep their checkpointed clips
+    manifest = current_manifest()
+    pending = [
+        idx for idx, sec in enumerate(sections_to_process)
+        if not sec.get('prerendered_path') and not manifest.scene(idx, sec).get('raw_video_path')
+    ]
+    if render_queue_enabled():
+        # hand every scene to the render workers at once; process_section waits for each in turn
+        for idx in pending:
+            try:
+                submit_section_render(sections_to_process[idx])
+            except Exception as e:
+                print(f"⚠️ Could not queue render of scene {idx + 1}: {e}")
+    elif batch_render and len(pending) > 1:
+        with span("render_batch", scenes=len(pending)):
+            batch = render_manim_batch([sections_to_process[i] for i in pending], work_dir=work_dir)
+        prerendered = {pending[i]: path for i, path in batch.items()}
 
     for idx, sec in enumerate(sections_to_process):
-        temp_path = sec['temp_path']
-        class_name = sec['class_name']
-        explanation = sec['explanation']
+        print(f"\n--- 🎬 Processing Scene {idx + 1} ({sec['class_name']}) ---")
+        video_with_vo = process_section(
+            idx, sec, prerendered=prerendered, encoder_profile=encoder_profile, work_dir=work_dir
+        )
+        if video_with_vo:
+            synchronized_videos.append(video_with_vo)
 
-        print(f"\n--- 🎬 Processing Scene {idx + 1} ({class_name}) ---")
+    return finalize_video(synchronized_videos, encoder_profile=encoder_profile, work_dir=work_dir)
 
-        narration_path = generate_voiceover(explanation)
-        if not os.path.exists(narration_path):
-            print("❌ Voiceover generation failed.")
-            continue
 
-        narration_duration = get_audio_duration(narration_path)
-        print(f"🔊 Narration duration: {narration_duration:.2f}s")
+def process_section(idx, sec, prerendered=None, encoder_profile=None, work_dir=None):
+    """
+    Narration, subtitles, render and mux for one prepared section. Template
+    sections bring 'prerendered_path' / 'narration_path' and skip those stages,
+    and so does every stage the job manifest has a checkpoint for.
+    Stores 'narration_path', 'raw_video_path', 'srt_path' and 'video_path' on the
+    section (what a later revision reuses); returns the muxed video or None.
+    """
+    video = None
+    try:
+        video = _process_section(idx, sec, prerendered, encoder_profile, work_dir)
+        return video
+    finally:
+        # scene event and ETA on the job's event stream; features for the cost model
+        scene_finished(idx + 1, bool(video))
+        cost_model.note_scene(sec, restored=sec.get('restored', False))
+
+
+def _process_section(idx, sec, prerendered, encoder_profile, work_dir):
+    class_name = sec['class_name']
+    explanation = sec['explanation']
+    media_dir = os.path.join(work_dir, "media") if work_dir else None
+
+    check_cancelled()
+    manifest = current_manifest()
+    checkpoint = manifest.scene(idx, sec)
+    if checkpoint.get('video_path'):
+        print(f"♻️ Scene {idx + 1} restored from checkpoint.")
+        sec['restored'] = True
+        sec['narration_path'] = sec.get('narration_path') or checkpoint.get('narration_path')
+        sec['raw_video_path'] = sec.get('prerendered_path') or checkpoint.get('raw_video_path')
+        sec['srt_path'] = checkpoint.get('srt_path')
+        sec['video_path'] = checkpoint['video_path']
+        return sec['video_path']
+
+    # template scenes may come with narration synthesized at deploy time
+    narration_path = sec.get('narration_path') or checkpoint.get('narration_path')
+    if not narration_path:
+        with span("tts", scene=idx + 1):
+            narration_path = generate_voiceover(explanation, out_dir=work_dir)
+    if not narration_path or not os.path.exists(narration_path):
+        print("❌ Voiceover generation failed.")
+        return None
+    manifest.update_scene(idx, sec, narration_path=narration_path)
 
-        try:
-            srt_path = generate_srt_file(explanation, narration_duration, idx)
-        except Exception as e:
-            print("⚠️ Subtitle generation failed:", e)
-            srt_path = None
+    narration_duration = get_audio_duration(narration_path)
+    print(f"🔊 Narration duration: {narration_duration:.2f}s")
 
-        video_path_raw = render_manim_file(temp_path, class_name)
-        if not video_path_raw:
-            print("⚠️ Render failed.")
-            continue
+    try:
+        srt_path = generate_srt_file(explanation, narration_duration, idx, out_dir=work_dir)
+    except Exception as e:
+        print("⚠️ Subtitle generation failed:", e)
+        srt_path = None
+
+    check_cancelled()
+    if sec.get('prerendered_path'):
+        video_path_raw = sec['prerendered_path']
+    elif checkpoint.get('raw_video_path'):
+        video_path_raw = checkpoint['raw_video_path']
+    elif prerendered is not None:
+        video_path_raw = prerendered.get(idx)
+    else:
+        with span("render", scene=idx + 1, class_name=class_name):
+            video_path_raw = render_section(sec, media_dir=media_dir)
+    if not video_path_raw:
+        print("⚠️ Render failed.")
+        return None
+    manifest.update_scene(idx, sec, raw_video_path=video_path_raw)
 
+    check_cancelled()
+    with span("mux", scene=idx + 1):
         video_with_vo = add_voiceover_to_video(
             video_path_raw,
             narration_path,
             narration_duration,
-            subtitle_path=srt_path
+            subtitle_path=srt_path,
+            encoder_profile=encoder_profile,
+            out_dir=work_dir
         )
 
-        if video_with_vo:
-            synchronized_videos.append(video_with_vo)
-            print(f"✅ Scene {idx + 1} synchronized.")
-        else:
-            print("⚠️ Merge failed.")
+    if not video_with_vo:
+        print("⚠️ Merge failed.")
+        return None
+    sec['narration_path'] = narration_path
+    sec['raw_video_path'] = video_path_raw
+    sec['srt_path'] = srt_path
+    sec['video_path'] = video_with_vo
+    manifest.update_scene(idx, sec, srt_path=srt_path, video_path=video_with_vo)
+    print(f"✅ Scene {idx + 1} synchronized.")
+    return video_with_vo
+
 
+def finalize_video(synchronized_videos, encoder_profile=None, work_dir=None):
+    """Concatenate the synchronized scenes in order and publish the result."""
     if not synchronized_videos:
         print("❌ No scenes synchronized.")
         return None
+    check_cancelled()
 
     final_output = os.path.join(
         FINAL_VIDEO_DIR,
         f"final_synced_{uuid.uuid4().hex[:8]}.mp4"
     )
 
-    final_merged = concatenate_videos(synchronized_videos, final_output)
+    with span("concat", scenes=len(synchronized_videos)):
+        final_merged = concatenate_videos(
+            synchronized_videos, final_output, encoder_profile=encoder_profile, work_dir=work_dir
+        )
 
     if final_merged:
-        final_merged = os.path.abspath(final_merged)
+        final_merged = publish_final_video(final_merged)
+        if renditions_enabled():
+            # lower-resolution mp4s + HLS; the job still succeeds without them
+            with span("renditions"):
+                build_renditions(final_merged, encoder_profile=encoder_profile)
         print("🎉 Final video ready at:", final_merged)
         print("📁 Exists:", os.path.exists(final_merged))
         return final_merged
@@ -585,20 +836,148 @@ def run_manim_for_sections(sections_to_process: list):
     print("❌ Final merge failed.")
     return None
 
+
+def revise_scenes(scenes, edits, encoder_profile=None, work_dir=None):
+    """
+    Re-run the edited scenes of a finished job and rebuild its video.
+    scenes: the job's stored scenes in video order (scene_store.load);
+    edits: {0-based index: {"narration": text, "code": manim code}}, either key optional.
+    A new narration is synthesized and muxed onto the scene's existing render;
+    new code is rendered and muxed with the existing narration (or the new one).
+    Every other scene keeps its muxed clip, which the concat step stream-copies.
+    Returns (final video or None, the revised scene list).
+    """
+    start_plan(len(edits), "revision")
+    revised = []
+    for idx, scene in enumerate(scenes):
+        edit = edits.get(idx)
+        if not edit:
+            revised.append(scene)
+            continue
+        check_cancelled()
+        print(f"\n--- ✏️ Revising Scene {idx + 1} ({scene['class_name']}) ---")
+        explanation = edit.get('narration', scene['explanation'])
+        if edit.get('code') is None and scene.get('raw_video_path'):
+            # narration only: the render is reused as a prerendered clip
+            sec = {
+                'class_name': scene['class_name'],
+                'explanation': explanation,
+                'code': scene['code'],
+                'prerendered_path': scene['raw_video_path'],
+            }
+        else:
+            sec = prepare_section(idx + 1, explanation, edit.get('code') or scene['code'], work_dir)
+        if edit.get('narration') is None and scene.get('narration_path'):
+            sec['narration_path'] = scene['narration_path']
+
+        video = process_section(idx, sec, encoder_profile=encoder_profile, work_dir=work_dir)
+        if not video:
+            raise RuntimeError(f"Scene {idx + 1} could not be re-rendered")
+        revised.append(scene_record(sec))
+
+    final_video = finalize_video(
+        [scene['video_path'] for scene in revised], encoder_profile=encoder_profile, work_dir=work_dir
+    )
+    return final_video, revised
+
+
+def _submit_in_context(pool, fn, *args, **kwargs):
+    """Submit to a pool keeping contextvars (job id for spans) of the caller."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def run_fanout_for_outline(speech_text, outline, desired_duration, encoder_profile=None, work_dir=None):
+    """
+    Generate every scene of the outline in parallel (the LLM gateway caps in-flight
+    calls) and hand each one to the render pool as soon as its code arrives.
+    Returns the prepared sections, in outline order, that made it into the video
+    together with the final video path.
+    """
+    prepared = {}
+    render_futures = {}
+    start_plan(len(outline), "fanout")
+    gen_pool = ThreadPoolExecutor(max_workers=len(outline), thread_name_prefix="scene-llm")
+    render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="scene-render")
+    cancelled = False
+    try:
+        manifest = current_manifest()
+
+        def generate(index):
+            section = manifest.stage_item("generated", index)
+            if section:
+                return section
+            check_cancelled()
+            with span("llm_scene", scene=index + 1):
+                section = generate_scene_section(speech_text, outline, index, desired_duration)
+            if section:
+                manifest.add_stage_item("generated", index, section)
+            return section
+
+        gen_futures = {_submit_in_context(gen_pool, generate, i): i for i in range(len(outline))}
+        for future in as_completed(gen_futures):
+            index = gen_futures[future]
+            try:
+                section = future.result()
+            except Exception as e:
+                print(f"⚠️ Scene {index + 1} generation failed:", e)
+                scene_finished(index + 1, False)
+                continue
+            if not section:
+                print(f"⚠️ Scene {index + 1}: no Manim code returned.")
+                scene_finished(index + 1, False)
+                continue
+            check_cancelled()
+
+            sec = prepare_section(index + 1, section.get('explanation', ''), section['code'], work_dir)
+            prepared[index] = sec
+            print(f"📨 Scene {index + 1}/{len(outline)} generated, rendering ({sec['class_name']}).")
+            render_futures[index] = _submit_in_context(
+                render_pool, process_section, index, sec,
+                encoder_profile=encoder_profile, work_dir=work_dir,
+            )
+
+        synchronized_videos = []
+        done_sections = []
+        for index in sorted(render_futures):
+            try:
+                video = render_futures[index].result()
+            except Exception as e:
+                print(f"⚠️ Scene {index + 1} render failed:", e)
+                continue
+            if video:
+                synchronized_videos.append(video)
+                done_sections.append(prepared[index])
+    except JobCancelled:
+        cancelled = True
+        raise
+    finally:
+        # a cancelled job doesn't wait for LLM calls in flight; queued scenes are dropped
+        # and running renders stop with their manim process group
+        for pool in (gen_pool, render_pool):
+            pool.shutdown(wait=not cancelled, cancel_futures=cancelled)
+
+    return finalize_video(synchronized_videos, encoder_profile=encoder_profile, work_dir=work_dir), done_sections
+
+
 # -------------------------
 # Process speech (modified to produce multiple segments)
 # -------------------------
 # --- MODIFIED process_speech FUNCTION ---
-# voicemation.py
-from mutagen.mp3 import MP3
-
-def process_speech(speech_text, return_srt=False, manual_duration=None):
+def process_speech(speech_text, return_srt=False, manual_duration=None, batch_render=None,
+                   encoder_profile=None, workspace=None, fanout=None):
     """
     Process speech to generate animation.
 
     :param speech_text: Text to generate animation for
     :param return_srt: Boolean to also return SRT files
     :param manual_duration: Optional duration in seconds, overrides AI
+    :param batch_render: Render all scenes in one manim run (defaults to VOICEMATION_BATCH_RENDER)
+    :param encoder_profile: Encoder profile name (fast/balanced/archival), defaults to VOICEMATION_ENCODER_PROFILE
+    :param fanout: Outline first, then generate and render scenes in parallel
+        (defaults to on for durations of at least VOICEMATION_FANOUT_MIN_SECONDS)
+    :param workspace: Job workspace for intermediate files. The caller owns it and removes it
+        once done (e.g. after reading the SRT files). Without one, a workspace is created here
+        and removed before returning, unless return_srt needs its SRT files; the janitor sweeps those.
     """
     if "exit" in speech_text.lower():
         print("Exiting program...")
@@ -612,49 +991,128 @@ def process_speech(speech_text, return_srt=False, manual_duration=None):
         desired_duration = estimate_duration_auto(speech_text)
         print(f"🧠 AI auto-estimated duration: ~{desired_duration}s")
 
-    gpt_response = get_gpt_response(speech_text, desired_duration)
-    sections = extract_all_sections(gpt_response)
-
-    sections_to_process = []
-    srt_files = []
-
-    for idx, sec in enumerate(sections, start=1):
-        explanation = sec.get('explanation', '') or ''
-        code = sec.get('code')
-
-        if code:
-            code_clean = sanitize_manim_code(code)
-            temp_path = save_manim_code_to_temp_file(code_clean, index=idx)
-            class_name = extract_class_name(code_clean)
-
-            sections_to_process.append({
-                'temp_path': temp_path,
-                'class_name': class_name,
-                'explanation': explanation
-            })
-
-            if return_srt:
-                voiceover_path = generate_voiceover(explanation)
-                audio = MP3(voiceover_path)
-                audio_duration = audio.info.length
-                srt_path = generate_srt_file(explanation, audio_duration, idx)
-                srt_files.append(srt_path)
-
-        elif explanation.strip():
-            print(f"⚠️ Skipping pure explanation block (Section {idx}) as it contains no Manim code.")
-            if return_srt:
-                voiceover_path = generate_voiceover(explanation)
-                audio = MP3(voiceover_path)
-                audio_duration = audio.info.length
-                srt_path = generate_srt_file(explanation, audio_duration, idx)
-                srt_files.append(srt_path)
-
-    if not sections_to_process:
-        print("❌ No valid Manim code generated in any section.")
-        return (None, None) if return_srt else None
+    owns_workspace = workspace is None
+    if owns_workspace:
+        workspace = create_workspace()
+    try:
+        if fanout is None:
+            fanout = FANOUT_MIN_SECONDS > 0 and desired_duration >= FANOUT_MIN_SECONDS
+        # checkpoints in the workspace: a re-run after a crash resumes where this one stopped
+        manifest = manifest_for(workspace)
+        manifest.bind(manifest_key(speech_text, desired_duration))
+        with manifest_context(manifest):
+            return _process_speech_in_workspace(
+                speech_text, desired_duration, return_srt, batch_render, encoder_profile, workspace, fanout
+            )
+    finally:
+        if owns_workspace and not return_srt:
+            remove_workspace(workspace)
+
+
+def prepare_section(index, explanation, code, work_dir):
+    """Sanitize a scene's code and write it to its own module in the workspace."""
+    with span("sanitize", scene=index):
+        code_clean = sanitize_manim_code(code)
+        temp_path = save_manim_code_to_temp_file(code_clean, index=index, work_dir=work_dir)
+        class_name = extract_class_name(code_clean)
+    return {
+        'temp_path': temp_path,
+        'class_name': class_name,
+        'explanation': explanation or '',
+        'code': code_clean
+    }
 
-    final_video = run_manim_for_sections(sections_to_process)
 
+def _process_speech_in_workspace(speech_text, desired_duration, return_srt, batch_render,
+                                 encoder_profile, workspace, fanout=False):
+    final_video = None
+    sections_to_process = None
+
+    manifest = current_manifest()
+    final = manifest.stage("final")
+    if final and os.path.exists(final["video_path"]):
+        print("♻️ Final video of this job was already published:", final["video_path"])
+        srt_files = [p for p in final["srt_files"] if os.path.exists(p)]
+        return (final["video_path"], srt_files) if return_srt else final["video_path"]
+
+    check_cancelled()
+    # hand-checked scene pack for a common topic: no LLM, usually no render
+    template = match_template(speech_text, desired_duration)
+    record_cache("template", template is not None)
+    if template:
+        print(f"📦 Using scene template '{template['id']}' (coverage {template['coverage']}).")
+        with span("template", pack=template["id"], scenes=len(template["scenes"])):
+            sections_to_process = []
+            for idx, scene in enumerate(template["scenes"], start=1):
+                temp_path = save_manim_code_to_temp_file(scene["code"], index=idx, work_dir=workspace)
+                sections_to_process.append({
+                    'temp_path': temp_path,
+                    'class_name': extract_class_name(scene["code"]),
+                    'explanation': scene["explanation"],
+                    'code': scene["code"],
+                    'prerendered_path': scene["video_path"],
+                    'narration_path': scene["narration_path"],
+                })
+        final_video = run_manim_for_sections(
+            sections_to_process, encoder_profile=encoder_profile, work_dir=workspace, source="template",
+        )
+    elif fanout:
+        outline = (manifest.stage("outline") or {}).get("scenes")
+        if not outline:
+            with span("llm_outline", desired_duration=desired_duration):
+                outline = get_scene_outline(speech_text, desired_duration)
+            if outline:
+                manifest.complete_stage("outline", scenes=outline)
+        if outline:
+            print(f"🗂 Outline with {len(outline)} scenes, generating them in parallel.")
+            final_video, sections_to_process = run_fanout_for_outline(
+                speech_text, outline, desired_duration,
+                encoder_profile=encoder_profile, work_dir=workspace,
+            )
+        else:
+            print("⚠️ Outline unusable, falling back to a single completion.")
+
+    if sections_to_process is None:
+        llm = manifest.stage("llm")
+        if llm:
+            gpt_response = llm["response"]
+        else:
+            with span("llm", desired_duration=desired_duration):
+                gpt_response = get_gpt_response(speech_text, desired_duration)
+            manifest.complete_stage("llm", response=gpt_response)
+        sections = extract_all_sections(gpt_response)
+
+        sections_to_process = []
+        for idx, sec in enumerate(sections, start=1):
+            explanation = sec.get('explanation', '') or ''
+            code = sec.get('code')
+            if code:
+                sections_to_process.append(prepare_section(idx, explanation, code, workspace))
+            elif explanation.strip():
+                print(f"⚠️ Skipping pure explanation block (Section {idx}) as it contains no Manim code.")
+
+        if not sections_to_process:
+            print("❌ No valid Manim code generated in any section.")
+            return (None, None) if return_srt else None
+
+        if batch_render is None:
+            batch_render = BATCH_RENDER
+        final_video = run_manim_for_sections(
+            sections_to_process,
+            batch_render=batch_render,
+            encoder_profile=encoder_profile,
+            work_dir=workspace,
+        )
+
+    # subtitles of the scenes that made it into the video, narrated once during rendering
+    srt_files = [
+        sec['srt_path'] for sec in sections_to_process
+        if sec.get('video_path') and sec.get('srt_path')
+    ]
+    if final_video:
+        # the scenes in the video, for revisions (scene_store)
+        scenes = [scene_record(sec) for sec in sections_to_process if sec.get('video_path')]
+        manifest.complete_stage("final", video_path=final_video, srt_files=srt_files, scenes=scenes)
     if return_srt:
         return final_video, srt_files
     return final_video
@@ -664,6 +1122,8 @@ def process_speech(speech_text, return_srt=False, manual_duration=None):
 # Main speech recognition loop (kept with small improvement to use listen)
 # -------------------------
 if __name__ == "__main__":
+    import speech_recognition as sr
+
     recognizer = sr.Recognizer()
 
     while True:
@@ -2,8 +2,9 @@
 import os
 import subprocess
 import tempfile
-from gtts import gTTS
 import uuid
+from encoder_utils import video_encode_args, container_args, hold_filter, frame_rate_args
+from process_utils import run_process
 
 # --- Synchronization Utility: Audio Duration ---
 
@@ -41,17 +42,18 @@ def get_audio_duration(audio_path):
 
 # --- Voiceover Generation ---
 
-def generate_voiceover(text):
+def generate_voiceover(text, out_dir=None):
     """
     Convert input text to speech using gTTS and save as MP3.
-    Uses a unique temporary filename.
+    Uses a unique filename in out_dir (the job workspace) or the temp dir.
     """
     # Use a secure temp path
-    temp_dir = tempfile.gettempdir()
+    temp_dir = out_dir or tempfile.gettempdir()
     # Use a unique filename is essential for concurrent processing
     temp_audio_path = os.path.join(temp_dir, f"voiceover_{uuid.uuid4().hex[:8]}.mp3")
 
     try:
+        from gtts import gTTS  # imported on first use: keeps app start-up light
         tts = gTTS(text)
         tts.save(temp_audio_path)
         print(f"🔊 Voiceover saved to: {temp_audio_path}")
@@ -63,27 +65,31 @@ def generate_voiceover(text):
 
 # --- Video/Audio Merging (SUBTITLE LOGIC REMOVED) ---
 
-def add_voiceover_to_video(video_path, audio_path, audio_duration_seconds, subtitle_path=None):
+def add_voiceover_to_video(video_path, audio_path, audio_duration_seconds, subtitle_path=None,
+                           encoder_profile=None, out_dir=None, vfr=None):
     """
     Merges video and audio using ffmpeg.
     The subtitle_path parameter is now ignored, as subtitles are handled by the frontend.
+    encoder_profile selects preset/CRF/keyframes/threads (see encoder_utils).
+    vfr (default VOICEMATION_VFR) drops held frames and holds the last frame
+    instead of looping the scene when the narration is longer.
     """
     if not os.path.exists(video_path):
         print(f"❌ Video not found at: {video_path}")
         return None
 
     # Generate a unique path for the synchronized output
-    temp_dir = tempfile.gettempdir()
+    temp_dir = out_dir or tempfile.gettempdir()
     unique_filename = f"synced_video_{uuid.uuid4().hex[:8]}.mp4"
     output_path = os.path.join(temp_dir, unique_filename)
 
     # 🟢 Base FFmpeg Command (Synchronization) 🟢
+    vfr_chain = hold_filter(audio_duration_seconds, vfr)
     command = [
         "ffmpeg",
         "-y",
-        "-stream_loop",
-        "-1",
-        # Input 0: Video (looped)
+        # Input 0: Video (looped, unless VFR mode holds its last frame)
+        *([] if vfr_chain else ["-stream_loop", "-1"]),
         "-i",
         video_path,
         # Input 1: Audio 
@@ -98,12 +104,12 @@ def add_voiceover_to_video(video_path, audio_path, audio_duration_seconds, subti
         # Use audio stream from second input (1)
         "-map",
         "1:a:0",
-        "-c:v",
-        "libx264",
-        "-tune",
-        "animation",
+        *(["-vf", vfr_chain] if vfr_chain else []),
+        *video_encode_args(encoder_profile),
+        *frame_rate_args(vfr),
         "-c:a",
         "aac",
+        *container_args(encoder_profile),
     ]
     
     # 🚫 Note: The FFmpeg command now contains NO subtitle filter.
@@ -114,7 +120,8 @@ def add_voiceover_to_video(video_path, audio_path, audio_duration_seconds, subti
     # --- EXECUTION ---
     try:
         print("🎞️ Merging video and voiceover using ffmpeg...")
-        subprocess.run(command, check=True, capture_output=True, text=True)
+        # own process group: killed with its children if the job is cancelled
+        run_process(command)
         print(f"✅ Final synchronized video saved at: {output_path}")
         return output_path
 
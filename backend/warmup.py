@@ -0,0 +1,135 @@
+# warmup.py — pay cold-start costs before the first request does
+#
+# Heavy dependencies (speech_recognition, the azure SDK, gTTS, mutagen) are
+# imported where they are used, so the apps start fast and /health answers at
+# once. With VOICEMATION_WARMUP set they are loaded ahead of time instead:
+#
+#   VOICEMATION_WARMUP=1        import them, build the LLM client, pre-load manim
+#   VOICEMATION_WARMUP=render   also render a tiny probe scene (fills manim's and
+#                               ffmpeg's caches and checks the render toolchain)
+#
+# Under gunicorn, gunicorn.conf.py runs the import and manim steps once in the
+# master before forking (workers inherit the loaded modules) and the client
+# step in every worker after the fork. Single-process servers run everything
+# in a background thread at startup (start_background_warmup).
+import importlib
+import os
+import subprocess
+import threading
+import time
+
+from metrics_utils import WARMUP_SECONDS
+
+WARMUP_MODE = os.environ.get("VOICEMATION_WARMUP", "0")
+
+# steps already done in this process (or inherited from the gunicorn master)
+_done = set()
+
+# imported lazily by the pipeline; order roughly by cost
+HEAVY_DEPENDENCIES = [
+    "azure.ai.inference",
+    "azure.core.pipeline.transport",
+    "requests",
+    "speech_recognition",
+    "gtts",
+    "mutagen.mp3",
+]
+HEAVY_MODULES = ["voicemation"] + HEAVY_DEPENDENCIES
+
+PROBE_SCENE = '''class WarmupProbe(Scene):
+    def construct(self):
+        self.add(Text("warm-up").scale(0.5))
+        self.wait(0.1)
+'''
+
+
+def _timed(step, fn, *args):
+    t0 = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        elapsed = time.perf_counter() - t0
+        WARMUP_SECONDS.set(round(elapsed, 3), step=step)
+        print(f"🔥 warm-up {step}: {elapsed:.2f}s")
+
+
+def warm_imports():
+    """Import the heavy modules now. Returns the ones that failed."""
+    failed = []
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"⚠️ warm-up could not import {name}: {e}")
+            failed.append(name)
+    return failed
+
+
+def prime_manim(timeout=120):
+    """
+    Start manim once so its (large) import is compiled and in the page cache
+    before the first render subprocess needs it.
+    """
+    try:
+        subprocess.run(["manim", "--version"], capture_output=True, timeout=timeout, check=True)
+        return True
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"⚠️ manim warm-up failed: {e}")
+        return False
+
+
+def render_probe():
+    """Render a one-frame scene end to end in a throwaway workspace."""
+    import voicemation
+    from workspace_utils import job_workspace
+
+    with job_workspace("warmup_probe") as work_dir:
+        path = voicemation.save_manim_code_to_temp_file(PROBE_SCENE, work_dir=work_dir)
+        return voicemation.render_manim_file(
+            path, "WarmupProbe", timeout_per_scene=120, media_dir=os.path.join(work_dir, "media")
+        ) is not None
+
+
+def warm_clients():
+    """Build the LLM client and open its first pooled connection. Post-fork only."""
+    from llm_gateway import get_gateway
+
+    get_gateway().warm(connect=True)
+
+
+def warm_before_fork(mode=None):
+    """The process-independent steps: imports and manim."""
+    mode = mode or WARMUP_MODE
+    if mode == "0" or "before_fork" in _done:
+        return
+    _done.add("before_fork")
+    _timed("imports", warm_imports)
+    _timed("manim", prime_manim)
+    if mode == "render":
+        _timed("render_probe", render_probe)
+
+
+def warm_after_fork(mode=None):
+    """Per-process steps: clients and their connections."""
+    if (mode or WARMUP_MODE) == "0" or "after_fork" in _done:
+        return
+    _done.add("after_fork")
+    _timed("clients", warm_clients)
+
+
+def warm_up(mode=None):
+    """Everything, in this process."""
+    warm_before_fork(mode)
+    warm_after_fork(mode)
+
+
+def start_background_warmup():
+    """
+    Run the steps not done yet (all of them outside gunicorn) in a daemon
+    thread, so the server starts accepting requests at once.
+    """
+    if WARMUP_MODE == "0" or {"before_fork", "after_fork"} <= _done:
+        return None
+    thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,355 @@
+# workspace_utils.py — per-job scratch directories and output retention
+import fnmatch
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from metrics_utils import register_collector
+
+# -------------------------
+# Configuration
+# -------------------------
+FINAL_VIDEO_DIR = os.path.join(os.getcwd(), "output_videos")
+WORKSPACE_ROOT = os.environ.get(
+    "VOICEMATION_WORKSPACE_ROOT",
+    os.path.join(tempfile.gettempdir(), "voicemation_jobs"),
+)
+
+# Final outputs: removed when unused for longer than MAX_AGE, and least recently
+# used first once the directory grows beyond MAX_BYTES.
+OUTPUT_MAX_AGE_SECONDS = int(os.environ.get("VOICEMATION_OUTPUT_MAX_AGE", str(24 * 3600)))
+OUTPUT_MAX_TOTAL_BYTES = int(os.environ.get("VOICEMATION_OUTPUT_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Lower-resolution renditions / HLS of a final video (rendition_utils), one
+# directory per final_<hash>; retained and removed together with that video
+RENDITION_DIR = os.path.join(FINAL_VIDEO_DIR, "renditions")
+
+# Scenes of finished jobs (scene_store): what a revision re-runs and re-concatenates.
+# Removed when not revised for longer than MAX_AGE, and least recently used
+# first once all stores together grow beyond MAX_BYTES (a budget of their own,
+# next to the final outputs').
+SCENE_STORE_DIR = os.path.join(FINAL_VIDEO_DIR, "scenes")
+SCENE_STORE_MAX_AGE_SECONDS = int(os.environ.get("VOICEMATION_SCENE_STORE_MAX_AGE", str(24 * 3600)))
+SCENE_STORE_MAX_TOTAL_BYTES = int(os.environ.get("VOICEMATION_SCENE_STORE_MAX_BYTES", str(1024 ** 3)))
+
+# Job status records (JSON, one per job) shared by all worker processes
+JOB_RECORD_DIR = os.path.join(FINAL_VIDEO_DIR, "jobs")
+JOB_RECORD_MAX_AGE_SECONDS = int(os.environ.get("VOICEMATION_JOB_RECORD_MAX_AGE", str(24 * 3600)))
+
+# Workspaces of finished jobs are removed right away; anything left behind
+# (crashed process, caller that kept the workspace) is swept after this long.
+WORKSPACE_MAX_AGE_SECONDS = int(os.environ.get("VOICEMATION_WORKSPACE_MAX_AGE", str(6 * 3600)))
+JANITOR_INTERVAL_SECONDS = int(os.environ.get("VOICEMATION_JANITOR_INTERVAL", "600"))
+
+# Loose temp files written by older versions of the pipeline
+LEGACY_TEMP_PATTERNS = [
+    "generated_manim_code_part_*.py",
+    "generated_manim_batch_*.py",
+    "voiceover_*.mp3",
+    "scene_*_subs_*.srt",
+    "synced_video_*.mp4",
+    "video_list_*.txt",
+]
+
+os.makedirs(FINAL_VIDEO_DIR, exist_ok=True)
+os.makedirs(JOB_RECORD_DIR, exist_ok=True)
+
+
+# -------------------------
+# Job workspaces
+# -------------------------
+def create_workspace(job_id=None):
+    """Create and return a fresh directory for all intermediate files of one job."""
+    name = job_id or uuid.uuid4().hex
+    path = os.path.join(WORKSPACE_ROOT, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def remove_workspace(path):
+    """Delete a job workspace and everything in it. Returns bytes reclaimed."""
+    if not path or not os.path.isdir(path):
+        return 0
+    reclaimed = _dir_size(path)
+    shutil.rmtree(path, ignore_errors=True)
+    _record_reclaimed(1, reclaimed, "workspaces")
+    return reclaimed
+
+
+@contextmanager
+def job_workspace(job_id=None):
+    """Context manager: a workspace that is removed when the block exits."""
+    path = create_workspace(job_id)
+    try:
+        yield path
+    finally:
+        remove_workspace(path)
+
+
+def _dir_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+# -------------------------
+# Output retention
+# -------------------------
+def touch_output(path):
+    """Mark a final output as recently used (LRU bookkeeping via mtime)."""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def rendition_dir(video_path):
+    """Directory holding the renditions of a (content-addressed) final video."""
+    return os.path.join(RENDITION_DIR, os.path.splitext(os.path.basename(video_path))[0])
+
+
+def _rendition_size(video_path):
+    path = rendition_dir(video_path)
+    return _dir_size(path) if os.path.isdir(path) else 0
+
+
+def enforce_output_retention(output_dir=FINAL_VIDEO_DIR, max_age=None, max_bytes=None):
+    """
+    Apply the retention policy to final outputs.
+    Returns (files_removed, bytes_reclaimed).
+    """
+    max_age = OUTPUT_MAX_AGE_SECONDS if max_age is None else max_age
+    max_bytes = OUTPUT_MAX_TOTAL_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(output_dir):
+        return 0, 0
+
+    entries = []
+    for name in os.listdir(output_dir):
+        path = os.path.join(output_dir, name)
+        if not name.endswith(".mp4") or not os.path.isfile(path):
+            continue
+        st = os.stat(path)
+        entries.append((st.st_mtime, st.st_size + _rendition_size(path), path))
+    entries.sort()  # least recently used first
+
+    now = time.time()
+    removed = reclaimed = 0
+    total = sum(size for _, size, _ in entries)
+
+    for mtime, size, path in entries:
+        too_old = max_age > 0 and now - mtime > max_age
+        too_big = max_bytes > 0 and total > max_bytes
+        if not (too_old or too_big):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        shutil.rmtree(rendition_dir(path), ignore_errors=True)
+        removed += 1
+        reclaimed += size
+        total -= size
+
+    _record_reclaimed(removed, reclaimed, "outputs")
+    return removed, reclaimed
+
+
+def sweep_stale_workspaces(max_age=None):
+    """Remove leftover workspaces and legacy temp files older than max_age."""
+    max_age = WORKSPACE_MAX_AGE_SECONDS if max_age is None else max_age
+    now = time.time()
+    removed = reclaimed = 0
+
+    if os.path.isdir(WORKSPACE_ROOT):
+        for name in os.listdir(WORKSPACE_ROOT):
+            path = os.path.join(WORKSPACE_ROOT, name)
+            try:
+                if os.path.isdir(path) and now - os.path.getmtime(path) > max_age:
+                    reclaimed += remove_workspace(path)
+                    removed += 1
+            except OSError:
+                pass
+
+    temp_dir = tempfile.gettempdir()
+    legacy_removed = legacy_bytes = 0
+    for name in os.listdir(temp_dir):
+        if not any(fnmatch.fnmatch(name, pat) for pat in LEGACY_TEMP_PATTERNS):
+            continue
+        path = os.path.join(temp_dir, name)
+        try:
+            if os.path.isfile(path) and now - os.path.getmtime(path) > max_age:
+                size = os.path.getsize(path)
+                os.remove(path)
+                legacy_removed += 1
+                legacy_bytes += size
+        except OSError:
+            pass
+    _record_reclaimed(legacy_removed, legacy_bytes, "temp_files")
+
+    return removed + legacy_removed, reclaimed + legacy_bytes
+
+
+def prune_job_records(max_age=None):
+    """Remove job status records (and other bookkeeping below JOB_RECORD_DIR) older than max_age."""
+    max_age = JOB_RECORD_MAX_AGE_SECONDS if max_age is None else max_age
+    if max_age <= 0 or not os.path.isdir(JOB_RECORD_DIR):
+        return 0, 0
+    now = time.time()
+    removed = reclaimed = 0
+    for root, dirs, files in os.walk(JOB_RECORD_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    removed += 1
+                    reclaimed += size
+            except OSError:
+                pass
+    _record_reclaimed(removed, reclaimed, "job_records")
+    return removed, reclaimed
+
+
+def prune_scene_stores(max_age=None, max_bytes=None):
+    """
+    Remove the stored scenes of jobs not revised (or finished) for longer than
+    max_age, then the least recently used ones while the stores exceed max_bytes.
+    Returns (stores_removed, bytes_reclaimed).
+    """
+    max_age = SCENE_STORE_MAX_AGE_SECONDS if max_age is None else max_age
+    max_bytes = SCENE_STORE_MAX_TOTAL_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(SCENE_STORE_DIR):
+        return 0, 0
+
+    entries = []
+    for name in os.listdir(SCENE_STORE_DIR):
+        path = os.path.join(SCENE_STORE_DIR, name)
+        try:
+            if os.path.isdir(path):
+                entries.append((os.path.getmtime(path), _dir_size(path), path))
+        except OSError:
+            pass
+    entries.sort()  # least recently used first
+
+    now = time.time()
+    removed = reclaimed = 0
+    total = sum(size for _, size, _ in entries)
+
+    for mtime, size, path in entries:
+        too_old = max_age > 0 and now - mtime > max_age
+        # a store still being written (scene_store.save) is only removed once stale
+        too_big = max_bytes > 0 and total > max_bytes and ".tmp-" not in os.path.basename(path)
+        if not (too_old or too_big):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+        reclaimed += size
+        total -= size
+
+    _record_reclaimed(removed, reclaimed, "scene_stores")
+    return removed, reclaimed
+
+
+# -------------------------
+# Background janitor
+# -------------------------
+janitor_stats = {
+    "runs": 0,
+    "last_run": None,
+    "files_removed": {"workspaces": 0, "outputs": 0, "temp_files": 0, "job_records": 0, "scene_stores": 0},
+    "bytes_reclaimed": {"workspaces": 0, "outputs": 0, "temp_files": 0, "job_records": 0, "scene_stores": 0},
+}
+_stats_lock = threading.Lock()
+_janitor_thread = None
+
+
+def _record_reclaimed(count, nbytes, kind):
+    if not count:
+        return
+    with _stats_lock:
+        janitor_stats["files_removed"][kind] += count
+        janitor_stats["bytes_reclaimed"][kind] += nbytes
+
+
+def get_janitor_stats():
+    with _stats_lock:
+        stats = {
+            "runs": janitor_stats["runs"],
+            "last_run": janitor_stats["last_run"],
+            "files_removed": dict(janitor_stats["files_removed"]),
+            "bytes_reclaimed": dict(janitor_stats["bytes_reclaimed"]),
+        }
+    stats["output_bytes"] = _dir_size(FINAL_VIDEO_DIR) if os.path.isdir(FINAL_VIDEO_DIR) else 0
+    return stats
+
+
+def run_janitor_once():
+    sweep_stale_workspaces()
+    enforce_output_retention()
+    prune_job_records()
+    prune_scene_stores()
+    with _stats_lock:
+        janitor_stats["runs"] += 1
+        janitor_stats["last_run"] = time.time()
+
+
+def start_janitor(interval=None):
+    """
+    Start the background cleanup thread (once per process).
+    Set VOICEMATION_JANITOR=0 to disable it.
+    """
+    global _janitor_thread
+    if os.environ.get("VOICEMATION_JANITOR", "1") == "0":
+        return None
+    if _janitor_thread and _janitor_thread.is_alive():
+        return _janitor_thread
+
+    interval = interval or JANITOR_INTERVAL_SECONDS
+
+    def loop():
+        while True:
+            try:
+                run_janitor_once()
+            except Exception as e:
+                print("⚠️ Janitor run failed:", e)
+            time.sleep(interval)
+
+    _janitor_thread = threading.Thread(target=loop, name="voicemation-janitor", daemon=True)
+    _janitor_thread.start()
+    return _janitor_thread
+
+
+@register_collector
+def _janitor_metrics():
+    stats = get_janitor_stats()
+    lines = [
+        "# HELP voicemation_janitor_runs_total Janitor sweeps completed",
+        "# TYPE voicemation_janitor_runs_total counter",
+        f"voicemation_janitor_runs_total {stats['runs']}",
+        "# HELP voicemation_reclaimed_bytes_total Bytes removed by workspace cleanup and retention",
+        "# TYPE voicemation_reclaimed_bytes_total counter",
+    ]
+    for kind, value in sorted(stats["bytes_reclaimed"].items()):
+        lines.append(f'voicemation_reclaimed_bytes_total{{kind="{kind}"}} {value}')
+    lines += [
+        "# HELP voicemation_reclaimed_files_total Files or workspaces removed",
+        "# TYPE voicemation_reclaimed_files_total counter",
+    ]
+    for kind, value in sorted(stats["files_removed"].items()):
+        lines.append(f'voicemation_reclaimed_files_total{{kind="{kind}"}} {value}')
+    lines += [
+        "# HELP voicemation_output_bytes Bytes currently held by final outputs",
+        "# TYPE voicemation_output_bytes gauge",
+        f"voicemation_output_bytes {stats['output_bytes']}",
+    ]
+    return lines
@@ -36,6 +36,85 @@ interface HistoryItem {
   title: string
 }
 
+const POLL_INTERVAL_MS = 2000
+
+// Finished job -> the job (done) or { error }; null while it is still running
+function jobOutcome(job: any) {
+  if (job.status === "done") {
+    return job
+  }
+  if (job.status === "error" || job.status === "unknown" || job.status === "cancelled") {
+    return { error: job.error || (job.status === "cancelled" ? "Job cancelled" : "Job failed") }
+  }
+  return null
+}
+
+// Progress pushed over /events/<job_id> (server-sent events); resolves with the
+// result event, or null if the stream can't be used (then the caller polls)
+function streamJob(apiBase: string, jobId: string, onStatus: (status: string) => void): Promise<any | null> {
+  return new Promise((resolve) => {
+    if (typeof EventSource === "undefined") {
+      resolve(null)
+      return
+    }
+    const source = new EventSource(`${apiBase}/events/${jobId}`)
+    let errors = 0
+    source.addEventListener("status", (e) => {
+      errors = 0
+      const { status } = JSON.parse((e as MessageEvent).data)
+      onStatus(status === "queued" ? "Waiting for a free worker..." : "Generating animation...")
+    })
+    source.addEventListener("progress", (e) => {
+      const { done, total, eta_seconds } = JSON.parse((e as MessageEvent).data)
+      const eta = done < total ? `, about ${Math.ceil(eta_seconds)}s left` : ""
+      onStatus(`Generating animation... ${done}/${total} scenes${eta}`)
+    })
+    source.addEventListener("result", (e) => {
+      source.close()
+      resolve(JSON.parse((e as MessageEvent).data))
+    })
+    // EventSource reconnects by itself; give up on the stream after a few failures
+    source.onerror = () => {
+      errors += 1
+      // CLOSED: the browser won't reconnect (e.g. a non-200 answer), fall back now
+      if (source.readyState === EventSource.CLOSED || errors >= 3) {
+        source.close()
+        resolve(null)
+      }
+    }
+  })
+}
+
+// POST /generate_audio answers 202 { job_id }; follow the job until it is done or failed
+async function waitForJob(apiBase: string, jobId: string, onStatus: (status: string) => void) {
+  // closing the tab cancels the job so the server stops rendering for nobody
+  const cancelJob = () => {
+    fetch(`${apiBase}/jobs/${jobId}`, { method: "DELETE", mode: "cors", keepalive: true }).catch(() => {})
+  }
+  window.addEventListener("pagehide", cancelJob)
+  try {
+    const streamed = await streamJob(apiBase, jobId, onStatus)
+    if (streamed) {
+      return jobOutcome(streamed) || { error: "Job failed" }
+    }
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS))
+      const response = await fetch(`${apiBase}/status/${jobId}`, { mode: "cors" })
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`)
+      }
+      const job = await response.json()
+      const outcome = jobOutcome(job)
+      if (outcome) {
+        return outcome
+      }
+      onStatus(job.status === "queued" ? "Waiting for a free worker..." : "Generating animation...")
+    }
+  } finally {
+    window.removeEventListener("pagehide", cancelJob)
+  }
+}
+
 export default function VoicemationApp() {
   const [isRecording, setIsRecording] = useState(false)
   const [isGenerating, setIsGenerating] = useState(false)
@@ -187,12 +266,18 @@ export default function VoicemationApp() {
         throw new Error(`HTTP error! status: ${response.status}${errorData?.error ? ` - ${errorData.error}` : ""}`)
       }
 
-      const result = await response.json()
+      let result = await response.json()
       console.log("[v0] Response from Flask:", result)
 
+      if (result.job_id && !result.video_url) {
+        result = await waitForJob(API_BASE, result.job_id, setStatus)
+        console.log("[v0] Job finished:", result)
+      }
+
       if (result.video_url) {
         const fullVideoUrl = result.video_url.startsWith("http") ? result.video_url : `${API_BASE}${result.video_url}`
-        const newVideoUrl = fullVideoUrl + "?t=" + new Date().getTime()
+        // video_url is content-addressed, so no cache-busting query is needed
+        const newVideoUrl = fullVideoUrl
         const newSubtitles = result.subtitles_json || []
 
         const fullText = newSubtitles.map((s) => s.text).join(" ")